@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import logging
 import json
+import pandas as pd
 
 # Handle library reorganisation Python 2 > Python 3.
 try:
@@ -9,14 +11,21 @@ try:
 except ImportError:
     from urlparse import urljoin
     from urllib import urlencode
+from data_acquisition.services.http_session import HttpSession, get_session
+from data_acquisition.services.response_cache import get_response_cache
+from resources.constants import HTTP_CHUNK_SIZE, CENSUS_WORKERS, CENSUS_MAX_VARIABLES
+from resources.data_store import DataStore
+from resources.schemas import apply_schema
 
 
 class CensusAPIClient():
     BASE_URL = "http://api.census.gov/data"
     SPATIAL_UNITS = {'zipc': '&for=zip+code+tabulation+area:*', 'zipcode': '&for=zipcode:*',
                      'county': '&for=county:*&in=state:*', 'all': '&for=block:*&tract:*&in=state:*&county:*'}
+    # geography of the rows of a granularity, sharded downloads query one state (county) or one county at a time
+    SHARD_GEOGRAPHIES = {'county': 'county', 'tract': 'tract', 'blockgroup': 'block+group'}
 
-    def __init__(self, year, data_id, var_list, table_id, spatial_unit, key):
+    def __init__(self, year, data_id, var_list, table_id, spatial_unit, key, session=None, cache=None):
         """
         clean & normalize address string
 
@@ -38,41 +47,76 @@ class CensusAPIClient():
         :param key: the key to fetch the api
         :type key: :py:class:`str`
 
-        :param str_addr: street name
-        :type str_addr: :py:class:`str`
+        :param session: the HTTP session, the one shared by the API clients by default
+        :type session: :py:class:`data_acquisition.services.http_session.HttpSession`
+
+        :param cache: the cache of the responses, the one shared by the API clients by default
+        :type cache: :py:class:`data_acquisition.services.response_cache.ResponseCache`
         """
         self.year = year
         self.key = key
         self.data_id = data_id
         self.table_id = table_id
-        self.var_list = ",".join(['NAME'] + var_list)
+        self.variables = ['NAME'] + list(var_list)
+        self.var_list = ",".join(self.variables)
         self.spatial_unit = spatial_unit
+        self.session = session or get_session()
+        self.cache = cache or get_response_cache()
 
         self.var_url = "{}/{}/{}/variables.json".format(self.BASE_URL, self.year, self.data_id)
         self.api_url = "{}/{}/{}?get={}{}&key={}".format(self.BASE_URL, self.year, self.data_id, self.var_list,
                                                          self.SPATIAL_UNITS[self.spatial_unit], key)
 
-    def _get(self, url):
+    def _get(self, url, endpoint=None, stream=False):
         """
         Handle GET requests
 
-        :param str_addr: street name
-        :type str_addr: :py:class:`str`
+        :param url: the url to parse data
+        :type url: :py:class:`str`
+
+        :param endpoint: the name the latency of the call is recorded under
+        :type endpoint: :py:class:`str`
+
+        :param stream: whether the body is read chunk by chunk, for the large tables
+        :type stream: :py:class:`bool`
         """
 
         try:
-            response = requests.get(url)
+            response = self.session.get(url, endpoint=endpoint, stream=stream)
 
-            print response.status_code
+            logging.info('Status code: %s', response.status_code)
             if response.status_code == requests.codes.ok:
                 return response
             else:
+                response.close()
                 return None
 
         except requests.exceptions.RequestException as e:
-            print e
+            logging.info('Error! %s', e)
             return None
 
+    def _get_chunks(self, url, endpoint):
+        """
+        get the body of a query chunk by chunk, from the cache or streamed from the API & stored in the cache
+
+        :param url: the url to parse data
+        :type url: :py:class:`str`
+
+        :param endpoint: the name of the endpoint (ex: census_data)
+        :type endpoint: :py:class:`str`
+
+        :return: iterator of bytes
+        """
+        cached_fname = self.cache.lookup(endpoint, url)
+        if cached_fname is not None:
+            logging.info('Cached response: %s', cached_fname)
+            return self.cache.iter_chunks(cached_fname)
+
+        respose = self._get(url, endpoint=endpoint, stream=True)
+        if respose is None:
+            raise ValueError("the census query failed: {}".format(self.cache.strip_keys(url)))
+        return self.cache.store(endpoint, url, respose.iter_content(chunk_size=HTTP_CHUNK_SIZE))
+
     def get_variable_info(self):
         """
         get the information on the variable
@@ -80,9 +124,9 @@ class CensusAPIClient():
         :param str_addr: street name
         :type str_addr: :py:class:`str`
         """
-        respose = self._get(self.var_url)
+        content = b"".join(self._get_chunks(self.var_url, endpoint='census_variables'))
 
-        return respose.json()
+        return json.loads(content.decode('utf-8'))
 
     def get_all_census_data(self, fname):
         """
@@ -93,9 +137,9 @@ class CensusAPIClient():
         """
         logging.info('API Url: %s', self.api_url)
 
-        respose = self._get(self.api_url)
-        with open(fname, "w") as f:
-            f.write(respose.text.encode('utf-8'))
+        with open(fname, "wb") as f:
+            for chunk in self._get_chunks(self.api_url, endpoint='census_data'):
+                f.write(chunk)
         f.close()
 
     def get_census_data(self, spatial_unit, fname):
@@ -127,11 +171,106 @@ class CensusAPIClient():
         # #  requests information on the 2015 ACS's occupations characteristics variables from the Census Bureau
         logging.info('Fetching data from : %s', api_url)
 
-        respose = self._get(api_url)
-
+        # the rows are written as they are received, the table is never held in memory
         with open(fname, "w") as f:
-            for line in json.loads(respose.text):
+            for line in HttpSession.iter_json_rows(self._get_chunks(api_url, endpoint='census_data')):
                 f.write("\t".join(map(lambda x: x if x is not None else "", line)) + "\n")
         f.close()
 
-        return respose
+    def get_rows(self, query):
+        """
+        get the rows of a query of the census table
+
+        :param query: the query (ex: get=NAME&for=county:*&in=state:36)
+        :type query: :py:class:`str`
+
+        :return: DataFrame, all columns as strings
+        """
+        api_url = "{}/{}/{}?{}&key={}".format(self.BASE_URL, self.year, self.data_id, query, self.key)
+        rows = HttpSession.iter_json_rows(self._get_chunks(api_url, endpoint='census_data'))
+
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("empty census response: {}".format(query))
+        return pd.DataFrame(list(rows), columns=header)
+
+    def get_shards(self, spatial_unit):
+        """
+        split a spatial unit into shards: one per county for tracts & block groups, one per state for counties
+
+        :param spatial_unit: the spatial unit (ex: {'granularity': 'tract', 'state': '36', 'tract': '*'}), states
+                             may be a comma separated list or *
+        :type spatial_unit: :py:class:`dict`
+
+        :return: list of `in` clauses (ex: state:36+county:061)
+        """
+        states = spatial_unit['state'].split(",")
+        if states == ['*']:
+            states = self.get_rows("get=NAME&for=state:*")[u'state'].tolist()
+
+        if spatial_unit['granularity'] == 'county':
+            return ["state:{}".format(state) for state in states]
+
+        shards = []
+        for state in states:
+            df_counties = self.get_rows("get=NAME&for=county:{}&in=state:{}".format(spatial_unit.get('county', '*'),
+                                                                                 state))
+            shards += ["state:{}+county:{}".format(state, county) for county in df_counties[u'county']]
+        return shards
+
+    def get_shard(self, spatial_unit, shard):
+        """
+        get the census data of a shard, the variables are queried by chunks of at most CENSUS_MAX_VARIABLES (the
+        limit of the API) & joined on the geography columns
+
+        :param spatial_unit: the spatial unit
+        :type spatial_unit: :py:class:`dict`
+
+        :param shard: the `in` clause of the shard (ex: state:36+county:061)
+        :type shard: :py:class:`str`
+
+        :return: DataFrame, the variables followed by the geography columns
+        """
+        granularity = spatial_unit['granularity']
+        geography = "{}:{}".format(self.SHARD_GEOGRAPHIES[granularity], spatial_unit.get(granularity, '*'))
+
+        df_chunks = []
+        for i in range(0, len(self.variables), CENSUS_MAX_VARIABLES):
+            variables = self.variables[i:i + CENSUS_MAX_VARIABLES]
+            df_chunk = self.get_rows("get={}&for={}&in={}".format(",".join(variables), geography, shard))
+            geo_columns = [_ for _ in df_chunk.columns if _ not in variables]
+            df_chunks.append(df_chunk.set_index(geo_columns))
+
+        df_shard = pd.concat(df_chunks, axis=1).reset_index()
+        return df_shard[self.variables + geo_columns]
+
+    def get_census_data_sharded(self, spatial_unit, fname, store=None, max_workers=CENSUS_WORKERS):
+        """
+        get the census data filtered by a spatial unit shard by shard, the shards are fetched concurrently & written
+        to the table as they come, in the order of the shards
+
+        :param spatial_unit: the spatial unit (ex: {'granularity': 'tract', 'state': '36', 'tract': '*'})
+        :type spatial_unit: :py:class:`dict`
+
+        :param fname: the name of the table, typed with its schema (see `resources.schemas`)
+        :type fname: :py:class:`str`
+
+        :param store: the store to write the table to (ex: parquet)
+        :type store: :py:class:`resources.data_store.DataStore`
+
+        :param max_workers: the number of shards fetched concurrently
+        :type max_workers: :py:class:`int`
+        """
+        store = store if store is not None else DataStore()
+        shards = self.get_shards(spatial_unit)
+        logging.info('Fetching census data of %s shards, %s variables', len(shards), len(self.variables))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            with store.open_writer(fname) as writer:
+                for shard, df_shard in zip(shards, executor.map(lambda _: self.get_shard(spatial_unit, _), shards)):
+                    logging.info('Census shard %s: %s rows', shard, len(df_shard))
+                    if len(df_shard):
+                        writer.write(apply_schema(df_shard, fname))
+        finally:
+            executor.shutdown(wait=True)
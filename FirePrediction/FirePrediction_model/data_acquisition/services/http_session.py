@@ -0,0 +1,173 @@
+from collections import defaultdict
+import codecs
+import json
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from resources.constants import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_GZIP
+
+
+class HttpSession():
+    """
+    HttpSession to share keep-alive connections between the API clients
+
+    Connections are pooled per host by a `requests.Session`, so consecutive calls (e.g. the days of the weather
+    history) reuse the same TCP/TLS connection instead of opening a new one. The latency of every call is recorded
+    per endpoint: the time until the headers are received, the body of a streamed response is read by the caller.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 gzip=HTTP_GZIP):
+        """
+        :param pool_size: the number of connections kept alive per host, at least the number of concurrent workers
+        :type pool_size: :py:class:`int`
+
+        :param connect_timeout: the timeout to connect (seconds)
+        :type connect_timeout: :py:class:`float`
+
+        :param read_timeout: the timeout between two bytes of the response (seconds)
+        :type read_timeout: :py:class:`float`
+
+        :param gzip: whether compressed responses are accepted
+        :type gzip: :py:class:`bool`
+        """
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers['Accept-Encoding'] = "gzip, deflate" if gzip else "identity"
+
+        # endpoint -> [calls, errors, total latency, max latency]
+        self.metrics = defaultdict(lambda: [0, 0, 0., 0.])
+        self.lock = threading.Lock()
+
+    def get(self, url, endpoint=None, stream=False, **kwargs):
+        """
+        Handle GET requests
+
+        :param url: the url to parse data
+        :type url: :py:class:`str`
+
+        :param endpoint: the name the latency is recorded under (ex: history, census_data), the url by default
+        :type endpoint: :py:class:`str`
+
+        :param stream: whether the body is read by the caller, chunk by chunk (see `iter_json_rows`)
+        :type stream: :py:class:`bool`
+
+        :param kwargs: other arguments of `requests.Session.get` (ex: params)
+        :type kwargs: :py:class:`dict`
+
+        :return: the response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+
+        start = time.time()
+        try:
+            response = self.session.get(url, stream=stream, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record(endpoint or url, time.time() - start, error=True)
+            raise
+
+        self.record(endpoint or url, time.time() - start, error=response.status_code != requests.codes.ok)
+        return response
+
+    def record(self, endpoint, latency, error=False):
+        """
+        record the latency of a call, thread-safe
+
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :param latency: the latency of the call (seconds)
+        :type latency: :py:class:`float`
+
+        :param error: whether the call failed
+        :type error: :py:class:`bool`
+        """
+        with self.lock:
+            metrics = self.metrics[endpoint]
+            metrics[0] += 1
+            metrics[1] += int(error)
+            metrics[2] += latency
+            metrics[3] = max(metrics[3], latency)
+
+    def latency_metrics(self):
+        """
+        :return: dict, endpoint -> dict of calls, errors, mean & max latency (seconds)
+        """
+        with self.lock:
+            return {endpoint: {'calls': calls, 'errors': errors, 'mean': total / calls, 'max': max_latency}
+                    for endpoint, (calls, errors, total, max_latency) in self.metrics.items()}
+
+    def log_metrics(self):
+        """
+        log the latency of the endpoints called so far
+        """
+        for endpoint, metrics in sorted(self.latency_metrics().items()):
+            logging.info("%s: %s calls, %s errors, latency mean %.3fs, max %.3fs", endpoint, metrics['calls'],
+                         metrics['errors'], metrics['mean'], metrics['max'])
+
+    @staticmethod
+    def iter_json_rows(chunks, encoding='utf-8'):
+        """
+        parse a streamed JSON array of rows (ex: the tables of the Census API) without loading the whole body
+
+        :param chunks: the chunks of the body (ex: `response.iter_content(HTTP_CHUNK_SIZE)`)
+        :type chunks: :py:class:`iterator`
+
+        :param encoding: the encoding of the body
+        :type encoding: :py:class:`str`
+
+        :return: iterator of rows
+        """
+        text = codecs.getincrementaldecoder(encoding)()
+        decoder = json.JSONDecoder()
+        buf, started, finished = "", False, False
+
+        # the chunks are read to the end, e.g. by a cache that stores them
+        for chunk in chunks:
+            if finished:
+                continue
+            buf += text.decode(chunk)
+            while True:
+                buf = buf.lstrip(" \t\r\n,")
+                if not started:
+                    if not buf.startswith("["):
+                        break
+                    buf, started = buf[1:], True
+                    continue
+                if buf.startswith("]"):
+                    buf, finished = "", True
+                    break
+                try:
+                    # a row cut by the end of the chunk does not parse, it is completed by the next chunk
+                    row, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                yield row
+                buf = buf[end:]
+
+        # the body ends within a row or between two rows
+        if buf.strip() or (started and not finished):
+            raise ValueError("truncated JSON rows: {}".format(buf[:100]))
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    get the session shared by the API clients, created on first use
+
+    :return: HttpSession
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = HttpSession()
+        return _default_session
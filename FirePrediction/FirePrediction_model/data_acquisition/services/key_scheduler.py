@@ -0,0 +1,216 @@
+import json
+import logging
+import threading
+import time
+from resources.constants import WUNDERGROUND_CALLS_PER_MINUTE, WUNDERGROUND_CALLS_PER_DAY, WUNDERGROUND_KEY_COOLDOWN, \
+    WUNDERGROUND_MAX_WAIT
+
+
+class KeyQuotaExhausted(Exception):
+    """
+    raised when no key can be called within the maximum wait, e.g. the daily quota of every key is spent
+    """
+    pass
+
+
+class TokenBucket():
+    """
+    TokenBucket to allow `capacity` calls per `period`, the tokens are refilled continuously
+    """
+
+    def __init__(self, capacity, period):
+        """
+        :param capacity: the number of calls per period, None for no limit, 0 to allow no call
+        :type capacity: :py:class:`int`
+
+        :param period: the period (seconds)
+        :type period: :py:class:`float`
+        """
+        self.capacity = capacity
+        self.rate = float(capacity) / period if capacity is not None else None
+        self.tokens = float(capacity) if capacity is not None else float('inf')
+        self.updated = time.time()
+
+    def refill(self, now):
+        """
+        :param now: the current time
+        :type now: :py:class:`float`
+        """
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """
+        :param now: the current time
+        :type now: :py:class:`float`
+
+        :return: the time until a call is allowed (seconds)
+        """
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.
+        if not self.rate:
+            # no call is ever allowed
+            return float('inf')
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """
+        :param now: the current time
+        :type now: :py:class:`float`
+        """
+        self.refill(now)
+        self.tokens -= 1
+
+    def drain(self, now):
+        """
+        spend the remaining tokens, e.g. when the API says the limit is reached
+
+        :param now: the current time
+        :type now: :py:class:`float`
+        """
+        self.refill(now)
+        if self.capacity is not None:
+            self.tokens = min(self.tokens, 0.)
+
+
+class KeyScheduler():
+    """
+    KeyScheduler to spread the calls of concurrent workers over several API keys within their quotas
+
+    Every key has a token bucket per minute & per day. A worker is handed the healthy key with the fewest calls in
+    flight & the most calls left, it waits when every key is at its limit. A key the API throttles (or rejects) is put
+    on cooldown and its minute bucket is drained. Quotas are tracked in memory, from the start of the process.
+    """
+
+    def __init__(self, keys, calls_per_minute=WUNDERGROUND_CALLS_PER_MINUTE, calls_per_day=WUNDERGROUND_CALLS_PER_DAY,
+                 cooldown=WUNDERGROUND_KEY_COOLDOWN, max_wait=WUNDERGROUND_MAX_WAIT):
+        """
+        :param keys: key name -> dict with the key & optionally its own calls_per_minute/calls_per_day
+        :type keys: :py:class:`dict`
+
+        :param calls_per_minute: the calls per minute allowed per key, None for no limit
+        :type calls_per_minute: :py:class:`int`
+
+        :param calls_per_day: the calls per day allowed per key, None for no limit
+        :type calls_per_day: :py:class:`int`
+
+        :param cooldown: the time a throttled key is not used (seconds)
+        :type cooldown: :py:class:`float`
+
+        :param max_wait: the longest a worker waits for a key before `KeyQuotaExhausted` is raised (seconds)
+        :type max_wait: :py:class:`float`
+        """
+        self.keys = keys
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+
+        self.minute_buckets = {name: TokenBucket(key.get('calls_per_minute', calls_per_minute), 60.)
+                               for name, key in keys.items()}
+        self.day_buckets = {name: TokenBucket(key.get('calls_per_day', calls_per_day), 86400.)
+                            for name, key in keys.items()}
+        self.cooldown_until = {name: 0. for name in keys}
+        self.in_flight = {name: 0 for name in keys}
+        self.calls = {name: 0 for name in keys}
+        self.throttled = {name: 0 for name in keys}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, keys_fname, **kwargs):
+        """
+        :param keys_fname: the file name that holds the keys (json, key name -> dict)
+        :type keys_fname: :py:class:`str`
+
+        :param kwargs: other arguments of the scheduler (ex: calls_per_minute)
+        :type kwargs: :py:class:`dict`
+
+        :return: KeyScheduler
+        """
+        with open(keys_fname) as f:
+            return cls(json.load(f), **kwargs)
+
+    def wait_time(self, name, now):
+        """
+        :param name: the name of the key
+        :type name: :py:class:`str`
+
+        :param now: the current time
+        :type now: :py:class:`float`
+
+        :return: the time until the key can be called (seconds)
+        """
+        return max(self.cooldown_until[name] - now, self.minute_buckets[name].wait_time(now),
+                   self.day_buckets[name].wait_time(now))
+
+    def acquire(self):
+        """
+        hand out a key, wait until one is available, thread-safe. The key is given back with `release`
+
+        :return: the name of the key
+        """
+        start = time.time()
+        while True:
+            with self.lock:
+                now = time.time()
+                waits = {name: self.wait_time(name, now) for name in self.keys}
+                ready = [name for name, wait in waits.items() if wait <= 0]
+                if ready:
+                    name = min(ready, key=lambda _: (self.in_flight[_], -self.day_buckets[_].tokens,
+                                                     -self.minute_buckets[_].tokens))
+                    self.minute_buckets[name].take(now)
+                    self.day_buckets[name].take(now)
+                    self.in_flight[name] += 1
+                    self.calls[name] += 1
+                    return name
+                wait = min(waits.values())
+
+            if now + wait - start > self.max_wait:
+                raise KeyQuotaExhausted("no key available within {}s, remaining quota: {}".format(
+                    self.max_wait, self.remaining()))
+            time.sleep(wait)
+
+    def release(self, name, throttled=False):
+        """
+        give back a key, thread-safe
+
+        :param name: the name of the key
+        :type name: :py:class:`str`
+
+        :param throttled: whether the API throttled or rejected the call, the key is put on cooldown
+        :type throttled: :py:class:`bool`
+        """
+        with self.lock:
+            self.in_flight[name] -= 1
+            if throttled:
+                now = time.time()
+                self.throttled[name] += 1
+                self.cooldown_until[name] = now + self.cooldown
+                self.minute_buckets[name].drain(now)
+                logging.info('Key %s throttled, cooldown of %ss', name, self.cooldown)
+
+    def remaining(self):
+        """
+        :return: dict, key name -> calls made, throttled, calls left this minute/day & cooldown left (seconds)
+        """
+        with self.lock:
+            now = time.time()
+            # calls left in a bucket, None without limit
+            left = lambda bucket: None if bucket.capacity is None else int(max(bucket.tokens, 0))
+
+            remaining = {}
+            for name in self.keys:
+                for bucket in (self.minute_buckets[name], self.day_buckets[name]):
+                    bucket.refill(now)
+                remaining[name] = {'calls': self.calls[name], 'throttled': self.throttled[name],
+                                   'minute': left(self.minute_buckets[name]), 'day': left(self.day_buckets[name]),
+                                   'cooldown': max(self.cooldown_until[name] - now, 0.)}
+            return remaining
+
+    def log_quota(self):
+        """
+        log the calls & remaining quota of the keys
+        """
+        for name, quota in sorted(self.remaining().items()):
+            logging.info("key %s: %s calls, %s throttled, %s calls left this minute, %s today", name, quota['calls'],
+                         quota['throttled'], quota['minute'], quota['day'])
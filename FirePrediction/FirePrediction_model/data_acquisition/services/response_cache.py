@@ -0,0 +1,214 @@
+from os.path import abspath, exists, getmtime, join
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from resources.constants import INTERIM_DIR, RESPONSE_CACHE_DIRNAME, RESPONSE_CACHE_TTLS, HTTP_CHUNK_SIZE
+
+
+class ResponseCache():
+    """
+    ResponseCache to keep the bodies of the API responses on disk
+
+    A body is stored in a file named after the hash of its url, API keys stripped, so the same query made with another
+    key is a hit. Every endpoint has its own time to live: historical data (weather history, census tables of a past
+    vintage) never expires, forecasts expire after minutes, the census variables after days. Files are written aside &
+    moved in place, an interrupted download is never read back.
+    """
+    # query parameters that hold API keys
+    KEY_PARAMS = re.compile(r'([?&])key=[^&]*')
+
+    def __init__(self, cache_dir, ttls=RESPONSE_CACHE_TTLS):
+        """
+        :param cache_dir: the directory of the cache
+        :type cache_dir: :py:class:`str`
+
+        :param ttls: endpoint -> time to live (seconds), None to keep forever, 0 not to cache. Endpoints not listed
+                     are not cached
+        :type ttls: :py:class:`dict`
+        """
+        self.cache_dir = cache_dir
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def strip_keys(cls, url, keys=()):
+        """
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+
+        :return: the url without API keys
+        """
+        url = cls.KEY_PARAMS.sub(r'\1', url).replace('?&', '?').replace('&&', '&').rstrip('?&')
+        for key in keys:
+            url = url.replace(key, '')
+        return url
+
+    def fname(self, endpoint, url, keys=()):
+        """
+        :param endpoint: the name of the endpoint (ex: wunderground_history)
+        :type endpoint: :py:class:`str`
+
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+
+        :return: the name of the file of the response
+        """
+        digest = hashlib.sha256(self.strip_keys(url, keys).encode('utf-8')).hexdigest()
+        return join(self.cache_dir, endpoint, digest[:2], digest)
+
+    def cached(self, endpoint):
+        """
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :return: whether the responses of the endpoint are cached
+        """
+        return self.ttls.get(endpoint, 0) != 0
+
+    def lookup(self, endpoint, url, keys=()):
+        """
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+
+        :return: the name of the file of the response, None if it is not cached or expired
+        """
+        if not self.cached(endpoint):
+            return None
+
+        fname = self.fname(endpoint, url, keys)
+        ttl = self.ttls[endpoint]
+        if exists(fname) and (ttl is None or time.time() - getmtime(fname) < ttl):
+            self.hits += 1
+            return fname
+
+        self.misses += 1
+        return None
+
+    def get(self, endpoint, url, keys=()):
+        """
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+
+        :return: bytes, the body of the response, None if it is not cached or expired
+        """
+        fname = self.lookup(endpoint, url, keys)
+        if fname is None:
+            return None
+        with open(fname, 'rb') as f:
+            return f.read()
+
+    def iter_chunks(self, fname, chunk_size=HTTP_CHUNK_SIZE):
+        """
+        :param fname: the name of the file of a response (see `lookup`)
+        :type fname: :py:class:`str`
+
+        :param chunk_size: the size of the chunks (bytes)
+        :type chunk_size: :py:class:`int`
+
+        :return: iterator of bytes, the body of the response
+        """
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def put(self, endpoint, url, content, keys=()):
+        """
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param content: the body of the response
+        :type content: :py:class:`bytes`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+        """
+        for _ in self.store(endpoint, url, [content], keys):
+            pass
+
+    def store(self, endpoint, url, chunks, keys=()):
+        """
+        store a body while it is read, the file is only kept when every chunk is read
+
+        :param endpoint: the name of the endpoint
+        :type endpoint: :py:class:`str`
+
+        :param url: the url of the query
+        :type url: :py:class:`str`
+
+        :param chunks: the chunks of the body
+        :type chunks: :py:class:`iterator`
+
+        :param keys: API keys found in the path of the url
+        :type keys: :py:class:`list`
+
+        :return: iterator of bytes, the chunks
+        """
+        if not self.cached(endpoint):
+            for chunk in chunks:
+                yield chunk
+            return
+
+        fname = self.fname(endpoint, url, keys)
+        tmp_fname = "{}.{}.{}.tmp".format(fname, os.getpid(), threading.current_thread().ident)
+        try:
+            os.makedirs(os.path.dirname(fname))
+        except OSError:
+            pass
+
+        try:
+            with open(tmp_fname, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.rename(tmp_fname, fname)
+        finally:
+            if exists(tmp_fname):
+                os.remove(tmp_fname)
+
+    def log_stats(self):
+        """
+        log the hits & misses of the cache
+        """
+        logging.info("response cache %s: %s hits, %s misses", self.cache_dir, self.hits, self.misses)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    get the cache shared by the API clients, in the interim directory
+
+    :return: ResponseCache
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(abspath(join(INTERIM_DIR, RESPONSE_CACHE_DIRNAME)))
+        return _default_cache
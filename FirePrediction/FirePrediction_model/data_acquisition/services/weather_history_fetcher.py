@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import heapq
+import logging
+import time
+from data_acquisition.services.key_scheduler import KeyQuotaExhausted
+from data_acquisition.services.wunderground_client import WundergroundAPI
+from resources.constants import WEATHER_WORKERS, WEATHER_MAX_ATTEMPTS, WEATHER_BACKOFF
+
+
+class QueryNotFound(ValueError):
+    """
+    raised when the API does not know the query (e.g. an unknown city), the request is not retried
+    """
+    pass
+
+
+class WeatherHistoryFetcher():
+    """
+    WeatherHistoryFetcher to collect the daily weather summaries of many dates concurrently
+
+    Dates are fetched on a pool of threads, the calls are spread over the keys of the API by its key scheduler. A date
+    that fails is submitted again once its exponential backoff is over, workers never sleep: they fetch the other dates
+    meanwhile. A date is given up after `max_attempts`, at once when the quota of every key is spent or the query is
+    not found, and reported so that a later run fetches it again.
+    """
+
+    def __init__(self, wunderground_api, max_workers=WEATHER_WORKERS, max_attempts=WEATHER_MAX_ATTEMPTS,
+                 backoff=WEATHER_BACKOFF):
+        """
+        :param wunderground_api: the API client
+        :type wunderground_api: :py:class:`data_acquisition.services.wunderground_client.WundergroundAPI`
+
+        :param max_workers: the number of concurrent requests
+        :type max_workers: :py:class:`int`
+
+        :param max_attempts: the number of attempts per date
+        :type max_attempts: :py:class:`int`
+
+        :param backoff: the delay before the first retry of a date, doubled at every attempt (seconds)
+        :type backoff: :py:class:`float`
+        """
+        self.wunderground_api = wunderground_api
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.failed_dates = []
+
+    def fetch_daily_summary(self, dt, region, city):
+        """
+        fetch the daily summary of a date
+
+        :param dt: the date (ex: 20130101)
+        :type dt: :py:class:`str`
+
+        :param region: the name of the region
+        :type region: :py:class:`str`
+
+        :param city: the name of the city
+        :type city: :py:class:`str`
+
+        :return: dict, the daily summary
+        """
+        data = self.wunderground_api.get_hest_daily_weather_info(dt, region=region, city=city)
+        daily_summaries = data.get('history', {}).get('dailysummary', [])
+        if not daily_summaries:
+            error = data.get('response', {}).get('error')
+            if isinstance(error, dict) and error.get('type') in WundergroundAPI.QUERY_ERRORS:
+                raise QueryNotFound("query not found: {}".format(error))
+            raise ValueError("no daily summary: {}".format(error or data))
+        return daily_summaries[0]
+
+    def fetch(self, dates, region, city):
+        """
+        fetch the daily summaries of dates
+
+        :param dates: the dates (ex: 20130101)
+        :type dates: :py:class:`list`
+
+        :param region: the name of the region
+        :type region: :py:class:`str`
+
+        :param city: the name of the city
+        :type city: :py:class:`str`
+
+        :return: iterator of (date, daily summary) in completion order, the dates given up are in `failed_dates`
+        """
+        self.failed_dates = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # future -> (date, attempt)
+            pending = {executor.submit(self.fetch_daily_summary, dt, region, city): (dt, 1) for dt in dates}
+            # heap of (time, date, attempt), the dates waiting for the end of their backoff
+            retries = []
+
+            while pending or retries:
+                now = time.time()
+                while retries and retries[0][0] <= now:
+                    _, dt, attempt = heapq.heappop(retries)
+                    pending[executor.submit(self.fetch_daily_summary, dt, region, city)] = (dt, attempt)
+
+                # wake up at the next retry at the latest
+                timeout = retries[0][0] - now if retries else None
+                if not pending:
+                    time.sleep(timeout)
+                    continue
+
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dt, attempt = pending.pop(future)
+                    try:
+                        daily_summary = future.result()
+                    except Exception as e:
+                        if attempt >= self.max_attempts or isinstance(e, (KeyQuotaExhausted, QueryNotFound)):
+                            logging.info('Error! giving up weather data for date %s after %s attempts: %s', dt,
+                                         attempt, e)
+                            self.failed_dates.append(dt)
+                        else:
+                            delay = self.backoff * 2 ** (attempt - 1)
+                            logging.info('Error! weather data for date %s (attempt %s): %s, retried in %ss', dt,
+                                         attempt, e, delay)
+                            heapq.heappush(retries, (time.time() + delay, dt, attempt + 1))
+                        continue
+
+                    yield dt, daily_summary
+        finally:
+            # the dates not started yet are dropped when the caller stops early
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
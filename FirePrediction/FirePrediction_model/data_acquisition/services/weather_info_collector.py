@@ -2,6 +2,12 @@ import requests
 import logging
 import json
 from datetime import datetime, timedelta
+from os.path import exists
+import gzip
+import os
+import re
+import zlib
+import numpy as np
 import pandas as pd
 
 # Handle library reorganisation Python 2 > Python 3.
@@ -12,10 +18,27 @@ except ImportError:
     from urlparse import urljoin
     from urllib import urlencode
 from data_acquisition.services.wunderground_client import WundergroundAPI
-from ast import literal_eval
+from data_acquisition.services.weather_history_fetcher import WeatherHistoryFetcher
+from resources.constants import WUNDERGROUND_BASE_URL, WEATHER_WORKERS
+
+
+class WeatherCollectionIncomplete(Exception):
+    """
+    raised when the daily summaries of some dates could not be collected, the next collection resumes with them
+    """
+    pass
 
 
 class WeatherInfoCollector():
+    # the fields of the daily summaries kept by `filter_weather_data`, the day is in the nested date
+    SUMMARY_FIELDS = ['mintempm', 'maxtempm', 'humidity', 'snow', 'snowfallm', 'snowdepthm', 'meanpressurem',
+                      'meanwindspdm', 'precipm', 'rain']
+    DATE_FIELDS = ['mday', 'mon', 'year']
+    # "field": "value" as written by `json.dumps`, the fields are found in a single pass over the line. The day is
+    # read in the local "date" object only, the summaries also hold the day in UTC ("utcdate")
+    FIELD_PATTERN = re.compile(r'"(%s)": "([^"\\]*)"' % "|".join(['dt'] + SUMMARY_FIELDS))
+    DATE_PATTERN = re.compile(r'"date": \{([^{}]*)\}')
+    DATE_FIELD_PATTERN = re.compile(r'"(%s)": "([^"\\]*)"' % "|".join(DATE_FIELDS))
 
     def __init__(self, start_date, end_date):
         """
@@ -57,9 +80,7 @@ class WeatherInfoCollector():
 
         """
 
-        columns = ['mintempm', 'maxtempm', 'humidity', 'snow', 'snowfallm', 'snowdepthm', 'meanpressurem',
-                   'meanwindspdm', 'precipm', 'rain']
-        _ = {col: json_obj[col] for col in columns}
+        _ = {col: json_obj[col] for col in self.SUMMARY_FIELDS}
         _['date'] = "{}-{}-{}".format(json_obj[u'date'][u'mday'], json_obj[u'date'][u'mon'], json_obj[u'date'][u'year'])
         return _
 
@@ -74,27 +95,39 @@ class WeatherInfoCollector():
         :type output_fname: :py:class:`str`
         """
 
-        data = []
-        with open(input_fname) as f:
-            for line in f:
-                dt, json_data = line.rstrip("\n").split("\t")
-                data += [self.filter_dailysummary_data(literal_eval(json_data))]
-
         columns = ['observation_date_time', 'mintempm', 'maxtempm', 'humidity', 'snow', 'snowdepthm', 'meanpressurem',
                    'meanwindspdm', 'precipm', 'rain']
-        df = pd.DataFrame(data)
+        numeric_columns = columns[1:]
+
+        # only the needed fields of the daily summaries are kept, one list per column
+        dates, values = [], {col: [] for col in numeric_columns + ['date']}
+        for dt, daily_summary in self.read_daily_summaries(input_fname):
+            dates.append(dt)
+            for col, value in self.filter_dailysummary_data(daily_summary).items():
+                if col in values:
+                    values[col].append(value)
+
+        df = pd.DataFrame({col: values[col] for col in numeric_columns}, columns=numeric_columns)
 
         # precipm sometimes has 'T' for trace amounts of rain. Replace this with epsilon
         epsilon = 0.001
         df['precipm'] = df['precipm'].replace('T', epsilon)
         df['snowdepthm'] = df['snowdepthm'].replace('T', epsilon)
-        df['observation_date_time'] = df['date']
+        for col in numeric_columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        df['observation_date_time'] = values['date']
+
+        # days are collected in completion order, a day collected twice keeps its last summary
+        df.index = dates
+        df = df[~df.index.duplicated(keep='last')].sort_index()
 
         df.to_csv(output_fname, columns=columns, index=False, sep="\t")
 
-    def get_weather_info_period(self, wunderground_keys_fname, output_fname, region="NY", city="New_York"):
+    def get_weather_info_period(self, wunderground_keys_fname, output_fname, region="NY", city="New_York",
+                                base_url=WUNDERGROUND_BASE_URL, max_workers=WEATHER_WORKERS):
         """
-        initialize the class with start/ending date
+        collect the daily weather summaries of the period, the dates already in the output file are skipped so an
+        interrupted collection resumes where it stopped
 
 
         :param wunderground_keys_fname: the file name that holds wunderground keys
@@ -108,17 +141,138 @@ class WeatherInfoCollector():
 
         :param city: the name of the city 
         :type city: :py:class:`str`
+
+        :param base_url: the url of the API, e.g. a local stub server
+        :type base_url: :py:class:`str`
+
+        :param max_workers: the number of concurrent requests
+        :type max_workers: :py:class:`int`
+        """
+        wunderground_api = WundergroundAPI(wunderground_keys_fname, base_url=base_url)
+        fetcher = WeatherHistoryFetcher(wunderground_api, max_workers=max_workers)
+
+        collected_dates = self.collected_dates(output_fname)
+        dates = [dt for dt in self.generate_dates(self.start_date, self.end_date) if dt not in collected_dates]
+        logging.info('Getting weather data for %s dates, %s already collected.', len(dates), len(collected_dates))
+
+        with self.open_weather_file(output_fname, "a") as f:
+            for dt, daily_summary_data in fetcher.fetch(dates, region=region, city=city):
+                logging.info('Got weather data for date: %s.', dt)
+                f.write(json.dumps({'dt': dt, 'dailysummary': daily_summary_data}) + "\n")
+
+        wunderground_api.scheduler.log_quota()
+        wunderground_api.cache.log_stats()
+        if fetcher.failed_dates:
+            raise WeatherCollectionIncomplete('no weather data for {} dates, run the collection again: {}'.format(
+                len(fetcher.failed_dates), ", ".join(sorted(fetcher.failed_dates))))
+
+    @staticmethod
+    def open_weather_file(fname, mode="r"):
+        """
+        open a file of daily summaries, compressed with gzip when its name ends with .gz
+
+        :param fname: the name of the file (ex: newyork_weather_info.ndjson.gz)
+        :type fname: :py:class:`str`
+
+        :param mode: r, w or a
+        :type mode: :py:class:`str`
+
+        :return: text file
+        """
+        if fname.endswith(".gz"):
+            return gzip.open(fname, mode + "t")
+        return open(fname, mode)
+
+    @classmethod
+    def read_lines(cls, fname):
+        """
+        read the complete lines of a file of daily summaries, the reading stops at a truncated line or gzip member
+        (interrupted write)
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+
+        :return: iterator of lines
+        """
+        with cls.open_weather_file(fname) as f:
+            try:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    yield line
+            except (EOFError, zlib.error):
+                logging.info('Truncated weather data file: %s', fname)
+
+    @classmethod
+    def read_daily_summaries(cls, fname):
+        """
+        read a file of daily summaries, one JSON object per line, only the fields kept by `filter_weather_data` are
+        parsed (see `parse_daily_summary`)
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+
+        :return: iterator of (date, daily summary)
+        """
+        for line in cls.read_lines(fname):
+            yield cls.parse_daily_summary(line)
+
+    @classmethod
+    def parse_daily_summary(cls, line):
+        """
+        parse the date & the needed fields of a line of daily summaries, the rest of the summary is not decoded. A
+        line where a field is missing, is found more than once (e.g. in a nested object) or is not a plain string
+        (e.g. escaped characters) is fully parsed
+
+        :param line: a line of a file of daily summaries
+        :type line: :py:class:`str`
+
+        :return: (date, daily summary restricted to SUMMARY_FIELDS & the date)
+        """
+        matches = cls.FIELD_PATTERN.findall(line)
+        values = dict(matches)
+        dates = cls.DATE_PATTERN.findall(line)
+        date_matches = cls.DATE_FIELD_PATTERN.findall(dates[0]) if len(dates) == 1 else []
+        date_values = dict(date_matches)
+
+        if len(matches) != len(values) or len(values) < 1 + len(cls.SUMMARY_FIELDS) or \
+                len(date_matches) != len(date_values) or len(date_values) < len(cls.DATE_FIELDS):
+            record = json.loads(line)
+            return record['dt'], record['dailysummary']
+
+        daily_summary = {field: values[field] for field in cls.SUMMARY_FIELDS}
+        daily_summary['date'] = date_values
+        return values['dt'], daily_summary
+
+    @classmethod
+    def collected_dates(cls, output_fname):
+        """
+        get the dates already in the output file, a truncated end (interrupted write) is removed
+
+        :param output_fname: the name of the output file
+        :type output_fname: :py:class:`str`
+
+        :return: set of dates
         """
-        wunderground_api = WundergroundAPI(wunderground_keys_fname)
-        with open(output_fname, "w") as f:
+        if not exists(output_fname):
+            return set()
 
-            for dt in self.generate_dates(self.start_date, self.end_date):
-                try:
-                    logging.info('Getting weather data for date: %s.', dt)
-                    data = wunderground_api.get_hest_daily_weather_info(dt, region=region, city=city)
-                    daily_summary_data = data.get('history', {}).get('dailysummary', {})[0]
-                    f.write("{}\t{}\n".format(dt, str(daily_summary_data)))
+        dates, complete = set(), True
+        with cls.open_weather_file(output_fname) as f:
+            try:
+                for line in f:
+                    if not line.endswith("\n"):
+                        complete = False
+                        break
+                    dates.add(cls.parse_daily_summary(line)[0])
+            except (EOFError, zlib.error):
+                complete = False
 
-                except Exception as e:
-                    wunderground_api.cur_key = wunderground_api.keys.next()
-                    wunderground_api.set_auth()
+        if not complete:
+            # the complete lines are written aside & moved in place
+            tmp_fname = "{}.tmp{}".format(output_fname, ".gz" if output_fname.endswith(".gz") else "")
+            with cls.open_weather_file(tmp_fname, "w") as f:
+                for line in cls.read_lines(output_fname):
+                    f.write(line)
+            os.rename(tmp_fname, output_fname)
+        return dates
@@ -10,46 +10,108 @@ except ImportError:
     from urlparse import urljoin
     from urllib import urlencode
 
-from itertools import cycle
+from data_acquisition.services.http_session import get_session
+from data_acquisition.services.key_scheduler import KeyScheduler
+from data_acquisition.services.response_cache import get_response_cache
+from resources.constants import WUNDERGROUND_BASE_URL, WUNDERGROUND_CALLS_PER_MINUTE, WUNDERGROUND_CALLS_PER_DAY
 
 
 class WundergroundAPI():
-    BASE_URL = "http://api.wunderground.com/api/"
+    BASE_URL = WUNDERGROUND_BASE_URL
+    # errors of a query the key is not responsible for
+    QUERY_ERRORS = ('querynotfound',)
 
-    def __init__(self, wunderground_keys_fname):
+    def __init__(self, wunderground_keys_fname, base_url=WUNDERGROUND_BASE_URL,
+                 calls_per_minute=WUNDERGROUND_CALLS_PER_MINUTE, calls_per_day=WUNDERGROUND_CALLS_PER_DAY,
+                 session=None, cache=None):
         """
         initialize the class with start/ending date
 
         :param wunderground_keys_fname: the file name that holds wunderground keys
         :type wunderground_keys_fname: :py:class:`str`
+
+        :param base_url: the url of the API, e.g. a local stub server
+        :type base_url: :py:class:`str`
+
+        :param calls_per_minute: the calls per minute allowed per key, None for no limit
+        :type calls_per_minute: :py:class:`int`
+
+        :param calls_per_day: the calls per day allowed per key, None for no limit
+        :type calls_per_day: :py:class:`int`
+
+        :param session: the HTTP session, the one shared by the API clients by default
+        :type session: :py:class:`data_acquisition.services.http_session.HttpSession`
+
+        :param cache: the cache of the responses, the one shared by the API clients by default
+        :type cache: :py:class:`data_acquisition.services.response_cache.ResponseCache`
         """
 
-        self.json_tokens = json.loads(open(wunderground_keys_fname).read())
-        self.base_url = self.BASE_URL
-        self.keys = cycle(self.json_tokens.keys())
-        self.cur_key = self.keys.next()
-        self.set_auth()
+        # the keys are loaded once, every call is made with the key handed out by the scheduler
+        self.scheduler = KeyScheduler.from_file(wunderground_keys_fname, calls_per_minute=calls_per_minute,
+                                                calls_per_day=calls_per_day)
+        self.api_url = base_url.rstrip("/")
+        self.session = session or get_session()
+        self.cache = cache or get_response_cache()
+
+    def key_url(self, key_name):
+        """
+        :param key_name: the name of the key in the keys file
+        :type key_name: :py:class:`str`
 
-    def set_auth(self):
+        :return: the url of the API authenticated with the key
         """
-        authentication setter
+        key = self.scheduler.keys[key_name].get("wunderground_api_key")
+        return "{}/{}".format(self.api_url, key)
 
+    def _call(self, path, endpoint):
         """
-        key = self.json_tokens[self.cur_key].get("wunderground_api_key")
-        self.base_url = "http://api.wunderground.com/api/{}".format(key)
+        call the API with a key of the scheduler, the key is put on cooldown when the call is throttled or rejected.
+        Responses without error are cached, a cached query is not sent & spends no quota
+
+        :param path: the path of the query (ex: /forecast/q/NY/New_York.json)
+        :type path: :py:class:`str`
 
-        logging.info('\n Switched to another key %s', self.cur_key)
+        :param endpoint: the name the latency of the call is recorded under
+        :type endpoint: :py:class:`str`
 
-    def _get(self, url):
+        :return: dict, the data
+        """
+        # the url of the cache holds no key, the same query made with another key is a hit
+        url = "{}{}".format(self.api_url, path)
+        content = self.cache.get(endpoint, url)
+        if content is not None:
+            return json.loads(content.decode('utf-8'))
+
+        key_name = self.scheduler.acquire()
+        throttled = False
+        try:
+            response = self._get("{}{}".format(self.key_url(key_name), path), endpoint=endpoint)
+            if response is None:
+                throttled = True
+                raise ValueError("the API rejected the call with key {}".format(key_name))
+
+            data = response.json()
+            error = data.get('response', {}).get('error')
+            throttled = error is not None and not (isinstance(error, dict) and error.get('type') in self.QUERY_ERRORS)
+            if error is None:
+                self.cache.put(endpoint, url, response.content)
+            return data
+        finally:
+            self.scheduler.release(key_name, throttled=throttled)
+
+    def _get(self, url, endpoint=None):
         """
         Handle GET requests
 
         :param url: the url to parse data
         :type url: :py:class:`str`
+
+        :param endpoint: the name the latency of the call is recorded under
+        :type endpoint: :py:class:`str`
         """
         # url = "{}{}".format(url_endpoint)
 
-        response = requests.get(url)
+        response = self.session.get(url, endpoint=endpoint)
         if response.status_code == requests.codes.ok:
             return response
         else:
@@ -65,18 +127,14 @@ class WundergroundAPI():
         :param region: the name of the region
         :type region: :py:class:`str`
 
-        :param city: the name of the city 
+        :param city: the name of the city
         :type city: :py:class:`str`
         """
 
         loc_endpoint = "/q/{}/{}.json".format(region, city)
         time_endpoint = "/history_{}".format(dt)
 
-        url_endpoint = "{}{}{}".format(self.base_url, time_endpoint, loc_endpoint)
-
-        respose = self._get(url_endpoint)
-
-        return respose.json()
+        return self._call("{}{}".format(time_endpoint, loc_endpoint), endpoint='wunderground_history')
 
     def get_daily_forecast(self, region, city):
         """
@@ -88,12 +146,10 @@ class WundergroundAPI():
         :param region: the name of the region
         :type region: :py:class:`str`
 
-        :param city: the name of the city 
+        :param city: the name of the city
         :type city: :py:class:`str`
         """
 
         loc_endpoint = "/q/{}/{}.json".format(region, city)
         time_endpoint = "/forecast"
-        url_endpoint = "{}{}{}".format(self.base_url, time_endpoint, loc_endpoint)
-        respose = self._get(url_endpoint)
-        return respose.json()
+        return self._call("{}{}".format(time_endpoint, loc_endpoint), endpoint='wunderground_forecast')
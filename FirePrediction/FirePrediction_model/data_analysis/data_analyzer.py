@@ -12,6 +12,7 @@ from sklearn.metrics import confusion_matrix
 from sklearn.metrics import precision_score
 from sklearn.metrics import recall_score
 from sklearn.metrics import f1_score
+from resources.schemas import read_csv
 
 class DataAnalyzer():
     """
@@ -34,7 +35,7 @@ class DataAnalyzer():
 
         :return: DataFrame with separated columns
         """
-        df = pd.read_csv(data_fname, index_col=False, sep='\t')
+        df = read_csv(data_fname, dtype=None, index_col=False, sep='\t')
         self.data_fname = data_fname
 
         return df
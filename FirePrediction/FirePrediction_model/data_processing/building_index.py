@@ -0,0 +1,215 @@
+from os.path import exists, join, getsize, getmtime, splitext
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from resources.constants import BUILDING_INDEX_EXT
+
+
+class BuildingIndex():
+    """
+    BuildingIndex to map buildings (BIN) & lots (BBL) to census tracts
+
+    The index is compiled once from the buildings file into a directory of NumPy arrays: for every key, the sorted
+    int64 keys & the codes of their census tract, plus the census tracts themselves. Arrays are memory-mapped, so the
+    processes that aggregate the DOB files share the same pages, and keys are looked up with `np.searchsorted`.
+    Keys that are not decimal numbers without leading zero (e.g. '0123', '4X100') match no building.
+    """
+    KEYS = (u'BIN', u'BBL')
+    META_FNAME = "meta.json"
+
+    def __init__(self, keys, codes, tracts):
+        """
+        :param keys: key -> sorted int64 keys
+        :type keys: :py:class:`dict`
+
+        :param codes: key -> census tract code of every key
+        :type codes: :py:class:`dict`
+
+        :param tracts: census tracts
+        :type tracts: :py:class:`numpy.ndarray`
+        """
+        self.keys = keys
+        self.codes = codes
+        self.tracts = tracts
+
+    @staticmethod
+    def index_fname(bin_bbl_fname):
+        """
+        :param bin_bbl_fname: the buildings file
+        :type bin_bbl_fname: :py:class:`str`
+
+        :return: the name of the index directory, next to the buildings file
+        """
+        return "{}{}".format(splitext(bin_bbl_fname)[0], BUILDING_INDEX_EXT)
+
+    @staticmethod
+    def encode_keys(values):
+        """
+        encode BIN/BBL keys as int64
+
+        :param values: keys in `str` format
+        :type values: :py:class:`pandas.Series`
+
+        :return: int64 array, -1 for the keys that cannot be encoded
+        """
+        values = pd.Series(values, dtype=object)
+        valid = values.str.fullmatch(r'[1-9]\d{0,17}').fillna(False).values.astype(bool)
+
+        encoded = np.full(len(values), -1, dtype=np.int64)
+        encoded[valid] = values[valid].astype(np.int64).values
+        return encoded
+
+    @classmethod
+    def build(cls, bin_bbl_fname):
+        """
+        build the index from the buildings file
+
+        :param bin_bbl_fname: tab separated file with columns BIN, BBL, census_tract
+        :type bin_bbl_fname: :py:class:`str`
+
+        :return: BuildingIndex
+        """
+        df_bin_bbl = pd.read_csv(bin_bbl_fname, sep="\t", dtype=str, usecols=list(cls.KEYS) + [u'census_tract'])
+        df_bin_bbl = df_bin_bbl[df_bin_bbl[u'census_tract'].notnull()]
+
+        tract_codes, tracts = pd.factorize(df_bin_bbl[u'census_tract'])
+        tract_codes = tract_codes.astype(np.int32)
+
+        keys, codes = {}, {}
+        for key in cls.KEYS:
+            encoded = cls.encode_keys(df_bin_bbl[key].values)
+            valid = encoded >= 0
+            # stable sort, buildings of the same key keep the order of the file
+            order = np.argsort(encoded[valid], kind='mergesort')
+            keys[key] = encoded[valid][order]
+            codes[key] = tract_codes[valid][order]
+
+        return cls(keys, codes, np.asarray(tracts, dtype=str))
+
+    @classmethod
+    def load(cls, bin_bbl_fname, index_fname=None):
+        """
+        load the memory-mapped index, it is compiled when it is missing or the buildings file changed
+
+        :param bin_bbl_fname: the buildings file
+        :type bin_bbl_fname: :py:class:`str`
+
+        :param index_fname: the name of the index directory, next to the buildings file by default
+        :type index_fname: :py:class:`str`
+
+        :return: BuildingIndex
+        """
+        index_fname = index_fname or cls.index_fname(bin_bbl_fname)
+
+        meta_fname = join(index_fname, cls.META_FNAME)
+        if exists(meta_fname):
+            with open(meta_fname) as f:
+                meta = json.load(f)
+            if meta['source'] == cls._source_stat(bin_bbl_fname):
+                logging.info("building index loaded: %s", index_fname)
+                load = lambda name: np.load(join(index_fname, "{}.npy".format(name)), mmap_mode='r')
+                return cls({key: load("{}_keys".format(key)) for key in cls.KEYS},
+                           {key: load("{}_codes".format(key)) for key in cls.KEYS}, load("tracts"))
+
+        return cls.compile(bin_bbl_fname, index_fname)
+
+    @classmethod
+    def compile(cls, bin_bbl_fname, index_fname=None):
+        """
+        build the index from the buildings file & persist it
+
+        :param bin_bbl_fname: the buildings file
+        :type bin_bbl_fname: :py:class:`str`
+
+        :param index_fname: the name of the index directory, next to the buildings file by default
+        :type index_fname: :py:class:`str`
+
+        :return: BuildingIndex
+        """
+        index_fname = index_fname or cls.index_fname(bin_bbl_fname)
+        logging.info("compiling the building index: %s", index_fname)
+
+        index = cls.build(bin_bbl_fname)
+        index.save(index_fname, cls._source_stat(bin_bbl_fname))
+        return index
+
+    @staticmethod
+    def _source_stat(fname):
+        """
+        :param fname: the buildings file
+        :type fname: :py:class:`str`
+
+        :return: the size & modification time of the file
+        """
+        return [getsize(fname), getmtime(fname)]
+
+    def save(self, index_fname, source=None):
+        """
+        persist the index, the directory is written aside & moved in place
+
+        :param index_fname: the name of the index directory
+        :type index_fname: :py:class:`str`
+
+        :param source: the size & modification time of the buildings file, the index is rebuilt when they change
+        :type source: :py:class:`list`
+        """
+        tmp_fname = "{}.{}.tmp".format(index_fname, os.getpid())
+        if exists(tmp_fname):
+            shutil.rmtree(tmp_fname)
+        os.makedirs(tmp_fname)
+
+        for key in self.KEYS:
+            np.save(join(tmp_fname, "{}_keys.npy".format(key)), np.asarray(self.keys[key]))
+            np.save(join(tmp_fname, "{}_codes.npy".format(key)), np.asarray(self.codes[key]))
+        np.save(join(tmp_fname, "tracts.npy"), np.asarray(self.tracts))
+        with open(join(tmp_fname, self.META_FNAME), "w") as f:
+            json.dump({'source': source, 'nbr_tracts': len(self.tracts)}, f)
+
+        if exists(index_fname):
+            shutil.rmtree(index_fname)
+        os.rename(tmp_fname, index_fname)
+
+    def lookup(self, key, values):
+        """
+        look up keys, a key shared by several buildings (e.g. a BBL) matches all of them
+
+        :param key: the kind of key, BIN or BBL
+        :type key: :py:class:`str`
+
+        :param values: keys in `str` format
+        :type values: :py:class:`pandas.Series`
+
+        :return: (positions of the values, one per match, census tract codes)
+        """
+        encoded = self.encode_keys(values)
+        keys = self.keys[key]
+
+        first = np.searchsorted(keys, encoded, side='left')
+        last = np.searchsorted(keys, encoded, side='right')
+        counts = np.where(encoded >= 0, last - first, 0)
+
+        positions = np.repeat(np.arange(len(encoded)), counts)
+        # offsets of the matches within the keys sharing the value
+        offsets = np.arange(len(positions)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return positions, np.asarray(self.codes[key][first[positions] + offsets])
+
+    def join(self, df, key):
+        """
+        add the census tract of the buildings to a table, rows without building are dropped (inner join)
+
+        :param df: the table
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param key: the key column, BIN or BBL
+        :type key: :py:class:`str`
+
+        :return: DataFrame with a census_tract column
+        """
+        positions, codes = self.lookup(key, df[key].values)
+
+        df = df.iloc[positions].reset_index(drop=True)
+        df[u'census_tract'] = np.asarray(self.tracts)[codes].astype(object)
+        return df
@@ -1,13 +1,15 @@
-# from data_acquisition.services.nominatim_client import NominatimAPI
-# from data_acquisition.services.google_maps_client import GoogleMapsAPI
+from os.path import abspath, join
 import pandas as pd
-from math import isnan
 import logging
+from data_processing.data_transformer import DataTransformer
+from data_processing.geocoding_engine import GeocodingEngine, GazetteerBackend, OK
+from resources.constants import PROCESSED_DIR, NYC_STREETS_OUT, GEOCODER_CACHE_FNAME, GEOCODER_WORKERS, NULL
 
 
 class NYCGeocoder():
 
-    def __init__(self, data=None, city="New York", state="NY", country="USA"):
+    def __init__(self, data=None, city="New York", state="NY", country="USA", backend=None, cache_fname=None,
+                 max_workers=GEOCODER_WORKERS):
         """
 
         :param data:
@@ -22,6 +24,14 @@ class NYCGeocoder():
         :param country:
         :type country:
 
+        :param backend: the geocoding backend, the offline gazetteer built from the LION streets by default
+        :type backend: :py:class:`data_processing.geocoding_engine.GeocoderBackend`
+
+        :param cache_fname: the name of the SQLite cache of the geocoded addresses
+        :type cache_fname: :py:class:`str`
+
+        :param max_workers: the number of concurrent lookups of the online backends
+        :type max_workers: :py:class:`int`
         """
         self.data = data
 
@@ -29,6 +39,44 @@ class NYCGeocoder():
         self.state = state
         self.country = country
 
+        if backend is None:
+            backend = GazetteerBackend(abspath(join(PROCESSED_DIR, NYC_STREETS_OUT)))
+        cache_fname = cache_fname or abspath(join(PROCESSED_DIR, GEOCODER_CACHE_FNAME))
+        self.engine = GeocodingEngine(backend, cache_fname, max_workers)
+
+    def build_addresses(self, df):
+        """
+        build the addresses of the incidents
+
+        :param df: raw incidents
+        :type df: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame with columns postal_address (e.g. 2026 3rd Ave, New York, NY 10029, USA) & street_address
+                 (e.g. 3RD AVE, NEW YORK, NY 10029)
+        """
+        # UUU means undefined
+        property_nbr = df[u'PROPERTY_USE_DESC'].str.replace(r'-.*', '', regex=True).str.strip()
+        property_nbr = property_nbr.where(property_nbr != 'UUU', "").fillna("")
+
+        borough = df[u'BOROUGH_DESC'].str.replace(r'^[^-]*-', '', regex=True)
+
+        # Cleaning the noises
+        zip_code = df[u'ZIP_CODE'].str.replace(r'-.*', '', regex=True).str.strip().fillna("")
+
+        # convert address to: 2026 3rd Ave, New York, NY 10029, USA
+        postal_address = property_nbr + " " + df[u'STREET_HIGHWAY'].fillna("") + ", " + borough.str.strip() + \
+            ", {}, {} ".format(self.city, self.state) + zip_code + ", {}".format(self.country)
+        postal_address = postal_address.str.strip()
+
+        # same street address as the normalized incidents: 'W 151ST ST, NEW YORK, NY 10031'
+        streets = DataTransformer().normalize_addresses(df[u'STREET_HIGHWAY'])
+        county = borough.str.replace('Manhattan', 'New York').str.replace('Brooklyn', 'Kings')
+        county = county.str.replace('Staten Island', 'RICHMOND').str.upper().fillna(NULL)
+        street_address = streets + "," + county + ", NY " + df[u'ZIP_CODE'].str.upper().fillna(NULL)
+
+        return pd.DataFrame({'postal_address': postal_address, 'street_address': street_address},
+                            index=df.index)
+
     def convert_nyc_addr_to_latlng(self, fname_input, fname_out):
         """
         convert an address from New York City to Lat/Lng
@@ -39,41 +87,11 @@ class NYCGeocoder():
         :param fname_out: the name of the output file
         :type fname_out: :py:class:`str`
         """
-        df = pd.read_csv(fname_input)
-        with open(fname_out, "w") as f_out:
-            for index, row in df.iterrows():
-
-                if isinstance(row[u'PROPERTY_USE_DESC'], str):
-                    property_nbr = row[u'PROPERTY_USE_DESC'].split("-")[0].strip()
-
-                    # UUU means undefined
-                    if property_nbr == 'UUU':
-                        property_nbr = ""
-                elif isinstance(row[u'PROPERTY_USE_DESC'], float):
-                    property_nbr = row[u'PROPERTY_USE_DESC']
-
-                borough = row[u'BOROUGH_DESC'].split("-")[1].strip()
-
-                # Cleaning the noises
-                if isinstance(row[u'ZIP_CODE'], str):
-                    zip_code = row[u'ZIP_CODE'].split("-")[0].strip
-
-                elif isinstance(row[u'ZIP_CODE'], float) and isnan(row[u'ZIP_CODE']):
-                    zip_code = ""
-
-                else:
-                    zip_code = int(row[u'ZIP_CODE'])
-
-                street_highway = row[u'STREET_HIGHWAY']
-
-                # convert address to: 2026 3rd Ave, New York, NY 10029, USA
-                address = "{} {}, {}, {}, {} {}, {}".format(property_nbr, street_highway, borough, self.city,
-                                                            self.state, zip_code, self.country)
-                address_geo_info = geocoder_api.geocode(address)
-                logging.info('Index: %s - Status: %s', index, address_geo_info.get(u'status'))
-                if address_geo_info.get(u'status') == u'OK':
-                    lat = address_geo_info.get('results', [])[0].get(u'geometry', {}).get(u'location', {}).get(u'lat',
-                                                                                                               None)
-                    lng = address_geo_info.get('results', [])[0].get(u'geometry', {}).get(u'location', {}).get(u'lng',
-                                                                                                               None)
-                    f_out.write("{}\t{}\t{}\n".format(index, lat, lng))
+        df = pd.read_csv(fname_input, dtype=str)
+        df_addresses = self.build_addresses(df)
+
+        df_geocodes = self.engine.geocode(df_addresses[self.engine.backend.ADDRESS_FIELD])
+        logging.info('%s/%s incidents geocoded', (df_geocodes['status'] == OK).sum(), len(df_geocodes))
+
+        df_geocodes = df_geocodes[df_geocodes['status'] == OK]
+        df_geocodes[['lat', 'lng']].to_csv(fname_out, sep="\t", header=False)
@@ -35,7 +35,8 @@ class DataQuester():
         - nyc_fire_incident
         - nyc_census
         """
-        query = "update nyc_fire_incident set tract_id = ( select right_bloc from nyc_streets_segments where nyc_fire_incident.address = nyc_streets_segments.street)  where exists ( select right_bloc from nyc_streets_segments where nyc_fire_incident.address = nyc_streets_segments.street);"
+        # single join instead of a correlated subquery per incident
+        query = "update nyc_fire_incident set tract_id = nyc_streets_segments.right_bloc from nyc_streets_segments where nyc_fire_incident.address = nyc_streets_segments.street;"
         records = self.db_connector.run_query(query)
         return records
 
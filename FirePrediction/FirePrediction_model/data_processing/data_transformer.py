@@ -1,22 +1,45 @@
 import pandas as pd
 import json
 from math import isnan
-from collections import Counter, defaultdict
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 import re
-from shapely.wkt import loads
 import logging
+from os.path import exists
 import geopandas as gpd
 from resources.constants import RELEVANT_FEATURES, STANDARD_TIME_FORMAT, VIOLATION_FORMAT, COMPLAINT_FORMAT, \
     STANDARD_TIME_FORMAT_M, BORO_STR_CODE, BORO_CODE, CENSUS_FIELDS, INCIDENT_TIME_FORMAT, DAY_TIME_FORMAT, NULL, \
-    STANDARD_TIME_FORMAT
+    STANDARD_TIME_FORMAT, WEEKDAY_FEATURES, MONTH_FEATURES, HOLIDAY_FEATURES, DAY_OF_YEAR_FEATURES, \
+    ENCODE_HOLIDAYS, ENCODE_DAY_OF_YEAR
+from pandas.tseries.holiday import USFederalHolidayCalendar
 from resources.time_toolbox import TimeToolbox
+from resources.data_store import DataStore
+from resources.schemas import read_csv
+from data_processing.tract_resolver import TractResolver
+from data_processing.join_engine import JoinEngine
+from data_processing.building_index import BuildingIndex
+from data_processing.history_features import HistoryFeatures
 import numpy as np
 
 
 class DataTransformer():
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, store=None):
+        """
+        :param data: data to be transformed
+        :type data: :py:class:`pandas.DataFrame`
+
+        :param store: store used to exchange intermediate tables between stages
+        :type store: :py:class:`resources.data_store.DataStore`
+        """
         self.data = data
+        self.store = store if store is not None else DataStore()
+        # BIN/BBL -> census tract indexes, by file name
+        self.building_indexes = {}
+
+    # whitespaces between the pieces of an address & numeric pieces (e.g. 151 in W 151 ST)
+    WHITESPACE_RE = re.compile(r'\s+')
+    NUMBER_RE = re.compile(r'(?<!\S)\d+(?!\S)')
 
     def normalize_address(self, street_address):
         """
@@ -29,10 +52,26 @@ class DataTransformer():
         if isinstance(street_address, float) and isnan(street_address):
             street_address = NULL
         else:
-            street_address = " ".join(
-                [self.ordinal(piece) if piece.isdigit() else str(piece).rstrip() for piece in street_address.split()])
+            street_address = self.WHITESPACE_RE.sub(" ", street_address).strip()
+            street_address = self.NUMBER_RE.sub(lambda match: self.ordinal(match.group(0)), street_address)
         return street_address.upper()
 
+    def normalize_addresses(self, street_addresses):
+        """
+        clean & normalize a column of addresses, every distinct address is normalized once
+
+        :param street_addresses: street names
+        :type street_addresses: :py:class:`pandas.Series`
+
+        :return: Series
+        """
+        codes, uniques = pd.factorize(street_addresses)
+        normalized = [self.normalize_address(street_address) for street_address in uniques]
+
+        # missing addresses (code -1) are null
+        normalized = np.array(normalized + [NULL.upper()], dtype=object)
+        return pd.Series(normalized[codes], index=street_addresses.index, name=street_addresses.name)
+
     def json_to_csv(self, input_fname, out_fname):
         """
         convert the json file to csv
@@ -77,7 +116,7 @@ class DataTransformer():
 
         return '%s%s' % (nbr, ORD_INDICATOR)
 
-    def normalize_nyc_incidents_file(self, input_fname, out_fname):
+    def normalize_nyc_incidents_file(self, input_fname, out_fname, chunksize=None, n_jobs=1):
         """
         clean & normalize data of the file
 
@@ -86,30 +125,68 @@ class DataTransformer():
 
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
-        """
-        df = pd.read_csv(input_fname, sep=",", dtype=str)
 
-        logging.info("DataFrame has been loaded")
+        :param chunksize: the number of rows normalized at once, the whole file by default
+        :type chunksize: :py:class:`int`
+
+        :param n_jobs: the number of processes that normalize the chunks
+        :type n_jobs: :py:class:`int`
+        """
+        if chunksize is None:
+            df = pd.read_csv(input_fname, sep=",", dtype=str)
+
+            logging.info("DataFrame has been loaded")
+
+            # print df[u'ADDRESS'].values()
+            self.store.write(self.normalize_incidents(df), out_fname)
+            return
+
+        # stream the file: at most 2 chunks per process are in memory, they are appended in order
+        reader = pd.read_csv(input_fname, sep=",", dtype=str, chunksize=chunksize)
+        with self.store.open_writer(out_fname) as writer:
+            if n_jobs == 1:
+                for df in reader:
+                    writer.write(self.normalize_incidents(df))
+                    logging.info("%s incidents normalized", writer.nbr_rows)
+                return
+
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+            try:
+                pending = deque()
+                for df in reader:
+                    pending.append(executor.submit(self.normalize_incidents, df))
+                    if len(pending) >= 2 * n_jobs:
+                        writer.write(pending.popleft().result())
+                        logging.info("%s incidents normalized", writer.nbr_rows)
+
+                while pending:
+                    writer.write(pending.popleft().result())
+                    logging.info("%s incidents normalized", writer.nbr_rows)
+            finally:
+                executor.shutdown(wait=True)
+
+    def normalize_incidents(self, df):
+        """
+        clean & normalize incidents
 
-        df[u'ZIP_CODE'].apply(lambda x: x.split("-")[0].strip if isinstance(x, str) else str(x))
+        :param df: raw incidents
+        :type df: :py:class:`pandas.DataFrame`
 
-        df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].apply(lambda x: x.split('-', 1)[1]).str.replace('Manhattan',
-                                                                                                  'New York')
+        :return: DataFrame
+        """
+        df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].str.split('-', n=1).str[1].str.replace('Manhattan', 'New York')
         df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].str.replace('Brooklyn', 'Kings')
         df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].str.replace('Staten Island', 'RICHMOND')
 
-        df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].apply(
-            lambda x: NULL if isinstance(x, float) and isnan(x) else x.upper())
-        df[u'ZIP_CODE'] = df[u'ZIP_CODE'].apply(lambda x: NULL if isinstance(x, float) and isnan(x) else x.upper())
+        df[u'BOROUGH_DESC'] = df[u'BOROUGH_DESC'].str.upper().fillna(NULL)
+        df[u'ZIP_CODE'] = df[u'ZIP_CODE'].str.upper().fillna(NULL)
         # 'W 151st ST, NEW YORK, NY 10031'
-        df[u'ADDRESS'] = df.apply(
-            lambda x: "{},{}, NY {}".format(self.normalize_address(x['STREET_HIGHWAY']), x['BOROUGH_DESC'],
-                                            x['ZIP_CODE']), axis=1)
+        df[u'ADDRESS'] = self.normalize_addresses(df['STREET_HIGHWAY']) + "," + df[u'BOROUGH_DESC'] + ", NY " + \
+            df[u'ZIP_CODE']
 
         df.rename(columns={_: _.lower().replace(" ", "_") for _ in df.columns}, inplace=True)
 
-        # print df[u'ADDRESS'].values()
-        df.to_csv(out_fname, index=False, sep="\t")
+        return df
 
     def join_with_tracts(self, incidents_input_fname, street_input_fname, output_fname):
         """
@@ -126,28 +203,49 @@ class DataTransformer():
         :param output_fname: the name of the output file
         :type output_fname: :py:class:`str`
         """
-        FIPS_CODE_NBR = 11
+        tract_resolver = self.load_tract_resolver(street_input_fname)
+        df_incidents = self.store.read(incidents_input_fname)
 
-        df_streets = pd.read_csv(street_input_fname, sep="\t")
-        df_incidents = pd.read_csv(incidents_input_fname, sep="\t")
+        # export to the intermediate store
+        self.store.write(self.map_incidents_to_tracts(df_incidents, tract_resolver), output_fname)
 
-        # map streets to tracts
-        streets_tracts_mapper = {x: str(y)[:FIPS_CODE_NBR] for (x, y) in
-                                 zip(df_streets[u'street'].values, df_streets[u'left_block'].values)}
+    @staticmethod
+    def load_tract_resolver(street_input_fname):
+        """
+        load the streets/tracts index, it is built & persisted on the first run
+
+        :param street_input_fname: the name of file that contains streets information
+        :type street_input_fname: :py:class:`str`
+
+        :return: TractResolver
+        """
+        return TractResolver.load(street_input_fname)
+
+    @staticmethod
+    def map_incidents_to_tracts(df_incidents, tract_resolver):
+        """
+        map incidents to census tracts through their street address
+
+        :param df_incidents: normalized incidents
+        :type df_incidents: :py:class:`pandas.DataFrame`
 
-        # I avoided using string similarity to infer streets' names. However, we can use text matching with a threshold
-        df_incidents[u'census_tract'] = df_incidents[u'address'].apply(lambda x: streets_tracts_mapper.get(x, None))
+        :param tract_resolver: streets/tracts index
+        :type tract_resolver: :py:class:`data_processing.tract_resolver.TractResolver`
+
+        :return: DataFrame with columns incident_date_time, address, census_tract
+        """
+        # exact match of the street, then fuzzy match among the streets of the same county/zip code
+        df_incidents[u'census_tract'] = tract_resolver.resolve_addresses(df_incidents[u'address'])
 
         # filter those that are not in the street dataset
-        df_incidents = df_incidents[df_incidents[u'census_tract'] != None]
+        df_incidents = df_incidents[df_incidents[u'census_tract'].notnull()]
 
         # mark relevant columns
         relevant_columns = ['incident_date_time', 'address', 'census_tract']
 
-        # export to csv file
-        df_incidents[relevant_columns].to_csv(output_fname, index=False, sep="\t")
+        return df_incidents[relevant_columns]
 
-    def flatten_incidents_tracts(self, incidents_input_fname, nyc_census_fname, output_fname):
+    def flatten_incidents_tracts(self, incidents_input_fname, nyc_census_fname, output_fname, vectorized=True):
         """
         flatten incidents/
 
@@ -159,27 +257,20 @@ class DataTransformer():
 
         :param output_fname: the name of the output file
         :type output_fname: :py:class:`str`
+
+        :param vectorized: build the date x tract grid with numpy instead of a python dict
+        :type vectorized: :py:class:`bool`
         """
-        time_toolbox = TimeToolbox()
+        # load files
+        df_incidents = self.store.read(incidents_input_fname)
+        df_nyc_census = self.load_census_data(nyc_census_fname)
 
-        # load csv files
-        df_incidents = pd.read_csv(incidents_input_fname, sep="\t", dtype=str)
-        df_nyc_census = pd.read_csv(nyc_census_fname, sep="\t", dtype=str)
+        if vectorized:
+            self.store.write(self.flatten_incidents(df_incidents, df_nyc_census), output_fname)
+            return
 
-        # get the min/max of datetime + get all possible dates
-        min_dt_time, max_dt_time = min(df_incidents['incident_date_time'].values), max(
-            df_incidents['incident_date_time'].values)
-        all_possible_dates = time_toolbox.generate_dates(min_dt_time, max_dt_time, INCIDENT_TIME_FORMAT,
-                                                         STANDARD_TIME_FORMAT)
-
-        # # normalize census tract field
-        df_nyc_census[u'census_tract'] = df_nyc_census.apply(
-            lambda x: "{}{}{}".format(x['state'], str(x['county']).zfill(3), str(x['tract']).zfill(6)), axis=1)
-        all_possible_tracts = df_nyc_census[u'census_tract'].values
+        df_incidents, all_possible_dates, all_possible_tracts = self.incidents_grid_axes(df_incidents, df_nyc_census)
 
-        # # # group-by incidents datetime to calculate the frequency
-        df_incidents[u'incident_date_time'] = df_incidents['incident_date_time'].apply(
-            lambda dt: time_toolbox.normalize_dt(dt, INCIDENT_TIME_FORMAT, STANDARD_TIME_FORMAT))
         df_incidents = df_incidents.groupby([u'incident_date_time', u'census_tract']).size().reset_index(
             name='nbr_incidents')
 
@@ -196,6 +287,107 @@ class DataTransformer():
                     nbr_incidents = incidents_mapper[(dt, tract)]
                     f.write("{}\t{}\t{}\n".format(dt, tract, nbr_incidents))
 
+        # the legacy path writes text, move it to the store when it holds another format
+        if self.store.path(output_fname) != output_fname:
+            self.store.write(pd.read_csv(output_fname, sep="\t", dtype=str), output_fname)
+
+    def flatten_incidents(self, df_incidents, df_nyc_census):
+        """
+        flatten incidents on the dense date x tract grid
+
+        :param df_incidents: incidents mapped to census tracts
+        :type df_incidents: :py:class:`pandas.DataFrame`
+
+        :param df_nyc_census: census data indexed by census tract
+        :type df_nyc_census: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame with columns incident_date_time, census_tract, nbr_incidents
+        """
+        df_incidents, all_possible_dates, all_possible_tracts = self.incidents_grid_axes(df_incidents, df_nyc_census)
+        return self.build_incidents_grid(df_incidents, all_possible_dates, all_possible_tracts)
+
+    @staticmethod
+    def incidents_grid_axes(df_incidents, df_nyc_census):
+        """
+        normalize the incidents dates & get the dates/tracts of the grid
+
+        :param df_incidents: incidents mapped to census tracts
+        :type df_incidents: :py:class:`pandas.DataFrame`
+
+        :param df_nyc_census: census data indexed by census tract
+        :type df_nyc_census: :py:class:`pandas.DataFrame`
+
+        :return: incidents, all possible dates, all possible tracts
+        """
+        time_toolbox = TimeToolbox()
+
+        # get the min/max of datetime + get all possible dates
+        min_dt_time, max_dt_time = min(df_incidents['incident_date_time'].values), max(
+            df_incidents['incident_date_time'].values)
+        all_possible_dates = list(time_toolbox.generate_dates(min_dt_time, max_dt_time, INCIDENT_TIME_FORMAT,
+                                                              STANDARD_TIME_FORMAT))
+
+        all_possible_tracts = df_nyc_census.index.values
+
+        # # # group-by incidents datetime to calculate the frequency
+        df_incidents[u'incident_date_time'] = time_toolbox.normalize_dt_column(df_incidents['incident_date_time'],
+                                                                              INCIDENT_TIME_FORMAT,
+                                                                              STANDARD_TIME_FORMAT)
+
+        return df_incidents, all_possible_dates, all_possible_tracts
+
+    @staticmethod
+    def census_tract_key(df_census):
+        """
+        build the 11-digit census tract key (state + county + tract) of a census data-frame
+
+        :param df_census: census data with `state`, `county` and `tract` columns
+        :type df_census: :py:class:`pandas.DataFrame`
+
+        :return: census tract keys
+        """
+        return df_census['state'].astype(str) + df_census['county'].astype(str).str.zfill(3) + \
+               df_census['tract'].astype(str).str.zfill(6)
+
+    @staticmethod
+    def build_incidents_grid(df_incidents, all_possible_dates, all_possible_tracts):
+        """
+        count incidents on the dense date x tract grid
+
+        dates & tracts are factorized into integer codes and the counts are scattered with `np.bincount`, rows follow
+        the order of `all_possible_dates` then `all_possible_tracts`, incidents that fall outside the grid are dropped
+
+        :param df_incidents: incidents with normalized `incident_date_time` and `census_tract` columns
+        :type df_incidents: :py:class:`pandas.DataFrame`
+
+        :param all_possible_dates: dates of the grid
+        :type all_possible_dates: :py:class:`list`
+
+        :param all_possible_tracts: census tracts of the grid
+        :type all_possible_tracts: :py:class:`list`
+
+        :return: DataFrame with columns incident_date_time, census_tract, nbr_incidents
+        """
+        dates = pd.Index(all_possible_dates)
+        tract_codes, tracts = pd.factorize(np.asarray(all_possible_tracts, dtype=object))
+        tracts = pd.Index(tracts)
+
+        # map incidents to grid cells
+        date_idx = dates.get_indexer(df_incidents[u'incident_date_time'].values)
+        tract_idx = tracts.get_indexer(df_incidents[u'census_tract'].values)
+        in_grid = (date_idx >= 0) & (tract_idx >= 0)
+
+        cells = date_idx[in_grid].astype(np.int64) * len(tracts) + tract_idx[in_grid]
+        counts = np.bincount(cells, minlength=len(dates) * len(tracts)).reshape(len(dates), len(tracts))
+
+        # the keys are categorical columns, the joins with the lookup tables use their integer codes
+        date_codes = np.repeat(np.arange(len(dates)), len(tract_codes))
+        return pd.DataFrame({u'incident_date_time': pd.Categorical.from_codes(date_codes, categories=dates),
+                             u'census_tract': pd.Categorical.from_codes(np.tile(tract_codes, len(dates)),
+                                                                        categories=tracts),
+                             u'nbr_incidents': counts[:, tract_codes].ravel()},
+                            columns=[u'incident_date_time', u'census_tract', u'nbr_incidents'])
+
     def join_with_census_data(self, incidents_tracts_fname, nyc_census_fname, out_fname):
         """
         join two files incidents_tracts_fname, nyc_census_fname >> incidents_tracts_census_fname
@@ -212,29 +404,69 @@ class DataTransformer():
 
         # logging.info("DataFrame has been loaded")
 
-        df_incidents_tracts = pd.read_csv(incidents_tracts_fname, sep="\t", dtype=str)
-        df_nyc_census = pd.read_csv(nyc_census_fname, sep="\t", dtype=str)
+        df_incidents_tracts = self.store.read(incidents_tracts_fname)
+        df_nyc_census = self.load_census_data(nyc_census_fname)
+
+        self.store.write(self.merge_census_data(df_incidents_tracts, df_nyc_census), out_fname)
+
+    def load_census_data(self, nyc_census_fname):
+        """
+        load census data indexed by census tract
+
+        :param nyc_census_fname: the name of file that contains contextual data nyc_census_fname
+        :type nyc_census_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        # sharded downloads are written to the store, tables of the single-query download are tab separated files
+        if exists(self.store.path(nyc_census_fname)):
+            df_nyc_census = self.store.read(nyc_census_fname)
+        else:
+            df_nyc_census = read_csv(nyc_census_fname, sep="\t")
+        df_nyc_census.index = pd.Index(self.census_tract_key(df_nyc_census), name=u'census_tract')
+        return df_nyc_census
+
+    @staticmethod
+    def merge_census_data(df_incidents_tracts, df_nyc_census):
+        """
+        join incidents/tracts with census data
 
-        df_nyc_census[u'census_tract'] = df_nyc_census.apply(
-            lambda x: "{}{}{}".format(x['state'], str(x['county']).zfill(3), str(x['tract']).zfill(6)), axis=1)
+        :param df_incidents_tracts: incidents/tracts
+        :type df_incidents_tracts: :py:class:`pandas.DataFrame`
 
-        df = pd.merge(df_incidents_tracts, df_nyc_census, on='census_tract')
+        :param df_nyc_census: census data indexed by census tract
+        :type df_nyc_census: :py:class:`pandas.DataFrame`
 
-        df.to_csv(out_fname, index=False, sep="\t")
+        :return: DataFrame
+        """
+        return JoinEngine.join(df_incidents_tracts, df_nyc_census, on=[u'census_tract'], how='inner')
 
-    def rename_columns(self, input_fname):
+    def rename_columns(self, input_fname, out_fname=None):
         """
         rename the columns, from encoded to readable columns
 
         :param input_fname: the name of file that contains incidents/tracts input
         :type input_fname: :py:class:`str`
+
+        :param out_fname: the name of the output file, the input file is overwritten by default
+        :type out_fname: :py:class:`str`
         """
         # load file
-        df = pd.read_csv(input_fname, sep="\t", dtype=str)
-        # remame census
-        df.rename(columns={_: CENSUS_FIELDS.get(_, _) for _ in df.columns}, inplace=True)
-        # convert to csv file
-        df.to_csv(input_fname, index=False, sep="\t")
+        df = self.store.read(input_fname)
+        # remame census & write to the store
+        self.store.write(self.rename_census_columns(df), out_fname or input_fname)
+
+    @staticmethod
+    def rename_census_columns(df):
+        """
+        rename census columns, from encoded to readable columns
+
+        :param df: incidents/tracts/context
+        :type df: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
+        return df.rename(columns={_: CENSUS_FIELDS.get(_, _) for _ in df.columns})
 
     def join_with_weather_data(self, incidents_tracts_census_fname, weather_fname, out_fname):
         """
@@ -249,14 +481,39 @@ class DataTransformer():
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
         """
-        df_incidents_tracts_census = pd.read_csv(incidents_tracts_census_fname, sep="\t", dtype=str)
-        df_weather = pd.read_csv(weather_fname, sep="\t", dtype=str)
+        df_incidents_tracts_census = self.store.read(incidents_tracts_census_fname)
+        df_weather = self.load_weather_data(weather_fname)
+
+        # write to the store
+        self.store.write(self.merge_weather_data(df_incidents_tracts_census, df_weather), out_fname)
+
+    @staticmethod
+    def load_weather_data(weather_fname):
+        """
+        load weather data indexed by observation date
+
+        :param weather_fname: the name of file that contains weather's information on a daily basis
+        :type weather_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        df_weather = read_csv(weather_fname, sep="\t")
+        return df_weather.set_index('observation_date_time', drop=False)
+
+    @staticmethod
+    def merge_weather_data(df_incidents_tracts_census, df_weather):
+        """
+        join incidents/tracts/census with weather data
 
-        df = pd.merge(df_incidents_tracts_census, df_weather, left_on='incident_date_time',
-                      right_on='observation_date_time')
+        :param df_incidents_tracts_census: incidents/tracts/census
+        :type df_incidents_tracts_census: :py:class:`pandas.DataFrame`
 
-        # convert to csv file
-        df.to_csv(out_fname, index=False, sep="\t")
+        :param df_weather: weather data indexed by observation date
+        :type df_weather: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
+        return JoinEngine.join(df_incidents_tracts_census, df_weather, on=[u'incident_date_time'], how='inner')
 
     def join_complains_tracts(self, db_complaints_fname, street_input_fname, out_fname):
         """
@@ -274,6 +531,74 @@ class DataTransformer():
 
         return None
 
+    @staticmethod
+    def index_buildings(bin_bbl_fname, index_fname=None):
+        """
+        compile the BIN/BBL -> census tract index of the buildings
+
+        :param bin_bbl_fname: file name
+        :type bin_bbl_fname: :py:class:`str`
+
+        :param index_fname: the name of the index directory, next to the buildings file by default
+        :type index_fname: :py:class:`str`
+        """
+        BuildingIndex.compile(bin_bbl_fname, index_fname)
+
+    def load_bin_bbl(self, bin_bbl_fname):
+        """
+        load the memory-mapped BIN/BBL -> census tract index of the buildings, it is loaded once & shared by the
+        aggregations
+
+        :param bin_bbl_fname: file name
+        :type bin_bbl_fname: :py:class:`str`
+
+        :return: BuildingIndex
+        """
+        if bin_bbl_fname not in self.building_indexes:
+            self.building_indexes[bin_bbl_fname] = BuildingIndex.load(bin_bbl_fname)
+        return self.building_indexes[bin_bbl_fname]
+
+    @staticmethod
+    def bbl_keys(boro, block, lot):
+        """
+        build the BBL keys (borough + block + lot) of a table, the blocks longer than 5 digits are padded with as
+        many zeros as extra digits & the 5-digit lots lose their first digit
+
+        :param boro: borough codes
+        :type boro: :py:class:`pandas.Series`
+
+        :param block: blocks
+        :type block: :py:class:`pandas.Series`
+
+        :param lot: lots
+        :type lot: :py:class:`pandas.Series`
+
+        :return: Series of BBL keys, null if a piece is missing
+        """
+        # few distinct lengths, every group of blocks is padded at once
+        block_len = block.str.len()
+        for length in block_len[block_len > 5].unique():
+            is_length = block_len == length
+            block = block.where(~is_length, '0' * (int(length) - 5) + block)
+
+        lot = lot.where(lot.str.len() != 5, lot.str[1:])
+
+        return boro + block + lot
+
+    @staticmethod
+    def pad_years(dates):
+        """
+        keep the 8-character dates, those with a 2-digit year once spaces removed are prefixed with 20
+
+        :param dates: dates in `str` format
+        :type dates: :py:class:`pandas.Series`
+
+        :return: Series of dates, without the dates of other lengths
+        """
+        dates = dates[dates.str.len() == 8]
+        compact = dates.str.replace(" ", "", regex=False)
+        return dates.where(compact.str.len() != 6, '20' + compact)
+
     def aggregate_complaints_data(self, bin_bbl_fname, dob_complaints_fname, dob_complaints_agg_fname):
         """
         aggregate dob file
@@ -292,25 +617,22 @@ class DataTransformer():
         """
         time_toolbox = TimeToolbox()
 
-        # lambda functions to process the data
-        pad_zeros = lambda x: '0' * (len(x) - 5) + x
-        remove_zeros = lambda x: x[1:] if len(x) == 5 else x
-        standarize_boro = lambda x: x[:1] if len(x) > 1 else x
-
         # new york bin/bbl buildings
-        df_bin_bbl = pd.read_csv(bin_bbl_fname, sep="\t", dtype=str)
+        building_index = self.load_bin_bbl(bin_bbl_fname)
 
         # reading csv file
-        df_dob_complaints = pd.read_csv(dob_complaints_fname, sep=",", dtype=str)
+        df_dob_complaints = pd.read_csv(dob_complaints_fname, sep=",", dtype=str,
+                                        usecols=[u'BIN', u'Date Entered', u'Disposition Code', u'Complaint Category'])
 
         # add BIN
-        df_dob_complaints = df_dob_complaints.merge(df_bin_bbl, how='inner', on='BIN')
+        df_dob_complaints = building_index.join(df_dob_complaints, u'BIN')
 
         # convert time to monthly
-        df_dob_complaints[u'Date Entered'] = df_dob_complaints[u'Date Entered'].apply(
-            lambda dt: time_toolbox.normalize_dt(dt, COMPLAINT_FORMAT, STANDARD_TIME_FORMAT_M))
+        df_dob_complaints[u'Date Entered'] = time_toolbox.normalize_dt_column(df_dob_complaints[u'Date Entered'],
+                                                                             COMPLAINT_FORMAT, STANDARD_TIME_FORMAT_M)
 
-        df_dob_complaints = df_dob_complaints[[u'census_tract', u'Date Entered', u'Disposition Code']]
+        df_dob_complaints = df_dob_complaints[[u'census_tract', u'Date Entered', u'Disposition Code',
+                                               u'Complaint Category']]
 
         # total complaints/disposition monthly
         # no need to filter specific dispositions/ complaints
@@ -321,8 +643,8 @@ class DataTransformer():
 
         df = pd.merge(df_temp_a, df_temp_b, on=[u'census_tract', u'Date Entered'])
 
-        df[[u'census_tract', u'Date Entered', 'nbr_dispositions', 'nbr_complaints', ]].to_csv(dob_complaints_agg_fname,
-                                                                                              index=False, sep="\t")
+        self.store.write(df[[u'census_tract', u'Date Entered', 'nbr_dispositions', 'nbr_complaints', ]],
+                         dob_complaints_agg_fname)
 
     def aggregate_violations_data(self, bin_bbl_fname, dob_violations_fname, ecb_violations_fname,
                                   dob_ecb_violations_agg_fname):
@@ -343,68 +665,44 @@ class DataTransformer():
         """
         time_toolbox = TimeToolbox()
 
-        # lambda functions to process the data
-        pad_zeros = lambda x: '0' * (len(x) - 5) + x
-        remove_zeros = lambda x: x[1:] if len(x) == 5 else x
-        standarize_boro = lambda x: x[:1] if len(x) > 1 else x
-        pad_year = lambda x: '20' + x.replace(" ", "") if len(x.replace(" ", "")) == 6 else x
-
         # new york bin/bbl buildings
-        df_bin_bbl = pd.read_csv(bin_bbl_fname, sep="\t", dtype=str)
+        building_index = self.load_bin_bbl(bin_bbl_fname)
 
         # read csv files
-        df_ecb_violations = pd.read_csv(ecb_violations_fname, sep=",", dtype=str)
-        df_dob_violations = pd.read_csv(dob_violations_fname, sep=",", dtype=str)
-
-        # # clean / merge df_dob_violations
-        df_ecb_violations[u'BORO'] = df_ecb_violations[u'BORO'].astype(str)
-        df_ecb_violations[u'BLOCK'] = df_ecb_violations[u'BLOCK'].astype(str)
-        df_ecb_violations[u'LOT'] = df_ecb_violations[u'LOT'].astype(str)
-        df_ecb_violations[u'BBL'] = df_ecb_violations.apply(
-            lambda row: "{}{}{}".format(standarize_boro(row[u'BORO']), pad_zeros(row[u'BLOCK']),
-                                        remove_zeros(row[u'LOT'])), axis=1)
+        columns = [u'BORO', u'BLOCK', u'LOT', u'ISSUE_DATE']
+        df_ecb_violations = pd.read_csv(ecb_violations_fname, sep=",", dtype=str, usecols=columns)
+        df_dob_violations = pd.read_csv(dob_violations_fname, sep=",", dtype=str, usecols=columns)
 
-        # filter relevant columns
-        df_ecb_violations = df_ecb_violations[[u'BBL', 'ISSUE_DATE', 'VIOLATION_TYPE']]
+        # # clean / merge df_ecb_violations, the borough is the first character of BORO
+        df_ecb_violations[u'BBL'] = self.bbl_keys(df_ecb_violations[u'BORO'].str[:1], df_ecb_violations[u'BLOCK'],
+                                                  df_ecb_violations[u'LOT'])
 
         # add BIN
-        df_ecb_violations = df_ecb_violations.merge(df_bin_bbl, how='inner', on='BBL')
+        df_ecb_violations = building_index.join(df_ecb_violations[[u'BBL', u'ISSUE_DATE']], u'BBL')
 
-        # filter data
-        df_ecb_violations[u'_remove'] = df_ecb_violations[u'ISSUE_DATE'].apply(lambda x: len(x) == 8)
-        df_ecb_violations = df_ecb_violations[df_ecb_violations[u'_remove'] == True]
-
-        # # convert time to monthly
-        df_ecb_violations[u'ISSUE_DATE'] = df_ecb_violations[u'ISSUE_DATE'].apply(
-            lambda dt: time_toolbox.normalize_dt(pad_year(dt), VIOLATION_FORMAT, STANDARD_TIME_FORMAT_M))
+        # filter data & convert time to monthly
+        ecb_dates = self.pad_years(df_ecb_violations[u'ISSUE_DATE'])
+        df_ecb_violations = df_ecb_violations.loc[ecb_dates.index]
+        df_ecb_violations[u'ISSUE_DATE'] = time_toolbox.normalize_dt_column(ecb_dates, VIOLATION_FORMAT,
+                                                                            STANDARD_TIME_FORMAT_M)
 
         # total ecb/dob violations monthly
         # no need to filter specific dispositions/ complaints
         df_temp_a = df_ecb_violations[[u'census_tract', u'ISSUE_DATE']].groupby(
             [u'census_tract', u'ISSUE_DATE']).size().reset_index(name='nbr_ecb_violations')
 
-        # new york bin/bbl buildings
-        df_bin_bbl = pd.read_csv(bin_bbl_fname, sep="\t", dtype=str)
-
-        # clean / merge df_ecb_violations
-        df_dob_violations[u'BORO'] = df_dob_violations[u'BORO'].astype(str)
-        df_dob_violations[u'BLOCK'] = df_dob_violations[u'BLOCK'].astype(str)
-        df_dob_violations[u'LOT'] = df_dob_violations[u'LOT'].astype(str)
-        df_dob_violations[u'DISPOSITION_DATE'] = df_dob_violations[u'DISPOSITION_DATE'].astype(str)
-        df_dob_violations[u'BBL'] = df_dob_violations.apply(
-            lambda row: "{}{}{}".format(row[u'BORO'], pad_zeros(row[u'BLOCK']), remove_zeros(row[u'LOT'])), axis=1)
+        # clean / merge df_dob_violations
+        df_dob_violations[u'BBL'] = self.bbl_keys(df_dob_violations[u'BORO'], df_dob_violations[u'BLOCK'],
+                                                  df_dob_violations[u'LOT'])
 
         # add BIN
-        df_dob_violations = df_dob_violations.merge(df_bin_bbl, how='inner', on='BBL')
-
-        # filter data
-        df_dob_violations[u'_remove'] = df_dob_violations[u'ISSUE_DATE'].apply(lambda x: len(x) == 8)
-        df_dob_violations = df_dob_violations[df_dob_violations[u'_remove'] == True]
+        df_dob_violations = building_index.join(df_dob_violations[[u'BBL', u'ISSUE_DATE']], u'BBL')
 
-        # convert time to month
-        df_dob_violations[u'ISSUE_DATE'] = df_dob_violations[u'ISSUE_DATE'].apply(
-            lambda dt: time_toolbox.normalize_dt(pad_year(dt), VIOLATION_FORMAT, STANDARD_TIME_FORMAT_M))
-        df_dob_violations = df_dob_violations[df_dob_violations[u'ISSUE_DATE'] != None]
+        # filter data & convert time to month
+        dob_dates = self.pad_years(df_dob_violations[u'ISSUE_DATE'])
+        df_dob_violations = df_dob_violations.loc[dob_dates.index]
+        df_dob_violations[u'ISSUE_DATE'] = time_toolbox.normalize_dt_column(dob_dates, VIOLATION_FORMAT,
+                                                                            STANDARD_TIME_FORMAT_M)
 
         # total ecb/dob violations monthly
         # no need to filter specific dispositions/ complaints
@@ -413,7 +711,7 @@ class DataTransformer():
 
         # merge df_temp_a/df_temp_b on outer and export the file
         df = pd.merge(df_temp_a, df_temp_b, how='outer', on=[u'census_tract', u'ISSUE_DATE'])
-        df.to_csv(dob_ecb_violations_agg_fname, index=False, sep="\t")
+        self.store.write(df, dob_ecb_violations_agg_fname)
 
     def aggregate_permits_data(self, bin_bbl_fname, dob_permits_fname, dob_permits_agg_fname):
         """
@@ -430,33 +728,23 @@ class DataTransformer():
         """
         time_toolbox = TimeToolbox()
 
-        # lambda functions to process the data
-        pad_zeros = lambda x: '0' * (len(x) - 5) + x
-        remove_zeros = lambda x: x[1:] if len(x) == 5 else x
-        standarize_boro = lambda x: x[:1] if len(x) > 1 else x
-        pad_year = lambda x: '20' + x.replace(" ", "") if len(x.replace(" ", "")) == 6 else x
-
         # new york bin/bbl buildings
-        df_bin_bbl = pd.read_csv(bin_bbl_fname, sep="\t", dtype=str)
+        building_index = self.load_bin_bbl(bin_bbl_fname)
 
-        df_dob_permits = pd.read_csv(dob_permits_fname, sep=",", dtype=str)
+        df_dob_permits = pd.read_csv(dob_permits_fname, sep=",", dtype=str,
+                                     usecols=[u'BOROUGH', u'Block', u'Lot', u'Issuance Date'])
 
-        # # clean / merge df_ecb_violations
-        df_dob_permits[u'BOROUGH'] = df_dob_permits[u'BOROUGH'].astype(str)
-        df_dob_permits[u'Block'] = df_dob_permits[u'Block'].astype(str)
-        df_dob_permits[u'Lot'] = df_dob_permits[u'Lot'].astype(str)
-        df_dob_permits[u'BBL'] = df_dob_permits.apply(
-            lambda row: "{}{}{}".format(BORO_STR_CODE[row[u'BOROUGH']], pad_zeros(row[u'Block']),
-                                        remove_zeros(row[u'Lot'])), axis=1)
+        # # clean / merge df_dob_permits, boroughs are named
+        df_dob_permits[u'BBL'] = self.bbl_keys(df_dob_permits[u'BOROUGH'].map(BORO_STR_CODE), df_dob_permits[u'Block'],
+                                               df_dob_permits[u'Lot'])
 
         # add BIN
-        df_dob_permits = df_dob_permits.merge(df_bin_bbl, how='inner', on=u'BBL')
-        df_dob_permits['Issuance Date'] = df_dob_permits['Issuance Date'].apply(
-            lambda dt: time_toolbox.normalize_dt(dt, INCIDENT_TIME_FORMAT, STANDARD_TIME_FORMAT_M))
-        df_dob_permits = df_dob_permits[df_dob_permits['Issuance Date'] != None]
+        df_dob_permits = building_index.join(df_dob_permits[[u'BBL', u'Issuance Date']], u'BBL')
+        df_dob_permits['Issuance Date'] = time_toolbox.normalize_dt_column(df_dob_permits['Issuance Date'],
+                                                                          INCIDENT_TIME_FORMAT, STANDARD_TIME_FORMAT_M)
         df = df_dob_permits[[u'census_tract', 'Issuance Date']].groupby(
             [u'census_tract', 'Issuance Date']).size().reset_index(name='nbr_dob_permits')
-        df.to_csv(dob_permits_agg_fname, index=False, sep="\t")
+        self.store.write(df, dob_permits_agg_fname)
 
     def aggregate_mappluto(self, mappluto_fname, mappluto_agg_fname):
         """
@@ -469,113 +757,77 @@ class DataTransformer():
         :type mappluto_agg_fname: :py:class:`str`
         """
 
+        numeric_columns = [u'yearbuilt', u'bldgarea', u'unitsres', u'unitstotal', u'resarea', u'officearea',
+                           u'retailarea', u'comarea', u'numbldgs', u'numfloors']
+
         # reading csv file
-        df = pd.read_csv(mappluto_fname, sep="\t", dtype=str)
-        df['bbl'] = df['bbl'].apply(lambda x: x.split(".")[0])
-        df['census_tract'] = df[['bbl', 'tract2010']].apply(
-            lambda x: "{}{}00".format(BORO_CODE[x['bbl'][:1]], x['tract2010']) if len(
-                x['tract2010']) == 4 else "{}{}".format(BORO_CODE[x['bbl'][:1]], x['tract2010']), axis=1)
-
-        # buildings' age
-        df[u'yearbuilt'] = df[u'yearbuilt'].astype(float)
-
-        # building area
-        df[u'bldgarea'] = df[u'bldgarea'].astype(float)
-
-        # total number of residential units
-        df[u'unitsres'] = df[u'unitsres'].astype(float)
-
-        # The sum of residential and non-residential
-        df[u'unitstotal'] = df[u'unitstotal'].astype(float)
-
-        # building use
-        df[u'resarea'] = df[u'resarea'].astype(float)
-        df[u'officearea'] = df[u'officearea'].astype(float)
-        df[u'retailarea'] = df[u'retailarea'].astype(float)
-        df[u'comarea'] = df[u'comarea'].astype(float)
-
-        # The number of buildings on the tax lot.
-        df[u'numbldgs'] = df[u'numbldgs'].astype(float)
-
-        # In the tallest building on the tax lot, the number of full and partial stories starting from the ground floor.
-        df[u'numfloors'] = df[u'numfloors'].astype(float)
-
-        df_tracts = pd.DataFrame(list(set(df[u'census_tract'].values)), columns=['census_tract'])
-
-        # calculate The average number of floors for every census tract
-        df_numfloors = df[[u'census_tract', u'numfloors']].groupby([u'census_tract'], as_index=False).mean()
-        df_numfloors = df_numfloors.rename(columns={'numfloors': 'avg_numfloors'})
-
-        # calculate the average building age for every census tract
-        df_yearbuilt = df[[u'census_tract', u'yearbuilt']].groupby([u'census_tract'], as_index=False).mean()
-        df_yearbuilt = df_yearbuilt.rename(columns={'yearbuilt': 'avg_yearbuilt'})
-
-        # calculate Total units for every census tract
-        df_unitstotal = df[[u'census_tract', u'unitstotal']].groupby([u'census_tract'], as_index=False).sum()
-        df_unitstotal = df_unitstotal.rename(columns={'unitstotal': 'total_units'})
-
-        # calculate the average Unit area for every census tract
-        df_bldgarea = df[[u'census_tract', u'bldgarea']].groupby([u'census_tract'], as_index=False).mean()
-        df_unitarea = pd.merge(df_unitstotal, df_bldgarea, on='census_tract')
-        df_unitarea['avg_unitarea'] = df_unitarea.apply(
-            lambda row: 0 if float(row[u'total_units']) == 0 else row[u'bldgarea'] / float(row[u'total_units']), axis=1)
-
-        # calculate building area
-        df_bldgarea = df[[u'census_tract', u'bldgarea']].groupby([u'census_tract'], as_index=False).sum()
-        df_bldgarea = df_bldgarea.rename(columns={'bldgarea': 'total_bldgarea'})
-
-        # res / total units by tract  bldgarea/unitstotal
-        df_ratio_unitarea = pd.merge(df_unitstotal, df_bldgarea, on='census_tract')
-        df_ratio_unitarea['ratio_unitarea'] = df_ratio_unitarea.apply(
-            lambda row: 0 if float(row[u'total_units']) == 0 else row[u'total_bldgarea'] / float(row[u'total_units']),
-            axis=1)
-
-        # commercial ratio by tract comarea/bldgarea
-        df_comarea = df[[u'census_tract', u'comarea']].groupby([u'census_tract'], as_index=False).sum()
-        df_ratio_com = pd.merge(df_comarea, df_bldgarea, on='census_tract')
-        df_ratio_com['ratio_comarea'] = df_ratio_com.apply(
-            lambda row: 0 if float(row[u'total_bldgarea']) == 0 else row[u'comarea'] / float(row[u'total_bldgarea']),
-            axis=1)
-
-        # residential ratio by tract resarea/bldgarea
-        df_resarea = df[[u'census_tract', u'resarea']].groupby([u'census_tract'], as_index=False).sum()
-        df_ratio_resarea = pd.merge(df_resarea, df_bldgarea, on='census_tract')
-        df_ratio_resarea['ratio_resarea'] = df_ratio_resarea.apply(
-            lambda row: 0 if float(row[u'total_bldgarea']) == 0 else row[u'resarea'] / float(row[u'total_bldgarea']),
-            axis=1)
-
-        # office ratio by tract officearea/bldgarea
-        df_officerea = df[[u'census_tract', u'officearea']].groupby([u'census_tract'], as_index=False).sum()
-        df_ratio_officerea = pd.merge(df_officerea, df_bldgarea, on='census_tract')
-        df_ratio_officerea['ratio_officerea'] = df_ratio_officerea.apply(
-            lambda row: 0 if float(row[u'total_bldgarea']) == 0 else row[u'officearea'] / float(row[u'total_bldgarea']),
-            axis=1)
-
-        # retail ratio by tract retailarea/bldgarea
-        df_retailarea = df[[u'census_tract', u'retailarea']].groupby([u'census_tract'], as_index=False).sum()
-        df_ratio_retailarea = pd.merge(df_retailarea, df_bldgarea, on='census_tract')
-        df_ratio_retailarea['ratio_retailarea'] = df_ratio_retailarea.apply(
-            lambda row: 0 if float(row[u'total_bldgarea']) == 0 else row[u'retailarea'] / float(row[u'total_bldgarea']),
-            axis=1)
-
-        # mean unit area by tract unitsres/unitstotal
-        df_resunits = df[[u'census_tract', u'unitsres']].groupby([u'census_tract'], as_index=False).sum()
-        df_avg_resunits = pd.merge(df_resunits, df_unitstotal, on='census_tract')
-        df_avg_resunits['avg_unitsres'] = df_avg_resunits.apply(
-            lambda row: 0 if float(row[u'total_units']) == 0 else row[u'unitsres'] / float(row[u'total_units']), axis=1)
-
-        # merge data-frames and export CSV files
-        data_frames = [df_tracts, df_avg_resunits, df_ratio_retailarea, df_ratio_officerea, df_ratio_resarea,
-                       df_ratio_com, df_numfloors, df_yearbuilt, df_unitstotal, df_unitarea, df_bldgarea]
-        df_mappluto_agg = reduce(lambda left, right: pd.merge(left, right, on=['census_tract'], how='inner'),
-                                 data_frames)
+        df = pd.read_csv(mappluto_fname, sep="\t", dtype=str, usecols=[u'bbl', u'tract2010'] + numeric_columns)
+
+        # census tract: county code (from the borough of the bbl) + tract, 4 digits tracts are padded with 00
+        boro_code = df['bbl'].str[:1].map(BORO_CODE)
+        tract = df['tract2010'].where(df['tract2010'].str.len() != 4, df['tract2010'] + "00")
+        df['census_tract'] = boro_code + tract
+        df = df.drop([u'bbl', u'tract2010'], axis=1)
+
+        # buildings' age, building area, residential & total units, building use, number of buildings on the tax lot
+        # & number of floors of the tallest building on the tax lot
+        df[numeric_columns] = df[numeric_columns].astype(float)
+
+        # all the sums & means by census tract in a single pass
+        df_mappluto_agg = df.groupby(u'census_tract').agg(
+            avg_numfloors=(u'numfloors', 'mean'),
+            avg_yearbuilt=(u'yearbuilt', 'mean'),
+            total_units=(u'unitstotal', 'sum'),
+            mean_bldgarea=(u'bldgarea', 'mean'),
+            total_bldgarea=(u'bldgarea', 'sum'),
+            total_comarea=(u'comarea', 'sum'),
+            total_resarea=(u'resarea', 'sum'),
+            total_officearea=(u'officearea', 'sum'),
+            total_retailarea=(u'retailarea', 'sum'),
+            total_unitsres=(u'unitsres', 'sum'),
+        ).reset_index()
+
+        # the average unit area by tract is the mean building area over the total units
+        df_mappluto_agg['avg_unitarea'] = self.safe_ratio(df_mappluto_agg['mean_bldgarea'],
+                                                          df_mappluto_agg['total_units'])
+
+        # commercial, residential, office & retail ratios by tract area/bldgarea
+        df_mappluto_agg['ratio_comarea'] = self.safe_ratio(df_mappluto_agg['total_comarea'],
+                                                           df_mappluto_agg['total_bldgarea'])
+        df_mappluto_agg['ratio_resarea'] = self.safe_ratio(df_mappluto_agg['total_resarea'],
+                                                           df_mappluto_agg['total_bldgarea'])
+        df_mappluto_agg['ratio_officerea'] = self.safe_ratio(df_mappluto_agg['total_officearea'],
+                                                             df_mappluto_agg['total_bldgarea'])
+        df_mappluto_agg['ratio_retailarea'] = self.safe_ratio(df_mappluto_agg['total_retailarea'],
+                                                              df_mappluto_agg['total_bldgarea'])
+
+        # residential units by tract unitsres/unitstotal
+        df_mappluto_agg['avg_unitsres'] = self.safe_ratio(df_mappluto_agg['total_unitsres'],
+                                                          df_mappluto_agg['total_units'])
 
         relevant_columns = [u'census_tract', u'avg_unitsres', u'ratio_retailarea', u'ratio_resarea', u'ratio_comarea',
                             u'avg_yearbuilt', u'ratio_officerea', u'avg_numfloors', u'total_units', u'avg_unitarea',
                             u'total_bldgarea']
 
-        # convert to csv file
-        df_mappluto_agg[relevant_columns].to_csv(mappluto_agg_fname, index=False, sep="\t")
+        # write to the store
+        self.store.write(df_mappluto_agg[relevant_columns], mappluto_agg_fname)
+
+    @staticmethod
+    def safe_ratio(numerator, denominator):
+        """
+        divide two columns, the ratio is 0 where the denominator is 0
+
+        :param numerator: numerator
+        :type numerator: :py:class:`pandas.Series`
+
+        :param denominator: denominator
+        :type denominator: :py:class:`pandas.Series`
+
+        :return: Series
+        """
+        ratio = np.zeros(len(numerator))
+        np.divide(numerator.values, denominator.values, out=ratio, where=denominator.values != 0)
+        return pd.Series(ratio, index=numerator.index)
 
     def normalize_street_file(self, input_fname, out_fname):
         """
@@ -589,57 +841,30 @@ class DataTransformer():
         """
         df = pd.read_csv(input_fname, sep=",", dtype=str)
 
-        # logging.info("DataFrame has been loaded")
-        NYC_COUNTIES = ['Queens', 'New York', 'Richmond', 'Bronx', 'Kings']
-
-        relevant_columns = ['LEFT_STREET', 'RIGHT_STREET', u'WKT']
-
-        # filter columns here in NYC
-        # df = df[relevant_columns]
-
-        # filter roads in nYC
-        df[u'LEFT_STREET'] = df.apply(
-            lambda x: "{}, {}, NY {}".format(str(x['Label']).upper(), str(x['LeftCounty']).upper(),
-                                             str(x['LeftPostal']).upper()), axis=1)
-        df[u'RIGHT_STREET'] = df.apply(
-            lambda x: "{}, {}, NY {}".format(str(x['Label']).upper(), str(x['RightCount']).upper(),
-                                             str(x['RightPosta']).upper()), axis=1)
-
-        # crs = {'init': 'epsg:4326'}
-        nyc_streets = defaultdict(set)
-        nyc_streets_blocks = defaultdict(dict)
-
-        # Query right streets
-        for index, row in df.iterrows():
-            # index street -> census_id for both right/left blocks
-            nyc_streets_blocks[row['RIGHT_STREET']]['right'] = row[u'RightCensu']
-            nyc_streets_blocks[row['RIGHT_STREET']]['left'] = row[u'LeftCensus']
-
-            # index street -> geom
-            nyc_streets[row['RIGHT_STREET']].add(row[u'WKT'])
-
-        # Query left streets
-        for index, row in df.iterrows():
-            # index street -> census_id for both right/left blocks
-            nyc_streets_blocks[row['LEFT_STREET']]['right'] = row[u'RightCensu']
-            nyc_streets_blocks[row['LEFT_STREET']]['left'] = row[u'LeftCensus']
-
-            # index street -> geom
-            nyc_streets[row['LEFT_STREET']].add(row[u'WKT'])
-
-        # build a csv to get releavant information on street/geometry
-        street_gp = gpd.GeoDataFrame(columns=['street', 'geometry', 'right_block', 'left_block'], crs='EPSG:4326')
-
-        # iterate your dictionary
-        n = len(nyc_streets.items())
-        for i, (street_name, street_geo) in enumerate(nyc_streets.items()):
-            geometry = gpd.GeoSeries(map(lambda x: loads(x), list(street_geo)))
-            geometry = geometry.unary_union
-            # geometry = cascaded_union(map(lambda x: loads(x) , list(street_geo)))
-            street_gp.set_value(i, 'street', street_name)
-            street_gp.set_value(i, 'right_block', nyc_streets_blocks[street_name]['right'])
-            street_gp.set_value(i, 'left_block', nyc_streets_blocks[street_name]['left'])
-            street_gp.set_value(i, 'geometry', geometry)
+        # street names are normalized as the incidents addresses, missing names never match an incident
+        label = self.normalize_addresses(df['Label']).where(df['Label'].notnull(), "")
+        upper = lambda column: df[column].map(str).str.upper()
+        df[u'LEFT_STREET'] = label + ", " + upper('LeftCounty') + ", NY " + upper('LeftPostal')
+        df[u'RIGHT_STREET'] = label + ", " + upper('RightCount') + ", NY " + upper('RightPosta')
+
+        # every segment is indexed by its right street then by its left street
+        df_segments = pd.concat([df[[u'RIGHT_STREET', u'RightCensu', u'LeftCensus', u'WKT']].rename(
+            columns={u'RIGHT_STREET': 'street'}), df[[u'LEFT_STREET', u'RightCensu', u'LeftCensus', u'WKT']].rename(
+            columns={u'LEFT_STREET': 'street'})], ignore_index=True)
+
+        # index street -> census_id for both right/left blocks, the last segment of the street wins
+        df_blocks = df_segments.drop_duplicates('street', keep='last').set_index('street')
+        df_blocks = df_blocks.rename(columns={u'RightCensu': 'right_block', u'LeftCensus': 'left_block'})
+
+        # index street -> geom, the distinct segments of every street are merged at once
+        df_geoms = df_segments[['street', u'WKT']].drop_duplicates()
+        df_geoms = gpd.GeoDataFrame(df_geoms[['street']], geometry=gpd.GeoSeries.from_wkt(df_geoms[u'WKT'].values,
+                                                                                         index=df_geoms.index),
+                                    crs='EPSG:4326')
+
+        # build a shapefile to get releavant information on street/geometry
+        street_gp = df_geoms.dissolve(by='street', sort=False).join(df_blocks[['right_block', 'left_block']])
+        street_gp = street_gp.reset_index()[['street', 'geometry', 'right_block', 'left_block']]
 
         street_gp.to_file(out_fname, driver="ESRI Shapefile")
 
@@ -656,14 +881,11 @@ class DataTransformer():
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
         """
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
-        df_dob_complaints = pd.read_csv(complaints_fname, sep="\t", dtype=str)
-        df_dob_complaints.rename(columns={u'Date Entered': u'incident_date_time'}, inplace=True)
+        df_incidents_context = self.store.read(incidents_context_fname)
+        df_dob_complaints = self.load_complaints_data(complaints_fname)
 
-        df_incidents_context = pd.merge(df_incidents_context, df_dob_complaints,
-                                        on=['census_tract', 'incident_date_time'], how='left')
-        # convert to csv file
-        df_incidents_context.to_csv(out_fname, index=False, sep="\t")
+        # write to the store
+        self.store.write(self.merge_context_data(df_incidents_context, df_dob_complaints), out_fname)
 
     def join_with_violations_data(self, incidents_context_fname, violations_fname, out_fname):
         """
@@ -678,14 +900,11 @@ class DataTransformer():
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
         """
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
-        df_dob_violations = pd.read_csv(violations_fname, sep="\t", dtype=str)
+        df_incidents_context = self.store.read(incidents_context_fname)
+        df_dob_violations = self.load_violations_data(violations_fname)
 
-        df_dob_violations.rename(columns={u'ISSUE_DATE': u'incident_date_time'}, inplace=True)
-        df_incidents_context = pd.merge(df_incidents_context, df_dob_violations,
-                                        on=['census_tract', 'incident_date_time'], how='left')
-        # convert to csv file
-        df_incidents_context.to_csv(out_fname, index=False, sep="\t")
+        # write to the store
+        self.store.write(self.merge_context_data(df_incidents_context, df_dob_violations), out_fname)
 
     def join_with_permits_data(self, incidents_context_fname, permits_fname, out_fname):
         """
@@ -700,13 +919,11 @@ class DataTransformer():
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
         """
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
-        df_permits = pd.read_csv(permits_fname, sep="\t", dtype=str)
-        df_permits.rename(columns={u'Issuance Date': u'incident_date_time'}, inplace=True)
-        df_incidents_context = pd.merge(df_incidents_context, df_permits, on=['census_tract', 'incident_date_time'],
-                                        how='left')
-        # convert to csv file
-        df_incidents_context.to_csv(out_fname, index=False, sep="\t")
+        df_incidents_context = self.store.read(incidents_context_fname)
+        df_permits = self.load_permits_data(permits_fname)
+
+        # write to the store
+        self.store.write(self.merge_context_data(df_incidents_context, df_permits), out_fname)
 
     def join_with_mappluto_data(self, incidents_context_fname, mappluto_agg_fname, out_fname):
         """
@@ -721,54 +938,226 @@ class DataTransformer():
         :param out_fname: the name of the output file
         :type out_fname: :py:class:`str`
         """
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
-        df_mappluto_agg = pd.read_csv(mappluto_agg_fname, sep="\t", dtype=str)
-        df_mappluto_agg = df_mappluto_agg.rename(columns={u'Issuance Date': u'incident_date_time'})
-        df_incidents_context = pd.merge(df_incidents_context, df_mappluto_agg, on=['census_tract'], how='left')
-        df_incidents_context.to_csv(out_fname, index=False, sep="\t")
+        df_incidents_context = self.store.read(incidents_context_fname)
+        df_mappluto_agg = self.load_mappluto_data(mappluto_agg_fname)
+
+        self.store.write(self.merge_context_data(df_incidents_context, df_mappluto_agg), out_fname)
+
+    def load_complaints_data(self, complaints_fname):
+        """
+        load aggregated complaints indexed by census tract/date
+
+        :param complaints_fname: the name of the aggregated complaints file
+        :type complaints_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        df_dob_complaints = self.store.read(complaints_fname)
+        df_dob_complaints.rename(columns={u'Date Entered': u'incident_date_time'}, inplace=True)
+        return df_dob_complaints.set_index(['census_tract', 'incident_date_time'])
+
+    def load_violations_data(self, violations_fname):
+        """
+        load aggregated violations indexed by census tract/date
+
+        :param violations_fname: the name of the aggregated violations file
+        :type violations_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        df_dob_violations = self.store.read(violations_fname)
+        df_dob_violations.rename(columns={u'ISSUE_DATE': u'incident_date_time'}, inplace=True)
+        return df_dob_violations.set_index(['census_tract', 'incident_date_time'])
+
+    def load_permits_data(self, permits_fname):
+        """
+        load aggregated permits indexed by census tract/date
+
+        :param permits_fname: the name of the aggregated permits file
+        :type permits_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        df_permits = self.store.read(permits_fname)
+        df_permits.rename(columns={u'Issuance Date': u'incident_date_time'}, inplace=True)
+        return df_permits.set_index(['census_tract', 'incident_date_time'])
+
+    def load_mappluto_data(self, mappluto_agg_fname):
+        """
+        load aggregated mappluto data indexed by census tract
+
+        :param mappluto_agg_fname: the name of the aggregated mappluto file
+        :type mappluto_agg_fname: :py:class:`str`
+
+        :return: DataFrame
+        """
+        return self.store.read(mappluto_agg_fname).set_index('census_tract')
+
+    @staticmethod
+    def merge_context_data(df_incidents_context, df_context):
+        """
+        left join contextual data on the keys it is indexed by
+
+        :param df_incidents_context: incidents/tracts/context
+        :type df_incidents_context: :py:class:`pandas.DataFrame`
+
+        :param df_context: contextual data indexed by census tract (and date)
+        :type df_context: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
+        return JoinEngine.join(df_incidents_context, df_context, on=list(df_context.index.names), how='left')
+
+    def encode_history_features(self, incidents_context_fname, out_fname=None, history_fname=None):
+        """
+        add rolling & lagged counts per census tract
+
+        :param incidents_context_fname: the name of file that contains incidents/tracts input
+        :type incidents_context_fname: :py:class:`str`
+
+        :param out_fname: the name of the output file, the input file is overwritten by default
+        :type out_fname: :py:class:`str`
+
+        :param history_fname: the name of the history file, the last days are kept for `append_history_features`
+        :type history_fname: :py:class:`str`
+        """
+        df_incidents_context = self.store.read(incidents_context_fname)
+        df_incidents_history = self.add_history_features(df_incidents_context)
+
+        # keep the last days, the next days are appended on top of them
+        if history_fname is not None:
+            self.store.write(HistoryFeatures().history(df_incidents_context), history_fname)
+
+        # write to the store
+        self.store.write(df_incidents_history, out_fname or incidents_context_fname)
+
+    def append_history_features(self, new_days_fname, history_fname, out_fname=None):
+        """
+        add rolling & lagged counts per census tract to new days, on top of the history of the previous days: only
+        the new days & the last days of the history are read
+
+        :param new_days_fname: the name of file that contains the incidents/tracts of the new days only
+        :type new_days_fname: :py:class:`str`
+
+        :param history_fname: the name of the history file written by `encode_history_features` or by a previous
+                              append, it is updated with the new days
+        :type history_fname: :py:class:`str`
+
+        :param out_fname: the name of the output file, the input file is overwritten by default
+        :type out_fname: :py:class:`str`
+        """
+        df_new_days = self.store.read(new_days_fname)
+        df_history = self.load_history(history_fname)
+        if df_history is None:
+            logging.warning("no history in %s, the counts of the previous days are missing", history_fname)
+
+        df_new_days_history = self.add_history_features(df_new_days, df_history)
+        self.store.write(HistoryFeatures().history(df_new_days, df_history), history_fname)
+
+        # write to the store
+        self.store.write(df_new_days_history, out_fname or new_days_fname)
+
+    def load_history(self, history_fname):
+        """
+        load the history of the previous run
+
+        :param history_fname: the name of the history file
+        :type history_fname: :py:class:`str`
+
+        :return: DataFrame, None if there is no history yet
+        """
+        if not exists(self.store.path(history_fname)):
+            return None
+        return self.store.read(history_fname)
+
+    @staticmethod
+    def add_history_features(df_incidents_context, df_history=None):
+        """
+        add rolling & lagged counts per census tract (see `HistoryFeatures`)
+
+        :param df_incidents_context: incidents/tracts/context
+        :type df_incidents_context: :py:class:`pandas.DataFrame`
+
+        :param df_history: the history of the previous run
+        :type df_history: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
+        df_history_features = HistoryFeatures().compute(df_incidents_context, df_history)
+
+        # drop the features of a previous encoding
+        df_incidents_context = df_incidents_context.drop(
+            [column for column in df_history_features.columns if column in df_incidents_context.columns], axis=1)
+
+        return pd.concat([df_incidents_context, df_history_features], axis=1)
 
-    def encode_time_features(self, incidents_context_fname):
+    def encode_time_features(self, incidents_context_fname, out_fname=None):
         """
         encode time features
 
         :param incidents_context_fname: the name of file that contains incidents/tracts input
         :type incidents_context_fname: :py:class:`str`
+
+        :param out_fname: the name of the output file, the input file is overwritten by default
+        :type out_fname: :py:class:`str`
+        """
+        df_incidents_context = self.store.read(incidents_context_fname)
+
+        # write to the store
+        self.store.write(self.add_time_features(df_incidents_context), out_fname or incidents_context_fname)
+
+    @staticmethod
+    def add_time_features(df_incidents_context, holidays=ENCODE_HOLIDAYS, day_of_year=ENCODE_DAY_OF_YEAR):
+        """
+        add weekday/month features
+
+        :param df_incidents_context: incidents/tracts/context
+        :type df_incidents_context: :py:class:`pandas.DataFrame`
+
+        :param holidays: add a flag for the US federal holidays
+        :type holidays: :py:class:`bool`
+
+        :param day_of_year: add the day of the year encoded as sin/cos
+        :type day_of_year: :py:class:`bool`
+
+        :return: DataFrame
         """
         time_toolbox = TimeToolbox()
 
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
-
-        df_incidents_context['week_day'] = df_incidents_context['incident_date_time'].apply(
-            lambda dt: time_toolbox.get_weekday(dt, STANDARD_TIME_FORMAT))
-        df_incidents_context['month'] = df_incidents_context['incident_date_time'].apply(
-            lambda dt: time_toolbox.get_month(dt, STANDARD_TIME_FORMAT))
-
-        # One-hot encoding on time-dependent categorical feartures
-        # weekdays
-        df_incidents_context['wday_mon'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 0 else 0)
-        df_incidents_context['wday_tue'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 1 else 0)
-        df_incidents_context['wday_wed'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 2 else 0)
-        df_incidents_context['wday_thu'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 3 else 0)
-        df_incidents_context['wday_fri'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 4 else 0)
-        df_incidents_context['wday_sat'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 5 else 0)
-        df_incidents_context['wday_sun'] = df_incidents_context['week_day'].apply(lambda dt: 1 if dt == 6 else 0)
-
-        # months
-        df_incidents_context['month_jan'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 1 else 0)
-        df_incidents_context['month_feb'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 2 else 0)
-        df_incidents_context['month_mar'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 3 else 0)
-        df_incidents_context['month_apr'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 4 else 0)
-        df_incidents_context['month_may'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 5 else 0)
-        df_incidents_context['month_jun'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 6 else 0)
-        df_incidents_context['month_jul'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 7 else 0)
-        df_incidents_context['month_aug'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 8 else 0)
-        df_incidents_context['month_sep'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 9 else 0)
-        df_incidents_context['month_oct'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 10 else 0)
-        df_incidents_context['month_nov'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 11 else 0)
-        df_incidents_context['month_dec'] = df_incidents_context['month'].apply(lambda dt: 1 if dt == 12 else 0)
-
-        # convert to csv file
-        df_incidents_context.to_csv(incidents_context_fname, index=False, sep="\t")
+        incident_dt = time_toolbox.to_datetime_column(df_incidents_context['incident_date_time'], STANDARD_TIME_FORMAT)
+        df_incidents_context['week_day'] = incident_dt.dt.weekday
+        df_incidents_context['month'] = incident_dt.dt.month
+
+        # One-hot encoding on time-dependent categorical features, invalid dates have no indicator set
+        week_days = pd.get_dummies(pd.Categorical(df_incidents_context['week_day'], categories=range(7)),
+                                   dtype=np.uint8)
+        week_days.columns = WEEKDAY_FEATURES
+        months = pd.get_dummies(pd.Categorical(df_incidents_context['month'], categories=range(1, 13)),
+                                dtype=np.uint8)
+        months.columns = MONTH_FEATURES
+
+        time_features = [week_days, months]
+
+        if holidays:
+            calendar = USFederalHolidayCalendar()
+            federal_holidays = calendar.holidays(start=incident_dt.min(), end=incident_dt.max())
+            time_features.append(pd.DataFrame({HOLIDAY_FEATURES[0]: incident_dt.dt.normalize().isin(
+                federal_holidays).values.astype(np.uint8)}))
+
+        if day_of_year:
+            angle = 2 * np.pi * (incident_dt.dt.dayofyear.values - 1) / 365.25
+            time_features.append(pd.DataFrame({DAY_OF_YEAR_FEATURES[0]: np.sin(angle).astype(np.float32),
+                                               DAY_OF_YEAR_FEATURES[1]: np.cos(angle).astype(np.float32)},
+                                              columns=DAY_OF_YEAR_FEATURES))
+
+        df_time_features = pd.concat(time_features, axis=1)
+        df_time_features.index = df_incidents_context.index
+
+        # drop the indicators of a previous encoding
+        df_incidents_context = df_incidents_context.drop(
+            [column for column in df_time_features.columns if column in df_incidents_context.columns], axis=1)
+
+        return pd.concat([df_incidents_context, df_time_features], axis=1)
 
     def filter_relevant_features(self, incidents_context_fname, incidents_context_final_fname):
         """
@@ -781,9 +1170,21 @@ class DataTransformer():
         :type incidents_context_final_fname: :py:class:`str`
 
         """
-        df_incidents_context = pd.read_csv(incidents_context_fname, sep="\t", dtype=str)
+        df_incidents_context = self.store.read(incidents_context_fname, columns=RELEVANT_FEATURES)
+
+        # export the final table to csv file
+        self.store.export_csv(self.select_relevant_features(df_incidents_context), incidents_context_final_fname,
+                              columns=RELEVANT_FEATURES)
+
+    @staticmethod
+    def select_relevant_features(df_incidents_context):
+        """
+        keep the relevant features & fill the missing values
 
+        :param df_incidents_context: incidents/tracts/context
+        :type df_incidents_context: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
         df_incidents_context = df_incidents_context[RELEVANT_FEATURES]
-        df_incidents_context = df_incidents_context.replace(np.nan, 0)
-        # convert to csv file
-        df_incidents_context.to_csv(incidents_context_final_fname, columns=RELEVANT_FEATURES, index=False, sep="\t")
+        return df_incidents_context.replace(np.nan, 0)
@@ -0,0 +1,82 @@
+import logging
+
+
+class FeaturePipeline():
+    """
+    FeaturePipeline to run the feature engineering steps on a single in-memory table
+
+    Every step of the file based pipeline (e.g. `join_with_weather_data`) is mapped to the `DataTransformer`
+    transformation it wraps and to the loader of its lookup table. Lookups are loaded once, released after their
+    last use, and only the final table is written.
+    """
+    # step -> (transformation, loader of the lookup table)
+    STEPS = {
+        'join_with_tracts': ('map_incidents_to_tracts', 'load_tract_resolver'),
+        'flatten_incidents_tracts': ('flatten_incidents', 'load_census_data'),
+        'join_with_census_data': ('merge_census_data', 'load_census_data'),
+        'join_with_weather_data': ('merge_weather_data', 'load_weather_data'),
+        'join_with_mappluto_data': ('merge_context_data', 'load_mappluto_data'),
+        'join_with_complaints_data': ('merge_context_data', 'load_complaints_data'),
+        'join_with_violations_data': ('merge_context_data', 'load_violations_data'),
+        'join_with_permits_data': ('merge_context_data', 'load_permits_data'),
+        'encode_history_features': ('add_history_features', None),
+        'encode_time_features': ('add_time_features', None),
+        'rename_columns': ('rename_census_columns', None),
+        'filter_relevant_features': ('select_relevant_features', None),
+    }
+
+    def __init__(self, data_transformer, steps):
+        """
+        Initialize the pipeline with the ordered steps to run
+
+        :param data_transformer: transformer that implements the steps
+        :type  data_transformer: :py:class:`data_processing.data_transformer.DataTransformer`
+
+        :param steps: ordered list of (step name, lookup file name), the file name is None for steps without lookup
+        :type  steps: :py:class:`list`
+        """
+        unknown_steps = [step for step, _ in steps if step not in self.STEPS]
+        if unknown_steps:
+            raise ValueError("Steps can't be fused: {}".format(", ".join(unknown_steps)))
+
+        self.data_transformer = data_transformer
+        self.steps = steps
+
+    def run(self, incidents_fname, output_fname):
+        """
+        run the steps on the incidents table & export the final table to csv
+
+        :param incidents_fname: the name of the file that contains the normalized incidents
+        :type  incidents_fname: :py:class:`str`
+
+        :param output_fname: the name of the output file
+        :type  output_fname: :py:class:`str`
+        """
+        # index of the last step that uses every lookup
+        last_use = {}
+        for i, (step, lookup_fname) in enumerate(self.steps):
+            loader = self.STEPS[step][1]
+            if loader is not None:
+                last_use[(loader, lookup_fname)] = i
+
+        lookups = {}
+        df = self.data_transformer.store.read(incidents_fname)
+
+        for i, (step, lookup_fname) in enumerate(self.steps):
+            transformation, loader = self.STEPS[step]
+            logging.info("fused step: %s", step)
+
+            if loader is None:
+                df = getattr(self.data_transformer, transformation)(df)
+                continue
+
+            key = (loader, lookup_fname)
+            if key not in lookups:
+                lookups[key] = getattr(self.data_transformer, loader)(lookup_fname)
+
+            df = getattr(self.data_transformer, transformation)(df, lookups[key])
+
+            if last_use[key] == i:
+                del lookups[key]
+
+        self.data_transformer.store.export_csv(df, output_fname)
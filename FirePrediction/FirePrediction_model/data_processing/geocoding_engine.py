@@ -0,0 +1,309 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import logging
+import sqlite3
+import numpy as np
+import pandas as pd
+import shapely
+from data_acquisition.services.http_session import get_session
+from data_processing.tract_resolver import TractResolver
+from resources.constants import GEOCODER_WORKERS, GOOGLE_GEOCODE_URL
+
+OK = u'OK'
+ZERO_RESULTS = u'ZERO_RESULTS'
+ERROR = u'ERROR'
+
+
+class GeocodeCache():
+    """
+    GeocodeCache to persist the geocoded addresses in a SQLite database, per backend
+    """
+    BATCH_SIZE = 500
+
+    def __init__(self, fname):
+        """
+        :param fname: the name of the SQLite database
+        :type fname: :py:class:`str`
+        """
+        self.connection = sqlite3.connect(fname)
+        self.connection.execute("create table if not exists geocodes (backend text, address text, status text, "
+                                "lat real, lng real, primary key (backend, address))")
+        self.connection.commit()
+
+    def get_many(self, backend, addresses):
+        """
+        get the cached geocodes of addresses
+
+        :param backend: the cache key of the backend (see `GeocoderBackend.cache_key`)
+        :type backend: :py:class:`str`
+
+        :param addresses: normalized addresses
+        :type addresses: :py:class:`list`
+
+        :return: dict, address -> (status, lat, lng)
+        """
+        cached = {}
+        for i in range(0, len(addresses), self.BATCH_SIZE):
+            batch = addresses[i:i + self.BATCH_SIZE]
+            query = "select address, status, lat, lng from geocodes where backend = ? and address in ({})".format(
+                ", ".join("?" * len(batch)))
+            for address, status, lat, lng in self.connection.execute(query, [backend] + list(batch)):
+                cached[address] = (status, lat, lng)
+        return cached
+
+    def put_many(self, backend, geocodes):
+        """
+        add geocodes to the cache
+
+        :param backend: the cache key of the backend (see `GeocoderBackend.cache_key`)
+        :type backend: :py:class:`str`
+
+        :param geocodes: list of (address, (status, lat, lng))
+        :type geocodes: :py:class:`list`
+        """
+        self.connection.executemany("insert or replace into geocodes values (?, ?, ?, ?, ?)",
+                                    [(backend, address, status, lat, lng) for address, (status, lat, lng) in geocodes])
+        self.connection.commit()
+
+    def close(self):
+        """
+        close the database
+        """
+        self.connection.close()
+
+
+class GeocoderBackend():
+    """
+    GeocoderBackend, base class of the backends that geocode one address at a time
+
+    A backend geocodes an address to (status, lat, lng), the status is OK, ZERO_RESULTS or ERROR. ERROR results are
+    not cached so they are tried again on the next run.
+    """
+    NAME = None
+    # the field of NYCGeocoder addresses used as query: the postal address or the normalized street
+    ADDRESS_FIELD = 'postal_address'
+
+    @property
+    def cache_key(self):
+        """
+        :return: the key the geocodes of the backend are cached under, the name of the backend by default
+        """
+        return self.NAME
+
+    def geocode(self, address):
+        """
+        geocode an address
+
+        :param address: the address
+        :type address: :py:class:`str`
+
+        :return: (status, lat, lng)
+        """
+        raise NotImplementedError
+
+    def _safe_geocode(self, address):
+        """
+        geocode an address, errors are logged & reported with the ERROR status
+
+        :param address: the address
+        :type address: :py:class:`str`
+
+        :return: (status, lat, lng)
+        """
+        try:
+            return self.geocode(address)
+        except Exception as e:
+            logging.info('Error! geocoding failed for %s: %s', address, e)
+            return ERROR, None, None
+
+    def geocode_batch(self, addresses, max_workers=GEOCODER_WORKERS):
+        """
+        geocode addresses on a bounded pool of threads
+
+        :param addresses: distinct addresses
+        :type addresses: :py:class:`list`
+
+        :param max_workers: the number of concurrent lookups
+        :type max_workers: :py:class:`int`
+
+        :return: iterator of (address, (status, lat, lng)) in completion order
+        """
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {executor.submit(self._safe_geocode, address): address for address in addresses}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True)
+
+
+class GoogleMapsBackend(GeocoderBackend):
+    """
+    GoogleMapsBackend to geocode addresses with the Google Maps geocoding API
+    """
+    NAME = 'google_maps'
+
+    def __init__(self, api_key, base_url=GOOGLE_GEOCODE_URL, session=None):
+        """
+        :param api_key: Google Maps API key
+        :type api_key: :py:class:`str`
+
+        :param base_url: the url of the geocoding API
+        :type base_url: :py:class:`str`
+
+        :param session: the HTTP session, the one shared by the API clients by default
+        :type session: :py:class:`data_acquisition.services.http_session.HttpSession`
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.session = session or get_session()
+
+    def geocode(self, address):
+        """
+        geocode an address
+
+        :param address: the address
+        :type address: :py:class:`str`
+
+        :return: (status, lat, lng)
+        """
+        response = self.session.get(self.base_url, endpoint='google_geocode',
+                                    params={'address': address, 'key': self.api_key})
+        address_geo_info = response.json()
+
+        if address_geo_info.get(u'status') == OK:
+            location = address_geo_info.get('results', [])[0].get(u'geometry', {}).get(u'location', {})
+            return OK, location.get(u'lat', None), location.get(u'lng', None)
+        if address_geo_info.get(u'status') == ZERO_RESULTS:
+            return ZERO_RESULTS, None, None
+        return ERROR, None, None
+
+
+class GazetteerBackend(GeocoderBackend):
+    """
+    GazetteerBackend to geocode addresses offline on the LION street segments
+
+    Addresses are matched to the normalized streets (exact, canonical then fuzzy match) and located on a point of the
+    street, so the precision is the street and not the building.
+    """
+    NAME = 'gazetteer'
+    ADDRESS_FIELD = 'street_address'
+
+    def __init__(self, streets_fname, tract_resolver=None):
+        """
+        :param streets_fname: the normalized streets shapefile (see `DataTransformer.normalize_street_file`)
+        :type streets_fname: :py:class:`str`
+
+        :param tract_resolver: streets index, loaded from the streets shapefile by default
+        :type tract_resolver: :py:class:`data_processing.tract_resolver.TractResolver`
+        """
+        self.streets_fname = streets_fname
+        self.tract_resolver = tract_resolver or TractResolver.load(streets_fname)
+        if self.tract_resolver.street_geoms is None:
+            raise ValueError("The streets of the gazetteer have no geometry: {}".format(streets_fname))
+
+        points = shapely.point_on_surface(self.tract_resolver.street_geoms)
+        self.lats, self.lngs = shapely.get_y(points), shapely.get_x(points)
+
+    @property
+    def cache_key(self):
+        """
+        :return: the key the geocodes are cached under, a new version of the streets file starts a new cache
+        """
+        stat = TractResolver._source_stat(self.streets_fname)
+        return "{}:{}".format(self.NAME, hashlib.sha1(repr(stat).encode('utf-8')).hexdigest()[:16])
+
+    def geocode(self, address):
+        """
+        geocode an address
+
+        :param address: the normalized street address
+        :type address: :py:class:`str`
+
+        :return: (status, lat, lng)
+        """
+        return next(self.geocode_batch([address]))[1]
+
+    def geocode_batch(self, addresses, max_workers=None):
+        """
+        geocode addresses at once, lookups are local so no thread is used
+
+        :param addresses: distinct addresses
+        :type addresses: :py:class:`list`
+
+        :param max_workers: unused
+        :type max_workers: :py:class:`int`
+
+        :return: iterator of (address, (status, lat, lng))
+        """
+        positions = self.tract_resolver.match_streets(pd.Series(addresses, dtype=object))
+        for address, position in zip(addresses, positions):
+            if position < 0 or np.isnan(self.lats[position]):
+                yield address, (ZERO_RESULTS, None, None)
+            else:
+                yield address, (OK, float(self.lats[position]), float(self.lngs[position]))
+
+
+class GeocodingEngine():
+    """
+    GeocodingEngine to geocode columns of addresses
+
+    Addresses are normalized and de-duplicated, looked up in the persistent cache and only the cache misses are sent
+    to the backend. Results are added to the cache as they come, so an interrupted run resumes where it stopped.
+    """
+    COMMIT_EVERY = 1000
+
+    def __init__(self, backend, cache_fname=None, max_workers=GEOCODER_WORKERS):
+        """
+        :param backend: the backend that geocodes the addresses
+        :type backend: :py:class:`data_processing.geocoding_engine.GeocoderBackend`
+
+        :param cache_fname: the name of the SQLite cache, nothing is cached by default
+        :type cache_fname: :py:class:`str`
+
+        :param max_workers: the number of concurrent lookups
+        :type max_workers: :py:class:`int`
+        """
+        self.backend = backend
+        self.cache = GeocodeCache(cache_fname) if cache_fname is not None else None
+        self.max_workers = max_workers
+
+    def geocode(self, addresses):
+        """
+        geocode a column of addresses
+
+        :param addresses: addresses
+        :type addresses: :py:class:`pandas.Series`
+
+        :return: DataFrame with columns status, lat, lng, on the index of the addresses
+        """
+        codes, uniques = pd.factorize(TractResolver.canonical_addresses(addresses.dropna()).reindex(addresses.index))
+        uniques = list(uniques)
+
+        cache_key = self.backend.cache_key
+        geocodes = self.cache.get_many(cache_key, uniques) if self.cache is not None else {}
+        misses = [address for address in uniques if address not in geocodes]
+        logging.info("geocoding %s distinct addresses, %s cached", len(uniques), len(uniques) - len(misses))
+
+        pending = []
+        for i, (address, geocode) in enumerate(self.backend.geocode_batch(misses, self.max_workers)):
+            geocodes[address] = geocode
+            if geocode[0] != ERROR:
+                pending.append((address, geocode))
+
+            if self.cache is not None and len(pending) >= self.COMMIT_EVERY:
+                self.cache.put_many(cache_key, pending)
+                pending = []
+
+            if (i + 1) % self.COMMIT_EVERY == 0:
+                logging.info("geocoded %s/%s addresses", i + 1, len(misses))
+
+        if self.cache is not None and pending:
+            self.cache.put_many(cache_key, pending)
+
+        # broadcast back to the rows, missing addresses (code -1) have no result
+        results = [geocodes[address] for address in uniques] + [(ZERO_RESULTS, None, None)]
+        df_geocodes = pd.DataFrame(results, columns=['status', 'lat', 'lng'])
+        df_geocodes = df_geocodes.iloc[codes]
+        df_geocodes.index = addresses.index
+        return df_geocodes
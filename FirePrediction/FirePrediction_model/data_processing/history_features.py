@@ -0,0 +1,148 @@
+import logging
+import numpy as np
+import pandas as pd
+from resources.constants import HISTORY_COLUMNS, HISTORY_WINDOWS, HISTORY_LAGS, STANDARD_TIME_FORMAT
+from resources.time_toolbox import TimeToolbox
+
+
+class HistoryFeatures():
+    """
+    HistoryFeatures to add rolling & lagged counts per census tract to the tract x day grid
+
+    Rows are keyed by (census tract, day) and sorted once, the counts are accumulated with a cumulative sum and every
+    window is the difference of two positions found with `np.searchsorted`, so missing days need no special case.
+    Windows cover the previous days only: the counts of the day itself (e.g. the target) are never used.
+
+    The last days of the grid are kept as history, a later run on new days only computes the features of these days
+    on top of the history.
+    """
+
+    def __init__(self, columns=HISTORY_COLUMNS, windows=HISTORY_WINDOWS, lags=HISTORY_LAGS):
+        """
+        :param columns: the counts to accumulate, missing columns count as zeros
+        :type columns: :py:class:`list`
+
+        :param windows: the lengths of the rolling windows, in days
+        :type windows: :py:class:`list`
+
+        :param lags: the lags, in days
+        :type lags: :py:class:`list`
+        """
+        self.columns = columns
+        self.windows = windows
+        self.lags = lags
+        # days of history needed by the longest window/lag
+        self.horizon = max(list(windows) + list(lags))
+
+    @property
+    def features(self):
+        """
+        :return: the names of the features
+        """
+        return ['{}_last_{}d'.format(column, window) for column in self.columns for window in self.windows] + \
+               ['{}_lag_{}d'.format(column, lag) for column in self.columns for lag in self.lags]
+
+    @staticmethod
+    def day_numbers(dates):
+        """
+        :param dates: dates in STANDARD_TIME_FORMAT
+        :type dates: :py:class:`pandas.Series`
+
+        :return: int64 array of days since epoch, -1 for invalid dates
+        """
+        parsed = TimeToolbox().to_datetime_column(dates, STANDARD_TIME_FORMAT)
+        days = parsed.values.astype('datetime64[D]').astype(np.int64)
+        days[parsed.isnull().values] = -1
+        return days
+
+    def counts(self, df):
+        """
+        :param df: incidents/tracts/context
+        :type df: :py:class:`pandas.DataFrame`
+
+        :return: float64 array (rows x columns), missing values as zeros
+        """
+        counts = np.zeros((len(df), len(self.columns)))
+        for i, column in enumerate(self.columns):
+            if column in df.columns:
+                counts[:, i] = pd.to_numeric(df[column], errors='coerce').fillna(0).values
+        return counts
+
+    def compute(self, df, df_history=None):
+        """
+        compute the features of the rows of a table
+
+        :param df: incidents/tracts/context, with census_tract & incident_date_time columns
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param df_history: the history of a previous run (see `history`), only its days before the table are used
+        :type df_history: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame of features, on the index of the table
+        """
+        tracts = np.asarray(df[u'census_tract'], dtype=object)
+        days = self.day_numbers(df[u'incident_date_time'])
+        counts = self.counts(df)
+
+        valid = days >= 0
+        if df_history is not None and valid.any():
+            df_history = df_history[df_history[u'day'].values < days[valid].min()]
+            logging.info("history features on top of %s days of history", df_history[u'day'].nunique())
+            tracts = np.concatenate([np.asarray(df_history[u'census_tract'], dtype=object), tracts])
+            days = np.concatenate([df_history[u'day'].values.astype(np.int64), days])
+            counts = np.concatenate([self.counts(df_history), counts])
+            valid = np.concatenate([np.ones(len(df_history), dtype=bool), valid])
+        nbr_history = len(tracts) - len(df)
+
+        features = np.zeros((len(df), len(self.features)), dtype=np.float32)
+        if valid.any():
+            # key = tract * span + day, the offset of the horizon keeps every window within its tract
+            tract_codes, _ = pd.factorize(tracts)
+            first_day = days[valid].min()
+            span = days[valid].max() - first_day + self.horizon + 1
+            keys = tract_codes.astype(np.int64) * span + (days - first_day + self.horizon)
+
+            order = np.flatnonzero(valid)[np.argsort(keys[valid], kind='mergesort')]
+            sorted_keys = keys[order]
+            # cumulative counts, row 0 is the empty sum
+            cumulative = np.vstack([np.zeros((1, len(self.columns))), np.cumsum(counts[order], axis=0)])
+
+            queries = keys[nbr_history:][valid[nbr_history:]]
+            # sum of the counts from `start` days before every day up to `end` days before, excluded
+            window = lambda start, end: cumulative[np.searchsorted(sorted_keys, queries - end)] - \
+                                        cumulative[np.searchsorted(sorted_keys, queries - start)]
+
+            rolling = [window(length, 0) for length in self.windows]
+            lagged = [window(lag, lag - 1) for lag in self.lags]
+
+            columns = [values[:, i] for i in range(len(self.columns)) for values in rolling] + \
+                      [values[:, i] for i in range(len(self.columns)) for values in lagged]
+            features[valid[nbr_history:]] = np.column_stack(columns)
+
+        return pd.DataFrame(features, index=df.index, columns=self.features)
+
+    def history(self, df, df_history=None):
+        """
+        get the history to keep for the next run: the counts of the last days of the table & of the previous history
+
+        :param df: incidents/tracts/context, with census_tract & incident_date_time columns
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param df_history: the history of a previous run
+        :type df_history: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame with columns census_tract, day & the counts
+        """
+        counts = self.counts(df)
+        df_new = pd.DataFrame(counts.astype(np.float32), columns=self.columns)
+        df_new.insert(0, u'day', self.day_numbers(df[u'incident_date_time']))
+        df_new.insert(0, u'census_tract', np.asarray(df[u'census_tract'], dtype=object))
+        df_new = df_new[df_new[u'day'] >= 0]
+
+        if df_history is not None and len(df_new):
+            df_history = df_history[df_history[u'day'].values < df_new[u'day'].min()]
+            df_new = pd.concat([df_history[list(df_new.columns)], df_new], ignore_index=True)
+
+        if not len(df_new):
+            return df_new
+        return df_new[df_new[u'day'] > df_new[u'day'].max() - self.horizon].reset_index(drop=True)
@@ -0,0 +1,97 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+class JoinEngine():
+    """
+    JoinEngine to attach lookup tables (census, weather, context) to the incidents grid
+
+    The keys of the grid (census tract, date) are encoded once as categorical columns, so every join maps the keys
+    of the lookup table to the codes of the grid and attaches its rows by position: the grid keys are never hashed
+    again. The joined table has categorical keys, the table given is not modified. Lookup tables with duplicated keys
+    fall back on `DataFrame.join`.
+    """
+
+    @staticmethod
+    def encode(df, keys):
+        """
+        encode key columns as categorical columns
+
+        :param df: the table
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param keys: the key columns
+        :type keys: :py:class:`list`
+
+        :return: (shallow copy of the table with categorical keys, list of (codes, categories) of the keys)
+        """
+        df = df.copy(deep=False)
+        encoded = []
+        for key in keys:
+            if not isinstance(df[key].dtype, pd.CategoricalDtype):
+                codes, uniques = pd.factorize(df[key])
+                df[key] = pd.Categorical.from_codes(codes, categories=uniques)
+            encoded.append((df[key].cat.codes.values.astype(np.int64), df[key].cat.categories))
+        return df, encoded
+
+    @classmethod
+    def join(cls, df, df_lookup, on, how='left'):
+        """
+        join a lookup table indexed by the keys on the key columns of the table
+
+        :param df: the table
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param df_lookup: lookup table indexed by the keys
+        :type df_lookup: :py:class:`pandas.DataFrame`
+
+        :param on: the key columns of the table, in the order of the index levels of the lookup table
+        :type on: :py:class:`list`
+
+        :param how: left or inner
+        :type how: :py:class:`str`
+
+        :return: DataFrame
+        """
+        if not df_lookup.index.is_unique:
+            logging.info("duplicated keys in the lookup table, hash join on %s", on)
+            return df.join(df_lookup, on=on if len(on) > 1 else on[0], how=how)
+
+        overlap = df.columns.intersection(df_lookup.columns)
+        if len(overlap):
+            raise ValueError("columns overlap but no suffix specified: {}".format(list(overlap)))
+
+        df, encoded = cls.encode(df, on)
+
+        # combine the codes of the keys into a single code, the lookup keys missing from the table are dropped
+        codes = np.zeros(len(df), dtype=np.int64)
+        lookup_codes = np.zeros(len(df_lookup), dtype=np.int64)
+        in_table = np.ones(len(df_lookup), dtype=bool)
+        for level, (key_codes, categories) in enumerate(encoded):
+            level_codes = categories.get_indexer(df_lookup.index.get_level_values(level))
+            in_table &= level_codes >= 0
+            codes = codes * (len(categories) + 1) + key_codes
+            lookup_codes = lookup_codes * (len(categories) + 1) + level_codes
+
+        # sorted lookup codes, the rows of the table find their lookup row by binary search
+        rows = np.flatnonzero(in_table)
+        order = np.argsort(lookup_codes[rows], kind='mergesort')
+        sorted_codes, rows = lookup_codes[rows][order], rows[order]
+
+        positions = np.full(len(df), -1, dtype=np.int64)
+        if len(sorted_codes):
+            found = np.minimum(np.searchsorted(sorted_codes, codes), len(sorted_codes) - 1)
+            matched = sorted_codes[found] == codes
+            positions[matched] = rows[found[matched]]
+        matched = positions >= 0
+
+        if how == 'inner':
+            df, positions = df[matched], positions[matched]
+        elif how != 'left':
+            raise ValueError("Unsupported join: {}".format(how))
+
+        # rows without match (position -1) are filled with NaN
+        df_attached = df_lookup.reset_index(drop=True).reindex(positions)
+        df_attached.index = df.index
+        return pd.concat([df, df_attached], axis=1)
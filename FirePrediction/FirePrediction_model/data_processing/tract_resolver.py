@@ -0,0 +1,307 @@
+from os.path import exists, isdir, join, relpath, getsize, getmtime, splitext
+from difflib import get_close_matches
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from resources.constants import TRACT_INDEX_EXT, TRACT_FUZZY_CUTOFF
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# faster fuzzy matching when rapidfuzz is installed, difflib otherwise
+try:
+    from rapidfuzz import process, fuzz
+except ImportError:
+    process, fuzz = None, None
+
+
+class TractResolver():
+    """
+    TractResolver to map addresses to census tracts
+
+    Addresses are looked up in the streets index: exact match first, then on the canonical form of the address and
+    finally with a fuzzy match among the streets of the same county/zip code & house/street numbers. The index is
+    persisted on disk and reused as long as the streets file does not change.
+    """
+    FIPS_CODE_NBR = 11
+    # house & street numbers, they have to match exactly: 'W 110TH ST' is not a typo of 'W 111TH ST'
+    NUMBERS = re.compile(r'\d+')
+
+    def __init__(self, streets, tracts, street_geoms=None, fuzzy_cutoff=TRACT_FUZZY_CUTOFF):
+        """
+        :param streets: normalized streets, e.g. 'W 151ST ST, NEW YORK, NY 10031'
+        :type streets: :py:class:`numpy.ndarray`
+
+        :param tracts: census tract of every street
+        :type tracts: :py:class:`numpy.ndarray`
+
+        :param street_geoms: geometry of every street, used to locate the geocoded addresses
+        :type street_geoms: :py:class:`numpy.ndarray`
+
+        :param fuzzy_cutoff: similarity threshold of the fuzzy matching, None to disable it
+        :type fuzzy_cutoff: :py:class:`float`
+        """
+        self.streets = streets
+        self.tracts = tracts
+        self.street_geoms = street_geoms
+        self.fuzzy_cutoff = fuzzy_cutoff
+
+        # the last street wins, as in a dict
+        self.street_positions = self._unique_positions(pd.Index(streets))
+
+        canonical_streets = self.canonical_addresses(pd.Series(streets))
+        self.canonical_positions = self._unique_positions(pd.Index(canonical_streets.values))
+
+        # fuzzy matching is restricted to the streets of the same county/zip code & numbers, sorted by length
+        blocks = defaultdict(dict)
+        for position, street in enumerate(canonical_streets.values):
+            name, _, area = street.partition(", ")
+            blocks[self._block_key(name, area)][name] = position
+
+        self.blocks = {}
+        for key, names in blocks.items():
+            names = sorted(names.items(), key=lambda item: len(item[0]))
+            self.blocks[key] = ([len(name) for name, _ in names], [name for name, _ in names],
+                                 [position for _, position in names])
+
+    @staticmethod
+    def _unique_positions(index):
+        """
+        get the position of the last occurrence of every key
+
+        :param index: keys
+        :type index: :py:class:`pandas.Index`
+
+        :return: (unique keys index, positions)
+        """
+        keep = ~index.duplicated(keep='last')
+        return pd.Index(index[keep]), np.flatnonzero(keep)
+
+    @classmethod
+    def _block_key(cls, name, area):
+        """
+        :param name: the street part of a canonical address
+        :type name: :py:class:`str`
+
+        :param area: the county/zip code part of a canonical address
+        :type area: :py:class:`str`
+
+        :return: the key of the streets a name can be fuzzy matched with
+        """
+        return area, tuple(cls.NUMBERS.findall(name))
+
+    @staticmethod
+    def canonical_addresses(addresses):
+        """
+        canonical form of addresses: upper case, single spaces & ', ' between the parts
+
+        :param addresses: addresses
+        :type addresses: :py:class:`pandas.Series`
+
+        :return: Series
+        """
+        addresses = addresses.map(str).str.upper()
+        addresses = addresses.str.replace(r'\s*,\s*', ', ', regex=True)
+        return addresses.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    @classmethod
+    def build(cls, streets_fname, fuzzy_cutoff=TRACT_FUZZY_CUTOFF):
+        """
+        build the resolver from the streets file
+
+        :param streets_fname: streets shapefile or csv file with street/left_block (& WKT geometry) columns
+        :type streets_fname: :py:class:`str`
+
+        :param fuzzy_cutoff: similarity threshold of the fuzzy matching, None to disable it
+        :type fuzzy_cutoff: :py:class:`float`
+
+        :return: TractResolver
+        """
+        if isdir(streets_fname) or streets_fname.endswith(".shp"):
+            df_streets = gpd.read_file(streets_fname)
+            street_geoms = df_streets.geometry.values.to_numpy()
+        else:
+            df_streets = pd.read_csv(streets_fname, sep="\t", dtype=str)
+            street_geoms = None
+            if 'geometry' in df_streets.columns:
+                street_geoms = shapely.from_wkt(df_streets['geometry'].values)
+
+        streets = df_streets[u'street'].map(str).values.astype(object)
+        tracts = df_streets[u'left_block'].map(str).str[:cls.FIPS_CODE_NBR].values.astype(object)
+
+        return cls(streets, tracts, street_geoms, fuzzy_cutoff)
+
+    @classmethod
+    def load(cls, streets_fname, index_fname=None, fuzzy_cutoff=TRACT_FUZZY_CUTOFF):
+        """
+        load the persisted resolver, it is rebuilt & persisted when the streets file changed
+
+        :param streets_fname: streets shapefile or csv file with street/left_block (& WKT geometry) columns
+        :type streets_fname: :py:class:`str`
+
+        :param index_fname: the name of the persisted index, next to the streets file by default
+        :type index_fname: :py:class:`str`
+
+        :param fuzzy_cutoff: similarity threshold of the fuzzy matching, None to disable it
+        :type fuzzy_cutoff: :py:class:`float`
+
+        :return: TractResolver
+        """
+        index_fname = index_fname or "{}{}".format(splitext(streets_fname.rstrip(os.sep))[0], TRACT_INDEX_EXT)
+        sources = [cls._source_stat(streets_fname)]
+
+        if exists(index_fname):
+            with open(index_fname, 'rb') as f:
+                index = pickle.load(f)
+            if index['sources'] == sources:
+                logging.info("tract index loaded: %s", index_fname)
+                return cls(index['streets'], index['tracts'], cls._from_wkb(index['street_geoms']), fuzzy_cutoff)
+
+        logging.info("building the tract index: %s", index_fname)
+        resolver = cls.build(streets_fname, fuzzy_cutoff)
+        resolver.save(index_fname, sources)
+        return resolver
+
+    def save(self, index_fname, sources=None):
+        """
+        persist the index
+
+        :param index_fname: the name of the index file
+        :type index_fname: :py:class:`str`
+
+        :param sources: the stat of the source files, the index is rebuilt when they change
+        :type sources: :py:class:`list`
+        """
+        index = {'sources': sources, 'streets': self.streets, 'tracts': self.tracts,
+                 'street_geoms': self._to_wkb(self.street_geoms)}
+
+        tmp_fname = "{}.tmp".format(index_fname)
+        with open(tmp_fname, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fname, index_fname)
+
+    @staticmethod
+    def _source_stat(path):
+        """
+        get the size & modification time of a file or of the files of a directory
+
+        :param path: the name of the file or the directory
+        :type path: :py:class:`str`
+
+        :return: list, None if there is no source
+        """
+        if path is None or not exists(path):
+            return None
+        if not isdir(path):
+            return [(getsize(path), getmtime(path))]
+        return [(relpath(join(root, fname), path), getsize(join(root, fname)), getmtime(join(root, fname)))
+                for root, _, files in sorted(os.walk(path)) for fname in sorted(files)]
+
+    @staticmethod
+    def _to_wkb(geoms):
+        """
+        serialize geometries to WKB
+
+        :param geoms: geometries
+        :type geoms: :py:class:`numpy.ndarray`
+
+        :return: array of WKB, None if there are no geometries
+        """
+        return None if geoms is None else shapely.to_wkb(geoms)
+
+    @staticmethod
+    def _from_wkb(geoms):
+        """
+        deserialize geometries from WKB
+
+        :param geoms: WKB geometries
+        :type geoms: :py:class:`numpy.ndarray`
+
+        :return: array of geometries, None if there are no geometries
+        """
+        return None if geoms is None else shapely.from_wkb(geoms)
+
+    def resolve_addresses(self, addresses):
+        """
+        map addresses to census tracts, every distinct address is resolved once
+
+        :param addresses: normalized addresses
+        :type addresses: :py:class:`pandas.Series`
+
+        :return: Series of census tracts, None for the unresolved addresses
+        """
+        positions = self.match_streets(addresses)
+
+        # unresolved addresses (position -1) are None
+        tracts = np.append(self.tracts, None)
+        return pd.Series(tracts[positions], index=addresses.index, name=u'census_tract')
+
+    def match_streets(self, addresses):
+        """
+        find the street of every address, every distinct address is matched once
+
+        :param addresses: normalized addresses
+        :type addresses: :py:class:`pandas.Series`
+
+        :return: array of street positions, -1 for the unresolved addresses
+        """
+        codes, uniques = pd.factorize(addresses)
+        uniques = pd.Series(uniques, dtype=object)
+
+        # exact match
+        keys, positions = self.street_positions
+        found = keys.get_indexer(uniques.values)
+        resolved = np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+
+        # canonical form of the address
+        missing = np.flatnonzero(resolved < 0)
+        if len(missing):
+            canonical = self.canonical_addresses(uniques.iloc[missing])
+            keys, positions = self.canonical_positions
+            found = keys.get_indexer(canonical.values)
+            resolved[missing] = np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+
+            # fuzzy match among the streets of the same county/zip code
+            if self.fuzzy_cutoff is not None:
+                for i, address in zip(missing[found < 0], canonical.values[found < 0]):
+                    resolved[i] = self._fuzzy_match(address)
+
+        logging.info("streets matched for %s/%s distinct addresses", (resolved >= 0).sum(), len(resolved))
+
+        # broadcast back to the rows, missing addresses (code -1) are unresolved
+        return np.append(resolved, -1)[codes]
+
+    def _fuzzy_match(self, address):
+        """
+        find the closest street of the same county/zip code with the same numbers
+
+        :param address: canonical address
+        :type address: :py:class:`str`
+
+        :return: position of the street, -1 if there is no close street
+        """
+        name, _, area = address.partition(", ")
+        key = self._block_key(name, area)
+        if key not in self.blocks:
+            return -1
+
+        # a similarity above the cutoff is only possible between names of close lengths
+        lengths, names, positions = self.blocks[key]
+        lo = bisect_left(lengths, len(name) * self.fuzzy_cutoff / (2 - self.fuzzy_cutoff))
+        hi = bisect_right(lengths, len(name) * (2 - self.fuzzy_cutoff) / self.fuzzy_cutoff)
+        candidates = names[lo:hi]
+
+        if process is not None:
+            match = process.extractOne(name, candidates, scorer=fuzz.ratio, score_cutoff=100 * self.fuzzy_cutoff)
+            return positions[lo + match[2]] if match else -1
+
+        matches = get_close_matches(name, candidates, n=1, cutoff=self.fuzzy_cutoff)
+        return positions[lo + candidates.index(matches[0])] if matches else -1
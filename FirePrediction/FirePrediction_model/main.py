@@ -1,9 +1,15 @@
 from data_acquisition.services.weather_info_collector import WeatherInfoCollector
 from data_acquisition.services.census_client import CensusAPIClient
+from data_acquisition.services.http_session import get_session
 from data_analysis.data_analyzer import DataAnalyzer
 from db.db_connector import DBConnector
 from data_processing.data_quester import DataQuester
 from data_processing.data_transformer import DataTransformer
+from data_processing.building_index import BuildingIndex
+from data_processing.feature_pipeline import FeaturePipeline
+from resources.data_store import DataStore
+from resources.stage_cache import Stage, StageCache
+from resources.stage_scheduler import StageScheduler
 from sklearn.ensemble import RandomForestClassifier
 from os.path import abspath, join, dirname
 from resources.constants import *
@@ -21,9 +27,23 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='FireCaster Model Builder')
     parser.add_argument('-task', help='Please provide the name of the task', required=False)
+    parser.add_argument('-format', help='Format of the intermediate files (csv, parquet, feather)', required=False,
+                        default=INTERMEDIATE_FORMAT)
+    parser.add_argument('-force', '--force', help='Rebuild every stage, even the up-to-date ones', action='store_true')
+    parser.add_argument('-dry_run', '--dry-run', dest='dry_run', help='List the stages that would be rebuilt',
+                        action='store_true')
+    parser.add_argument('-workers', help='Number of worker processes of the scheduler', required=False, type=int,
+                        default=SCHEDULER_WORKERS)
     args = vars(parser.parse_args())
     RUN_TASK = args['task']
 
+    # intermediate tables are exchanged through the store, only the final table is exported to csv
+    data_store = DataStore(args['format'])
+
+    # stages whose inputs, parameters and code did not change are skipped
+    stage_cache = StageCache(abspath(join(PROCESSED_DIR, STAGE_CACHE_FNAME)), force=args['force'],
+                             dry_run=args['dry_run'])
+
     # Load DB Configuration
     db_config = json.loads(open(abspath(join(CONFIG_DIR, CONFIG_DB))).read())
 
@@ -35,156 +55,290 @@ if __name__ == '__main__':
     # # # ---------------------------------
 
     if (RUN_TASK == RUN_ALL_TASKS) or (RUN_TASK == RUN_CONTEXTUAL_DATA_COLLECTION_TASK):
+        # the sources are APIs & the database, the collection stages run every time: the weather collection resumes
+        # from the collected dates, the census responses are cached, and the stages downstream are only rebuilt when
+        # the content of the collected files changes
+
         # # Get Weather Data
         logging.info("Get Weather Data")
         wunderground_keys_fname = abspath(join(CONFIG_DIR, WUNDERGROUND_KEYS_FNAME))
         weather_collector = WeatherInfoCollector(start_date=EXPERIMENT_START_DATE, end_date=EXPERIMENT_END_DATE)
         output_fname = abspath(join(INTERIM_DIR, NYC_WEATHER_INFO_FNAME))
-        weather_collector.get_weather_info_period(wunderground_keys_fname, output_fname, region=NYC_REGION,
-                                                  city=NYC_CITY)
+        stage_cache.run(Stage('get_weather_data', weather_collector.get_weather_info_period, inputs=[],
+                              outputs=[output_fname], args=(wunderground_keys_fname, output_fname),
+                              kwargs={'region': NYC_REGION, 'city': NYC_CITY},
+                              params={'period': (EXPERIMENT_START_DATE, EXPERIMENT_END_DATE)}, cached=False))
 
         # Get Census Data
         logging.info("Get Census Data")
         output_fname = abspath(join(PROCESSED_DIR, NYC_TRACTS_FNAME))
         census_api_client = CensusAPIClient(year=ACS5_YEAR, data_id=ACS5_TABLE_ID, var_list=CENSUS_FIELDS.keys(),
                                             table_id=ACS5_TABLE_ID, spatial_unit='all', key=CENSUS_KEY)
-        census_api_client.get_census_data(spatial_unit=SPATIAL_UNIT_TRACT, fname=output_fname)
+        stage_cache.run(Stage('get_census_data', census_api_client.get_census_data_sharded, inputs=[],
+                              outputs=[data_store.path(output_fname)],
+                              kwargs={'spatial_unit': SPATIAL_UNIT_TRACT, 'fname': output_fname, 'store': data_store},
+                              params={'variables': sorted(CENSUS_FIELDS)}, cached=False))
+        get_session().log_metrics()
 
         # Filter & Export Data
         logging.info("Filter & Export Data")
         mappluto_fname = abspath(join(PROCESSED_DIR, NYC_MAPPLUTO_FILTERED_FNAME))
         db_connector = DBConnector(db_config)
         data_quester = DataQuester(db_connector)
-        data_quester.get_mappluto_data(mappluto_fname)
+        stage_cache.run(Stage('get_mappluto_data', data_quester.get_mappluto_data, inputs=[],
+                              outputs=[mappluto_fname], args=(mappluto_fname,), cached=False))
 
     # # # ---------------------------------
     # # # 2 - Data Preprocessing 
     # # # ---------------------------------
 
-    if (RUN_TASK == RUN_ALL_TASKS) or (RUN_TASK == RUN_DATA_PREPROCESSING_TASK):
+    if RUN_TASK in (RUN_ALL_TASKS, RUN_DATA_PREPROCESSING_TASK, RUN_SCHEDULER_TASK):
         db_connector = DBConnector(db_config)
         data_quester = DataQuester(db_connector)
-        data_normalizer = DataTransformer()
+        data_normalizer = DataTransformer(store=data_store)
+        weather_collector = WeatherInfoCollector(start_date=EXPERIMENT_START_DATE, end_date=EXPERIMENT_END_DATE)
 
-        # normalize NYC indcidents data
-        logging.info("normalize NYC indcidents data")
         nyc_incidents_input_fname = abspath(join(RAW_DIR, NYC_FIRE_INCIDENTS_FNAME))
         nyc_incidents_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_FNAME_OUT))
-        data_normalizer.normalize_nyc_incidents_file(nyc_incidents_input_fname, nyc_incidents_fname)
-
-        # normalize streets 
-        logging.info("normalize streets")
         nyc_streets_input_fname = abspath(join(INTERIM_DIR, NYC_STREETS_FNAME))
         nyc_streets_fname = abspath(join(PROCESSED_DIR, NYC_STREETS_OUT))
-        data_normalizer.normalize_street_file(nyc_streets_input_fname, nyc_streets_fname)
-
-        # filter weather data
-        logging.info("filter weather data")
-        weather_collector = WeatherInfoCollector(start_date=EXPERIMENT_START_DATE, end_date=EXPERIMENT_END_DATE)
         weather_input_fname = abspath(join(INTERIM_DIR, NYC_WEATHER_INFO_FNAME))
         weather_fname = abspath(join(PROCESSED_DIR, NYC_WEATHER_FILTERED_FNAME))
-        weather_collector.filter_weather_data(weather_input_fname, weather_fname)
-
-        # aggregate/average mappluto data
-        logging.info("aggregate/average mappluto data")
         mappluto_fname = abspath(join(PROCESSED_DIR, NYC_MAPPLUTO_FILTERED_FNAME))
         mappluto_agg_fname = abspath(join(PROCESSED_DIR, NYC_MAPPLUTO_AGG_FNAME))
-        data_normalizer.aggregate_mappluto(mappluto_fname, mappluto_agg_fname)
-
-        # nyc building footprints 
+        # nyc building footprints
         nyc_buildings_fname = abspath(join(PROCESSED_DIR, NYC_BUILDINGS_FOOTPRINTS_FNAME))
-
-        # aggregate/average DOB complaints 
-        logging.info("aggregate/average DOB complaints")
+        nyc_buildings_index_fname = BuildingIndex.index_fname(nyc_buildings_fname)
         dob_complaints_fname = abspath(join(PROCESSED_DIR, NYC_DOB_COMPLAINTS_FNAME))
         dob_complaints_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_COMPLAINTS_AGG_FNAME))
-        data_normalizer.aggregate_complaints_data(nyc_buildings_fname, dob_complaints_fname, dob_complaints_agg_fname)
-
-        # aggregate/average DOB/ECB permits
-        logging.info("aggregate/average DOB/ECB permits")
         ecb_violations_fname = abspath(join(PROCESSED_DIR, NYC_ECB_VIOLATIONS_FNAME))
         dob_violations_fname = abspath(join(PROCESSED_DIR, NYC_DOB_VIOLATIONS_FNAME))
         dob_ecb_violations_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_ECB_VIOLATIONS_AGG_FNAME))
-        data_normalizer.aggregate_violations_data(nyc_buildings_fname, dob_violations_fname, ecb_violations_fname,
-                                                  dob_ecb_violations_agg_fname)
-
-        # aggregate/average DOB permits 
-        logging.info("aggregate/average DOB permits")
         dob_permits_fname = abspath(join(PROCESSED_DIR, NYC_DOB_PERMITS_FNAME))
         dob_permits_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_PERMITS_AGG_FNAME))
-        data_normalizer.aggregate_permits_data(nyc_buildings_fname, dob_permits_fname, dob_permits_agg_fname)
+
+        # the graph of the preprocessing stages, dependencies are inferred from the files stages read & write
+        preprocessing_stages = [
+            # normalize NYC indcidents data
+            Stage('normalize_incidents', data_normalizer.normalize_nyc_incidents_file,
+                  inputs=[nyc_incidents_input_fname], outputs=[data_store.path(nyc_incidents_fname)],
+                  args=(nyc_incidents_input_fname, nyc_incidents_fname),
+                  kwargs={'chunksize': INCIDENTS_CHUNKSIZE, 'n_jobs': INCIDENTS_JOBS}),
+
+            # normalize streets
+            Stage('normalize_streets', data_normalizer.normalize_street_file,
+                  inputs=[nyc_streets_input_fname], outputs=[nyc_streets_fname],
+                  args=(nyc_streets_input_fname, nyc_streets_fname)),
+
+            # filter weather data
+            Stage('filter_weather', weather_collector.filter_weather_data, inputs=[weather_input_fname],
+                  outputs=[weather_fname], args=(weather_input_fname, weather_fname),
+                  params={'period': (EXPERIMENT_START_DATE, EXPERIMENT_END_DATE)}),
+
+            # aggregate/average mappluto data
+            Stage('aggregate_mappluto', data_normalizer.aggregate_mappluto, inputs=[mappluto_fname],
+                  outputs=[data_store.path(mappluto_agg_fname)], args=(mappluto_fname, mappluto_agg_fname)),
+
+            # compile the BIN/BBL -> census tract index shared by the DOB aggregations
+            Stage('index_buildings', data_normalizer.index_buildings, inputs=[nyc_buildings_fname],
+                  outputs=[nyc_buildings_index_fname], args=(nyc_buildings_fname, nyc_buildings_index_fname)),
+
+            # aggregate/average DOB complaints
+            Stage('aggregate_complaints', data_normalizer.aggregate_complaints_data,
+                  inputs=[nyc_buildings_index_fname, dob_complaints_fname],
+                  outputs=[data_store.path(dob_complaints_agg_fname)],
+                  args=(nyc_buildings_fname, dob_complaints_fname, dob_complaints_agg_fname)),
+
+            # aggregate/average DOB/ECB violations
+            Stage('aggregate_violations', data_normalizer.aggregate_violations_data,
+                  inputs=[nyc_buildings_index_fname, dob_violations_fname, ecb_violations_fname],
+                  outputs=[data_store.path(dob_ecb_violations_agg_fname)],
+                  args=(nyc_buildings_fname, dob_violations_fname, ecb_violations_fname,
+                        dob_ecb_violations_agg_fname)),
+
+            # aggregate/average DOB permits
+            Stage('aggregate_permits', data_normalizer.aggregate_permits_data,
+                  inputs=[nyc_buildings_index_fname, dob_permits_fname],
+                  outputs=[data_store.path(dob_permits_agg_fname)],
+                  args=(nyc_buildings_fname, dob_permits_fname, dob_permits_agg_fname)),
+        ]
+
+        if RUN_TASK == RUN_SCHEDULER_TASK:
+            # run the independent stages in parallel
+            logging.info("schedule preprocessing stages")
+            StageScheduler(preprocessing_stages, max_workers=args['workers'], stage_cache=stage_cache).run()
+        else:
+            logging.info("run preprocessing stages")
+            stage_cache.run_all(preprocessing_stages)
 
     # # # ---------------------------------
     # # # 2 - Data Processing / Feature Engineering
     # # # ---------------------------------
 
     if (RUN_TASK == RUN_ALL_TASKS) or (RUN_TASK == RUN_FEATURE_ENGINEERING_TASK):
-        data_transformer = DataTransformer()
+        data_transformer = DataTransformer(store=data_store)
 
-        # join incidents to tracts
-        logging.info("join incidents to tracts")
         incidents_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_FNAME_OUT))
         street_fname = abspath(join(PROCESSED_DIR, NYC_STREETS_SEGMENTS_FNAME))
-        incidents_tracts_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_TRACTS_FNAME))
-        data_transformer.join_with_tracts(incidents_fname, street_fname, incidents_tracts_fname)
-
-        # flatten incidents/tracts
-        logging.info("flatten incidents/tracts")
-        incidents_tracts_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_TRACTS_FNAME))
-        nyc_census_fname = abspath(join(PROCESSED_DIR, NYC_TRACTS_FNAME))
-        incidents_tracts_sp_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_SPARSE_FNAME))
-        data_transformer.flatten_incidents_tracts(incidents_tracts_fname, nyc_census_fname, incidents_tracts_sp_fname)
-
-        # join incidents/tracts to Census
-        logging.info("join incidents/tracts to Census")
-        incidents_tracts_sp_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_SPARSE_FNAME))
         nyc_census_fname = abspath(join(PROCESSED_DIR, NYC_TRACTS_FNAME))
-        incidents_tracts_context_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CONTEXT_FNAME))
-        data_transformer.join_with_census_data(incidents_tracts_sp_fname, nyc_census_fname,
-                                               incidents_tracts_context_fname)
-
-        # join Incidents/Tracts/Census to Weather Data
-        logging.info("join Incidents/Tracts/Census to Weather Data")
-        weather_fname = abspath(join(PROCESSED_DIR, NYC_WEATHER_FNAME))
-        data_transformer.join_with_weather_data(incidents_tracts_context_fname, weather_fname,
-                                                incidents_tracts_context_fname)
-
-        # join with mappluto data
-        logging.info("join with mappluto data")
+        weather_fname = abspath(join(PROCESSED_DIR, NYC_WEATHER_FILTERED_FNAME))
         mappluto_agg_fname = abspath(join(PROCESSED_DIR, NYC_MAPPLUTO_AGG_FNAME))
-        data_transformer.join_with_mappluto_data(incidents_tracts_context_fname, mappluto_agg_fname,
-                                                 incidents_tracts_context_fname)
-
-        # join_complains_tracts
-        logging.info("join complains_tracts")
-        # aggregate/average DOB complaints
         dob_complaints_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_COMPLAINTS_AGG_FNAME))
-        data_transformer.join_with_complaints_data(incidents_tracts_context_fname, dob_complaints_agg_fname,
-                                                   incidents_tracts_context_fname)
-
-        # aggregate/average DOB/ECB permits
-        logging.info("aggregate/average DOB/ECB permits")
         dob_ecb_violations_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_ECB_VIOLATIONS_AGG_FNAME))
-        data_transformer.join_with_violations_data(incidents_tracts_context_fname, dob_ecb_violations_agg_fname,
-                                                   incidents_tracts_context_fname)
-
-        # aggregate/average DOB permits
-        logging.info("aggregate/average DOB permits")
         dob_permits_agg_fname = abspath(join(PROCESSED_DIR, NYC_DOB_PERMITS_AGG_FNAME))
-        data_transformer.join_with_permits_data(incidents_tracts_context_fname, dob_permits_agg_fname,
-                                                incidents_tracts_context_fname)
-
-        # add time features 
-        logging.info("add time features ")
-        data_transformer.encode_time_features(incidents_tracts_context_fname)
-
-        # rename columns 
-        logging.info("rename columns")
-        data_transformer.rename_columns(incidents_tracts_context_fname)
-
-        # filter relevant features
         incidents_context_final_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_CONTEXT_FINAL_FNAME))
-        data_transformer.filter_relevant_features(incidents_tracts_context_fname, incidents_context_final_fname)
+
+        feature_steps = [
+            ('join_with_tracts', street_fname),
+            ('flatten_incidents_tracts', nyc_census_fname),
+            ('join_with_census_data', nyc_census_fname),
+            ('join_with_weather_data', weather_fname),
+            ('join_with_mappluto_data', mappluto_agg_fname),
+            ('join_with_complaints_data', dob_complaints_agg_fname),
+            ('join_with_violations_data', dob_ecb_violations_agg_fname),
+            ('join_with_permits_data', dob_permits_agg_fname),
+        ]
+        # the history features are optional, they are only computed when they are kept
+        if ENCODE_HISTORY:
+            feature_steps.append(('encode_history_features', None))
+        feature_steps += [
+            ('encode_time_features', None),
+            ('rename_columns', None),
+            ('filter_relevant_features', None),
+        ]
+
+        # constants that change the features, a stage is rebuilt when its parameters change
+        history_params = {'history_columns': HISTORY_COLUMNS, 'history_windows': HISTORY_WINDOWS,
+                          'history_lags': HISTORY_LAGS}
+        time_params = {'encode_holidays': ENCODE_HOLIDAYS, 'encode_day_of_year': ENCODE_DAY_OF_YEAR}
+        features_params = {'relevant_features': RELEVANT_FEATURES}
+
+        if RUN_FUSED_FEATURE_ENGINEERING:
+            # run the feature engineering steps in a single in-memory pass
+            logging.info("fused feature engineering")
+            # the streets & weather files are raw inputs, the other lookups are written by the data store
+            raw_fnames = (street_fname, weather_fname)
+            lookup_fnames = [fname if fname in raw_fnames else data_store.path(fname)
+                             for _, fname in feature_steps if fname is not None]
+            feature_pipeline = FeaturePipeline(data_transformer, feature_steps)
+            fused_params = {'steps': feature_steps}
+            fused_params.update(time_params)
+            fused_params.update(features_params)
+            if ENCODE_HISTORY:
+                fused_params.update(history_params)
+            stage_cache.run(Stage('fused_feature_engineering', feature_pipeline.run,
+                                  inputs=[data_store.path(incidents_fname)] + sorted(set(lookup_fnames)),
+                                  outputs=[incidents_context_final_fname],
+                                  args=(incidents_fname, incidents_context_final_fname),
+                                  params=fused_params))
+
+        else:
+            # every step reads the output of the previous one, so a refreshed lookup only rebuilds its join and the
+            # steps after it
+            incidents_tracts_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_TRACTS_FNAME))
+            incidents_tracts_sp_fname = abspath(join(PROCESSED_DIR, NYC_FIRE_INCIDENTS_SPARSE_FNAME))
+            incidents_tracts_census_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CENSUS_FNAME))
+            incidents_tracts_weather_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CENSUS_WEATHER_FNAME))
+            incidents_tracts_mappluto_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_MAPPLUTO_FNAME))
+            incidents_tracts_complaints_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_COMPLAINTS_FNAME))
+            incidents_tracts_violations_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_VIOLATIONS_FNAME))
+            incidents_tracts_context_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CONTEXT_FNAME))
+            incidents_tracts_history_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CONTEXT_HISTORY_FNAME))
+            history_state_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_HISTORY_STATE_FNAME))
+            incidents_tracts_time_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CONTEXT_TIME_FNAME))
+            incidents_tracts_renamed_fname = abspath(join(PROCESSED_DIR, NYC_INCIDENTS_TRACTS_CONTEXT_RENAMED_FNAME))
+
+            stages = [
+                # join incidents to tracts
+                Stage('join_with_tracts', data_transformer.join_with_tracts,
+                      inputs=[data_store.path(incidents_fname), street_fname],
+                      outputs=[data_store.path(incidents_tracts_fname)],
+                      args=(incidents_fname, street_fname, incidents_tracts_fname)),
+
+                # flatten incidents/tracts
+                Stage('flatten_incidents_tracts', data_transformer.flatten_incidents_tracts,
+                      inputs=[data_store.path(incidents_tracts_fname), data_store.path(nyc_census_fname)],
+                      outputs=[data_store.path(incidents_tracts_sp_fname)],
+                      args=(incidents_tracts_fname, nyc_census_fname, incidents_tracts_sp_fname)),
+
+                # join incidents/tracts to Census
+                Stage('join_with_census_data', data_transformer.join_with_census_data,
+                      inputs=[data_store.path(incidents_tracts_sp_fname), data_store.path(nyc_census_fname)],
+                      outputs=[data_store.path(incidents_tracts_census_fname)],
+                      args=(incidents_tracts_sp_fname, nyc_census_fname, incidents_tracts_census_fname)),
+
+                # join Incidents/Tracts/Census to Weather Data
+                Stage('join_with_weather_data', data_transformer.join_with_weather_data,
+                      inputs=[data_store.path(incidents_tracts_census_fname), weather_fname],
+                      outputs=[data_store.path(incidents_tracts_weather_fname)],
+                      args=(incidents_tracts_census_fname, weather_fname, incidents_tracts_weather_fname)),
+
+                # join with mappluto data
+                Stage('join_with_mappluto_data', data_transformer.join_with_mappluto_data,
+                      inputs=[data_store.path(incidents_tracts_weather_fname), data_store.path(mappluto_agg_fname)],
+                      outputs=[data_store.path(incidents_tracts_mappluto_fname)],
+                      args=(incidents_tracts_weather_fname, mappluto_agg_fname, incidents_tracts_mappluto_fname)),
+
+                # join with aggregated DOB complaints
+                Stage('join_with_complaints_data', data_transformer.join_with_complaints_data,
+                      inputs=[data_store.path(incidents_tracts_mappluto_fname),
+                              data_store.path(dob_complaints_agg_fname)],
+                      outputs=[data_store.path(incidents_tracts_complaints_fname)],
+                      args=(incidents_tracts_mappluto_fname, dob_complaints_agg_fname,
+                            incidents_tracts_complaints_fname)),
+
+                # join with aggregated DOB/ECB violations
+                Stage('join_with_violations_data', data_transformer.join_with_violations_data,
+                      inputs=[data_store.path(incidents_tracts_complaints_fname),
+                              data_store.path(dob_ecb_violations_agg_fname)],
+                      outputs=[data_store.path(incidents_tracts_violations_fname)],
+                      args=(incidents_tracts_complaints_fname, dob_ecb_violations_agg_fname,
+                            incidents_tracts_violations_fname)),
+
+                # join with aggregated DOB permits
+                Stage('join_with_permits_data', data_transformer.join_with_permits_data,
+                      inputs=[data_store.path(incidents_tracts_violations_fname),
+                              data_store.path(dob_permits_agg_fname)],
+                      outputs=[data_store.path(incidents_tracts_context_fname)],
+                      args=(incidents_tracts_violations_fname, dob_permits_agg_fname,
+                            incidents_tracts_context_fname)),
+            ]
+
+            features_input_fname = incidents_tracts_context_fname
+            if ENCODE_HISTORY:
+                # add rolling/lagged counts per tract, the history of the last days is kept for
+                # `DataTransformer.append_history_features`
+                stages.append(
+                    Stage('encode_history_features', data_transformer.encode_history_features,
+                          inputs=[data_store.path(incidents_tracts_context_fname)],
+                          outputs=[data_store.path(incidents_tracts_history_fname),
+                                   data_store.path(history_state_fname)],
+                          args=(incidents_tracts_context_fname, incidents_tracts_history_fname, history_state_fname),
+                          params=history_params))
+                features_input_fname = incidents_tracts_history_fname
+
+            stages += [
+                # add time features
+                Stage('encode_time_features', data_transformer.encode_time_features,
+                      inputs=[data_store.path(features_input_fname)],
+                      outputs=[data_store.path(incidents_tracts_time_fname)],
+                      args=(features_input_fname, incidents_tracts_time_fname),
+                      params=time_params),
+
+                # rename columns
+                Stage('rename_columns', data_transformer.rename_columns,
+                      inputs=[data_store.path(incidents_tracts_time_fname)],
+                      outputs=[data_store.path(incidents_tracts_renamed_fname)],
+                      args=(incidents_tracts_time_fname, incidents_tracts_renamed_fname)),
+
+                # filter relevant features
+                Stage('filter_relevant_features', data_transformer.filter_relevant_features,
+                      inputs=[data_store.path(incidents_tracts_renamed_fname)],
+                      outputs=[incidents_context_final_fname],
+                      args=(incidents_tracts_renamed_fname, incidents_context_final_fname),
+                      params=features_params),
+            ]
+            stage_cache.run_all(stages)
 
     if (RUN_TASK == RUN_ALL_TASKS) or (RUN_TASK == RUN_MODEL_SELECTION_TASK):
         data_analyzer = DataAnalyzer()
@@ -10,6 +10,7 @@ TEST_PERIOD = ['{}-12-2014'.format(str(i).zfill(2)) for i in range(31)]
 # Commands to run the script
 RUN_TASK_SHUFFLE_VALIDATION = False
 RUN_TASK_OUT_TIME_VALIDATION = True 
+RUN_FUSED_FEATURE_ENGINEERING = True
 RUN_DATA_AGGREGATION_TASK = 'DATA_AGGREGATION'
 RUN_DATA_PREPROCESSING_TASK = 'DATA_PREPROCESSING'
 RUN_DATA_CLEANING_TASK = 'DATA_CLEANING'
@@ -24,6 +25,19 @@ RAW_DIR="./data/raw"
 INTERIM_DIR="./data/intreim"
 PROCESSED_DIR="./data/processed"
 
+# Format of the intermediate files exchanged between the stages (csv, parquet, feather)
+INTERMEDIATE_FORMAT = 'parquet'
+
+# Manifest of the stage cache (content hashes of the inputs/outputs of every stage)
+STAGE_CACHE_FNAME = ".stage_cache.json"
+
+# Number of worker processes used to run independent stages (None: number of CPUs)
+SCHEDULER_WORKERS = None
+
+# Rows of the raw incidents normalized at once (None: the whole file) & number of processes that normalize them
+INCIDENTS_CHUNKSIZE = 500000
+INCIDENTS_JOBS = 1
+
 # Fire Incidents input/output files 
 NYC_FIRE_INCIDENTS_FNAME = "nyc_fire_incidents.csv"
 NYC_FIRE_INCIDENTS_FNAME_OUT = "nyc_fire_incidents_out.csv"
@@ -46,7 +60,14 @@ NYC_FIRE_INCIDENTS_TRACTS_FNAME = "nyc_fire_incidents_tracts.csv"
 NYC_FIRE_INCIDENTS_TRACTS_BYDAY_FNAME = "nyc_fire_incidents_tracts_day.csv"
 NYC_INCIDENTS_TRACTS_CENSUS_FNAME = "nyc_fire_incidents_tracts_census.csv"
 NYC_INCIDENTS_TRACTS_CENSUS_WEATHER_FNAME = "nyc_fire_incidents_tracts_census_weather.csv"
+NYC_INCIDENTS_TRACTS_MAPPLUTO_FNAME = "nyc_fire_incidents_tracts_census_weather_mappluto.csv"
+NYC_INCIDENTS_TRACTS_COMPLAINTS_FNAME = "nyc_fire_incidents_tracts_census_weather_mappluto_complaints.csv"
+NYC_INCIDENTS_TRACTS_VIOLATIONS_FNAME = "nyc_fire_incidents_tracts_census_weather_mappluto_complaints_violations.csv"
 NYC_INCIDENTS_TRACTS_CONTEXT_FNAME = "nyc_fire_incidents_tracts_context.csv"
+NYC_INCIDENTS_TRACTS_CONTEXT_HISTORY_FNAME = "nyc_fire_incidents_tracts_context_history.csv"
+NYC_INCIDENTS_TRACTS_HISTORY_STATE_FNAME = "nyc_fire_incidents_tracts_history_state.csv"
+NYC_INCIDENTS_TRACTS_CONTEXT_TIME_FNAME = "nyc_fire_incidents_tracts_context_time.csv"
+NYC_INCIDENTS_TRACTS_CONTEXT_RENAMED_FNAME = "nyc_fire_incidents_tracts_context_renamed.csv"
 NYC_WEATHER_FNAME =  "nyc_weather_filtered.csv"
 NYC_INCIDENTS_CONTEXT_FINAL_FNAME = "nyc_fire_incidents_tracts_context_final.csv"
 
@@ -55,6 +76,19 @@ NYC_STREETS_FNAME = "StreetSegment.csv"
 NYC_STREETS_OUT = "nyc_streets_segments"
 NYC_STREETS_SEGMENTS_FNAME = "_nyc_streets_segments.csv"
 
+# Address -> census tract resolver: index persisted next to the streets file & similarity threshold of the fuzzy
+# matching of addresses (None to only keep exact matches)
+TRACT_INDEX_EXT = ".tract_index"
+TRACT_FUZZY_CUTOFF = 0.9
+
+# Building (BIN/BBL) -> census tract index compiled next to the buildings file, memory-mapped by the DOB aggregations
+BUILDING_INDEX_EXT = ".building_index"
+
+# Geocoding: persistent cache of the geocoded addresses & number of concurrent lookups of the online backends
+GEOCODER_CACHE_FNAME = "geocoder_cache.sqlite"
+GEOCODER_WORKERS = 8
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
 RF_CLR_FNAME = 'rf_classifier_firecaster.p'
 
 # e.g: 01/01/2013 12:00:20 AM
@@ -186,20 +220,75 @@ BORO_STR_CODE = {'MANHATTAN':'1','BRONX':'2','BROOKLYN':'3','QUEENS':'4','STATEN
 NYC_REGION = "NY"
 NYC_CITY = "New_York" 
 
+# HTTP session shared by the API clients: connections kept alive per host, timeouts to connect & between two bytes
+# of a response (seconds), compressed responses & size of the chunks of the streamed responses (bytes)
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 60
+HTTP_GZIP = True
+HTTP_CHUNK_SIZE = 1 << 16
+
+# Responses of the APIs cached in the interim directory: time to live per endpoint (seconds, None: forever), history &
+# tables of a past vintage never change, forecasts do
+RESPONSE_CACHE_DIRNAME = "http_cache"
+RESPONSE_CACHE_TTLS = {'wunderground_history': None, 'wunderground_forecast': 10 * 60,
+                       'census_variables': 7 * 24 * 3600, 'census_data': None}
+
 # Weather Data
 WUNDERGROUND_KEYS_FNAME = "wunderground_keys.json"
-NYC_WEATHER_INFO_FNAME = "newyork_weather_info.csv"
+# raw daily summaries, one JSON object per line, compressed with gzip when the name ends with .gz
+NYC_WEATHER_INFO_FNAME = "newyork_weather_info.ndjson.gz"
 NYC_WEATHER_FILTERED_FNAME =  "newyork_weather_filtered.csv"
 
+# Weather history backfill: url of the API (e.g. a local stub server for tests), concurrent requests, attempts per
+# date & base delay of the exponential backoff between them (seconds)
+WUNDERGROUND_BASE_URL = "http://api.wunderground.com/api"
+WEATHER_WORKERS = 4
+WEATHER_MAX_ATTEMPTS = 5
+WEATHER_BACKOFF = 2.0
+
+# Wunderground keys: calls per minute & per day allowed per key (None: unlimited, a key of the keys file may set its
+# own calls_per_minute/calls_per_day), cooldown of a throttled key & longest wait for a key (seconds)
+WUNDERGROUND_CALLS_PER_MINUTE = 10
+WUNDERGROUND_CALLS_PER_DAY = 500
+WUNDERGROUND_KEY_COOLDOWN = 60.
+WUNDERGROUND_MAX_WAIT = 300.
+
 # ACS5 Census Data
 ACS5_TABLE_ID = 'acs5'
 ACS5_YEAR = 2015
 SPATIAL_UNIT_TRACT = {'granularity': 'tract', 'state': '36' ,  'tract': '*' }
 SPATIAL_UNIT_BLOCK = {'granularity': 'blockgroup', 'state': '36' ,  'tract': '*', 'blockgroup': '*' }
 
+# Sharded census downloads: shards fetched concurrently & variables per query (limit of the API)
+CENSUS_WORKERS = 8
+CENSUS_MAX_VARIABLES = 50
+
 NYC_TRACTS_FNAME = "nyc_tracts.csv" 
 NYC_BLOCKS_FNAME = "nyc_blocks.csv"
 
+# One-hot encoded time features
+WEEKDAY_FEATURES = ['wday_mon', 'wday_tue', 'wday_wed', 'wday_thu', 'wday_fri', 'wday_sat', 'wday_sun']
+MONTH_FEATURES = ['month_jan', 'month_feb', 'month_mar', 'month_apr', 'month_may', 'month_jun', 'month_jul',
+                  'month_aug', 'month_sep', 'month_oct', 'month_nov', 'month_dec']
+
+# Optional time features: US federal holidays & day of the year encoded on a circle
+ENCODE_HOLIDAYS = False
+ENCODE_DAY_OF_YEAR = False
+HOLIDAY_FEATURES = ['holiday']
+DAY_OF_YEAR_FEATURES = ['day_of_year_sin', 'day_of_year_cos']
+
+# Optional rolling (sum over the previous days, the day itself excluded) & lagged counts per census tract. Only
+# daily counts are accumulated: the DOB complaints, violations & permits are aggregated per month
+# (STANDARD_TIME_FORMAT_M) and do not match the days of the grid
+ENCODE_HISTORY = False
+HISTORY_COLUMNS = [u'nbr_incidents']
+HISTORY_WINDOWS = [7, 30]
+HISTORY_LAGS = [1]
+HISTORY_FEATURES = ['{}_last_{}d'.format(column, window)
+                    for column in HISTORY_COLUMNS for window in HISTORY_WINDOWS] + \
+                   ['{}_lag_{}d'.format(column, lag) for column in HISTORY_COLUMNS for lag in HISTORY_LAGS]
+
 RELEVANT_FEATURES = [u'incident_date_time', u'census_tract', u'nbr_incidents', 
 		'wday_mon', 'wday_tue', 'wday_wed', 'wday_thu', 'wday_fri', 'wday_sat', 'wday_sun', 
 		'month_jan', 'month_feb', 'month_mar', 'month_apr', 'month_may', 'month_jun', 'month_jul', 'month_aug', 'month_sep', 'month_oct', 'month_nov', 'month_dec',
@@ -252,5 +341,16 @@ PREDICTORS = ['wday_mon', 'wday_tue', 'wday_wed', 'wday_thu', 'wday_fri', 'wday_
        u'avg_unitsres', u'ratio_retailarea', u'ratio_resarea', u'ratio_comarea', 
        u'avg_yearbuilt', u'ratio_officerea', u'avg_numfloors', u'total_units', 
        u'avg_unitarea', u'total_bldgarea']
+if ENCODE_HISTORY:
+    RELEVANT_FEATURES += HISTORY_FEATURES
+    PREDICTORS += HISTORY_FEATURES
+
+if ENCODE_HOLIDAYS:
+    RELEVANT_FEATURES += HOLIDAY_FEATURES
+    PREDICTORS += HOLIDAY_FEATURES
+
+if ENCODE_DAY_OF_YEAR:
+    RELEVANT_FEATURES += DAY_OF_YEAR_FEATURES
+    PREDICTORS += DAY_OF_YEAR_FEATURES
 
 TARGET = u'nbr_incidents'
@@ -0,0 +1,182 @@
+from os.path import splitext
+import logging
+import pandas as pd
+
+# Parquet/Feather support is optional, fall back on tab separated text files without pyarrow.
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from resources.constants import INTERMEDIATE_FORMAT
+from resources.schemas import apply_schema, read_csv
+
+
+class DataStore():
+    """
+    DataStore to exchange intermediate tables between the stages of the pipeline
+    """
+    FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+    def __init__(self, fmt=INTERMEDIATE_FORMAT):
+        """
+        initialize the store with the format of the intermediate files
+
+        :param fmt: the format of the intermediate files (ex: csv, parquet, feather)
+        :type fmt: :py:class:`str`
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError("Unknown intermediate format: {}".format(fmt))
+
+        if fmt != 'csv' and pyarrow is None:
+            logging.warning("pyarrow is not installed, intermediate files are stored as csv")
+            fmt = 'csv'
+
+        self.fmt = fmt
+
+    def __repr__(self):
+        # stages that take the store are signed with its format (see `resources.stage_cache`)
+        return "DataStore({!r})".format(self.fmt)
+
+    def path(self, fname):
+        """
+        get the path of the file in the format of the store
+
+        :param fname: the name of the file (ex: nyc_fire_incidents_tracts_context.csv)
+        :type fname: :py:class:`str`
+
+        :return: the name of the file with the extension of the store
+        """
+        if self.fmt == 'csv':
+            return fname
+        return splitext(fname)[0] + self.FORMATS[self.fmt]
+
+    def read(self, fname, columns=None):
+        """
+        load a table from the store
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+
+        :param columns: the columns to load, all of them by default
+        :type columns: :py:class:`list`
+
+        :return: DataFrame, with the types of its schema (see `resources.schemas`)
+        """
+        path = self.path(fname)
+
+        if self.fmt == 'parquet':
+            return apply_schema(pd.read_parquet(path, columns=columns), fname)
+        elif self.fmt == 'feather':
+            return apply_schema(pd.read_feather(path, columns=columns), fname)
+
+        # keys are declared as strings (e.g. census tracts), text files without schema are kept as strings
+        return read_csv(path, columns=columns, sep="\t")
+
+    def write(self, df, fname):
+        """
+        store a table
+
+        :param df: the table to be stored
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+        """
+        path = self.path(fname)
+
+        if self.fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        elif self.fmt == 'feather':
+            df.reset_index(drop=True).to_feather(path)
+        else:
+            df.to_csv(path, index=False, sep="\t")
+
+    def open_writer(self, fname):
+        """
+        open a table of the store to write it chunk by chunk
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+
+        :return: StoreWriter
+        """
+        return StoreWriter(self.path(fname), self.fmt)
+
+    @staticmethod
+    def export_csv(df, fname, columns=None):
+        """
+        export a table to a tab separated file, used for the final outputs of the pipeline
+
+        :param df: the table to be exported
+        :type df: :py:class:`pandas.DataFrame`
+
+        :param fname: the name of the output file
+        :type fname: :py:class:`str`
+
+        :param columns: the columns to export, all of them by default
+        :type columns: :py:class:`list`
+        """
+        df.to_csv(fname, columns=columns, index=False, sep="\t")
+
+
+class StoreWriter():
+    """
+    StoreWriter to append chunks to a table of the store, the chunks must have the same columns
+
+    The schema of the table is taken from the first chunk. Parquet chunks are written as row groups and Feather
+    chunks as record batches, so only one chunk is held in memory.
+    """
+
+    def __init__(self, path, fmt):
+        """
+        :param path: the path of the file
+        :type path: :py:class:`str`
+
+        :param fmt: the format of the file (ex: csv, parquet, feather)
+        :type fmt: :py:class:`str`
+        """
+        self.path = path
+        self.fmt = fmt
+        self.schema = None
+        self.writer = None
+        self.nbr_rows = 0
+
+    def write(self, df):
+        """
+        append a chunk to the table
+
+        :param df: the chunk
+        :type df: :py:class:`pandas.DataFrame`
+        """
+        if self.fmt == 'csv':
+            df.to_csv(self.path, index=False, sep="\t", mode='w' if self.schema is None else 'a',
+                      header=self.schema is None)
+            self.schema = list(df.columns)
+        else:
+            table = pyarrow.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                if self.fmt == 'parquet':
+                    self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+                else:
+                    self.writer = pyarrow.ipc.new_file(self.path, self.schema)
+            self.writer.write_table(table)
+
+        self.nbr_rows += len(df)
+
+    def close(self):
+        """
+        close the table
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
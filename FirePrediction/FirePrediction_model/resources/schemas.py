@@ -0,0 +1,230 @@
+from os.path import basename, splitext
+import logging
+import numpy as np
+import pandas as pd
+
+from resources.constants import NYC_TRACTS_FNAME, NYC_WEATHER_FILTERED_FNAME, NYC_MAPPLUTO_AGG_FNAME, \
+    NYC_DOB_COMPLAINTS_AGG_FNAME, NYC_DOB_ECB_VIOLATIONS_AGG_FNAME, NYC_DOB_PERMITS_AGG_FNAME, \
+    NYC_FIRE_INCIDENTS_TRACTS_FNAME, NYC_FIRE_INCIDENTS_SPARSE_FNAME, NYC_INCIDENTS_TRACTS_CENSUS_FNAME, \
+    NYC_INCIDENTS_TRACTS_CENSUS_WEATHER_FNAME, NYC_INCIDENTS_TRACTS_MAPPLUTO_FNAME, \
+    NYC_INCIDENTS_TRACTS_COMPLAINTS_FNAME, NYC_INCIDENTS_TRACTS_VIOLATIONS_FNAME, NYC_INCIDENTS_TRACTS_CONTEXT_FNAME, \
+    NYC_INCIDENTS_TRACTS_CONTEXT_TIME_FNAME, NYC_INCIDENTS_TRACTS_CONTEXT_RENAMED_FNAME, \
+    NYC_INCIDENTS_CONTEXT_FINAL_FNAME, NYC_INCIDENTS_TRACTS_CONTEXT_HISTORY_FNAME, \
+    NYC_INCIDENTS_TRACTS_HISTORY_STATE_FNAME, WEEKDAY_FEATURES, MONTH_FEATURES, HOLIDAY_FEATURES, DAY_OF_YEAR_FEATURES, \
+    CENSUS_FIELDS
+
+
+class TableSchema():
+    """
+    TableSchema to declare the types of the columns of a table of the pipeline
+
+    Types are `str`, `category` or numpy types (ex: int32, float32). Keys (census tracts, dates) are kept in their
+    text format, as categories when they repeat over the rows. Integer columns with missing values (e.g. counts after
+    a left join) are loaded as float32. Undeclared columns keep their inferred type, the default type only narrows the
+    numeric ones.
+    """
+
+    def __init__(self, columns, default=None):
+        """
+        :param columns: column -> type
+        :type columns: :py:class:`dict`
+
+        :param default: the type of the undeclared numeric columns (ex: float32), they are left as they are by default
+        :type default: :py:class:`str`
+        """
+        self.columns = columns
+        self.default = default
+
+    def dtype(self, column, values=None):
+        """
+        get the type of a column
+
+        :param column: the name of the column
+        :type column: :py:class:`str`
+
+        :param values: the column, an undeclared column gets the default type when it is numeric
+        :type values: :py:class:`pandas.Series`
+
+        :return: the type, None if the column is left as it is
+        """
+        if column in self.columns:
+            return self.columns[column]
+        if values is not None and pd.api.types.is_numeric_dtype(values.dtype) and \
+                not pd.api.types.is_bool_dtype(values.dtype):
+            return self.default
+        return None
+
+    def csv_dtypes(self):
+        """
+        get the types to parse a text file with, integer columns are parsed as float32 since they may hold missing
+        values, they are narrowed by `apply`. The types of the undeclared columns are inferred
+
+        :return: dict, column -> type
+        """
+        return {column: self.parse_dtype(dtype) for column, dtype in self.columns.items()}
+
+    @staticmethod
+    def parse_dtype(dtype):
+        """
+        :param dtype: the declared type
+        :type dtype: :py:class:`str`
+
+        :return: the type used to parse text files
+        """
+        if dtype in ('str', 'category'):
+            return dtype
+        return np.float32 if np.issubdtype(np.dtype(dtype), np.integer) else dtype
+
+    def apply(self, df):
+        """
+        cast the columns of a table to their declared types, in place
+
+        :param df: the table
+        :type df: :py:class:`pandas.DataFrame`
+
+        :return: DataFrame
+        """
+        for column in df.columns:
+            dtype = self.dtype(column, df[column])
+            if dtype is not None:
+                df[column] = self.cast(df[column], dtype)
+        return df
+
+    @staticmethod
+    def cast(values, dtype):
+        """
+        cast a column to a type
+
+        :param values: the column
+        :type values: :py:class:`pandas.Series`
+
+        :param dtype: the type (ex: str, category, int32, float32)
+        :type dtype: :py:class:`str`
+
+        :return: Series
+        """
+        if dtype == 'category':
+            return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+
+        if dtype == 'str':
+            if pd.api.types.is_string_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+                return values
+            return values.astype(str).where(values.notnull())
+
+        dtype = np.dtype(dtype)
+        if values.dtype == dtype:
+            return values
+        if not pd.api.types.is_numeric_dtype(values.dtype) or isinstance(values.dtype, pd.CategoricalDtype):
+            numbers = pd.to_numeric(values.astype(object), errors='coerce')
+            coerced = int((numbers.isnull() & values.notnull()).sum())
+            if coerced:
+                logging.warning("%s values of column %s are not numbers, they are set missing", coerced, values.name)
+            values = numbers
+
+        if np.issubdtype(dtype, np.integer) and values.isnull().any():
+            dtype = np.dtype(np.float32)
+        return values.astype(dtype)
+
+
+# keys & features shared by the incidents/tracts tables, from the date x tract grid to the final table
+CONTEXT_COLUMNS = {u'incident_date_time': 'category', u'census_tract': 'category', u'nbr_incidents': 'int32',
+                   u'NAME': 'category', u'state': 'category', u'county': 'category', u'tract': 'category',
+                   u'address': 'str', u'observation_date_time': 'category', u'week_day': 'int8', u'month': 'int8'}
+CONTEXT_COLUMNS.update({_: 'uint8' for _ in WEEKDAY_FEATURES + MONTH_FEATURES + HOLIDAY_FEATURES})
+CONTEXT_COLUMNS.update({_: 'float32' for _ in DAY_OF_YEAR_FEATURES})
+
+CONTEXT_SCHEMA = TableSchema(CONTEXT_COLUMNS, default='float32')
+
+# the Census API answers numbers as text
+TRACTS_COLUMNS = {u'NAME': 'str', u'state': 'str', u'county': 'str', u'tract': 'str'}
+TRACTS_COLUMNS.update({_: 'float32' for _ in CENSUS_FIELDS})
+
+SCHEMAS = {
+    NYC_TRACTS_FNAME: TableSchema(TRACTS_COLUMNS, default='float32'),
+    NYC_WEATHER_FILTERED_FNAME: TableSchema({u'observation_date_time': 'str'}, default='float32'),
+    NYC_MAPPLUTO_AGG_FNAME: TableSchema({u'census_tract': 'str'}, default='float32'),
+    NYC_DOB_COMPLAINTS_AGG_FNAME: TableSchema({u'census_tract': 'category', u'Date Entered': 'category'},
+                                              default='int32'),
+    NYC_DOB_ECB_VIOLATIONS_AGG_FNAME: TableSchema({u'census_tract': 'category', u'ISSUE_DATE': 'category'},
+                                                  default='int32'),
+    NYC_DOB_PERMITS_AGG_FNAME: TableSchema({u'census_tract': 'category', u'Issuance Date': 'category'},
+                                           default='int32'),
+    # raw dates are kept as text, the min/max of the grid are taken on them
+    NYC_FIRE_INCIDENTS_TRACTS_FNAME: TableSchema({u'incident_date_time': 'str', u'address': 'str',
+                                                  u'census_tract': 'str'}),
+    NYC_INCIDENTS_TRACTS_HISTORY_STATE_FNAME: TableSchema({u'census_tract': 'str', u'day': 'int32'},
+                                                          default='float32'),
+}
+SCHEMAS.update({fname: CONTEXT_SCHEMA for fname in (
+    NYC_FIRE_INCIDENTS_SPARSE_FNAME, NYC_INCIDENTS_TRACTS_CENSUS_FNAME, NYC_INCIDENTS_TRACTS_CENSUS_WEATHER_FNAME,
+    NYC_INCIDENTS_TRACTS_MAPPLUTO_FNAME, NYC_INCIDENTS_TRACTS_COMPLAINTS_FNAME, NYC_INCIDENTS_TRACTS_VIOLATIONS_FNAME,
+    NYC_INCIDENTS_TRACTS_CONTEXT_FNAME, NYC_INCIDENTS_TRACTS_CONTEXT_HISTORY_FNAME,
+    NYC_INCIDENTS_TRACTS_CONTEXT_TIME_FNAME, NYC_INCIDENTS_TRACTS_CONTEXT_RENAMED_FNAME,
+    NYC_INCIDENTS_CONTEXT_FINAL_FNAME)})
+
+# tables are looked up by the name of their file, without directory nor extension (csv, parquet, feather)
+SCHEMAS = {splitext(fname)[0]: schema for fname, schema in SCHEMAS.items()}
+
+
+def get_schema(fname):
+    """
+    get the schema of a table of the pipeline
+
+    :param fname: the name of the file (ex: ./data/processed/nyc_tracts.csv)
+    :type fname: :py:class:`str`
+
+    :return: TableSchema, None if the table has no schema
+    """
+    return SCHEMAS.get(splitext(basename(fname))[0])
+
+
+def apply_schema(df, fname):
+    """
+    cast the columns of a table to the types of its schema, tables without schema are left as they are
+
+    :param df: the table
+    :type df: :py:class:`pandas.DataFrame`
+
+    :param fname: the name of the file the table is loaded from
+    :type fname: :py:class:`str`
+
+    :return: DataFrame
+    """
+    schema = get_schema(fname)
+    if schema is None:
+        return df
+    return schema.apply(df)
+
+
+def read_csv(fname, columns=None, dtype=str, **kwargs):
+    """
+    load a text file with the types of its schema
+
+    Values that do not parse to the declared type (e.g. text in a numeric column) are read again as strings and
+    coerced with a warning, they end up missing.
+
+    :param fname: the name of the file
+    :type fname: :py:class:`str`
+
+    :param columns: the columns to load, all of them by default
+    :type columns: :py:class:`list`
+
+    :param dtype: the type of the files without schema, strings by default, None to infer the types
+    :type dtype: :py:class:`type`
+
+    :param kwargs: other arguments of `pandas.read_csv` (ex: sep)
+    :type kwargs: :py:class:`dict`
+
+    :return: DataFrame
+    """
+    schema = get_schema(fname)
+    if schema is None:
+        return pd.read_csv(fname, dtype=dtype, usecols=columns, **kwargs)
+
+    try:
+        df = pd.read_csv(fname, dtype=schema.csv_dtypes(), usecols=columns, **kwargs)
+    except (ValueError, TypeError) as e:
+        logging.warning("%s does not parse with its schema (%s), coerce it", fname, e)
+        df = pd.read_csv(fname, dtype=str, usecols=columns, **kwargs)
+
+    return schema.apply(df)
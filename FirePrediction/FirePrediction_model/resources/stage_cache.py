@@ -0,0 +1,306 @@
+from os.path import abspath, dirname, exists, isdir, join, relpath, getsize, getmtime
+import hashlib
+import inspect
+import logging
+import json
+import os
+import sys
+
+
+class Stage():
+    """
+    Stage of the pipeline: a callable with the files it reads and the files it writes
+    """
+
+    def __init__(self, name, func, inputs, outputs, args=(), kwargs=None, params=None, cached=True):
+        """
+        :param name: the unique name of the stage
+        :type name: :py:class:`str`
+
+        :param func: the function that runs the stage
+        :type func: :py:class:`callable`
+
+        :param inputs: the files read by the stage
+        :type inputs: :py:class:`list`
+
+        :param outputs: the files written by the stage
+        :type outputs: :py:class:`list`
+
+        :param args: positional arguments of the function
+        :type args: :py:class:`tuple`
+
+        :param kwargs: keyword arguments of the function
+        :type kwargs: :py:class:`dict`
+
+        :param params: parameters that are not passed to the function but change its outputs (e.g. dates range)
+        :type params: :py:class:`dict`
+
+        :param cached: skip the stage when it is up-to-date, stages whose source is not a file (e.g. a database or
+                       an API) are run every time
+        :type cached: :py:class:`bool`
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.params = params or {}
+        self.cached = cached
+
+    def run(self):
+        """
+        run the stage
+        """
+        return self.func(*self.args, **self.kwargs)
+
+
+class StageCache():
+    """
+    StageCache to skip the stages whose inputs, parameters and code did not change since their last run
+
+    The manifest keeps, for every stage, the content hash of its inputs & outputs, its parameters and the hash of the
+    source code of its function. File hashes are memoized on (size, mtime) so unchanged files are not read again.
+
+    The code of a stage is the source of the modules of the project it depends on: the module of its function, the
+    modules of the objects a bound method delegates to (e.g. the transformer of the feature pipeline) and, transitively,
+    the modules they import. The constants are not part of the code, the ones that change the outputs of a stage are
+    given as its parameters.
+    """
+    # the directory of the project, modules outside of it (e.g. pandas) are not hashed
+    PROJECT_DIR = dirname(dirname(abspath(__file__)))
+    # modules of settings, not code: a change of an unrelated constant must not rebuild every stage
+    SETTINGS_MODULES = ('resources.constants',)
+
+    def __init__(self, manifest_fname, force=False, dry_run=False):
+        """
+        :param manifest_fname: the name of the file that holds the manifest
+        :type manifest_fname: :py:class:`str`
+
+        :param force: rebuild every stage
+        :type force: :py:class:`bool`
+
+        :param dry_run: only list the stages that would be rebuilt
+        :type dry_run: :py:class:`bool`
+        """
+        self.manifest_fname = manifest_fname
+        self.force = force
+        self.dry_run = dry_run
+
+        self.manifest = {'files': {}, 'stages': {}}
+        if exists(manifest_fname):
+            with open(manifest_fname) as f:
+                self.manifest = json.load(f)
+
+        # outputs of the stages that would be rebuilt during a dry run
+        self.dirty = set()
+
+    def _file_digest(self, fname):
+        """
+        hash the content of a file, memoized on its size & modification time
+
+        :param fname: the name of the file
+        :type fname: :py:class:`str`
+
+        :return: hex digest
+        """
+        stat = [getsize(fname), getmtime(fname)]
+        memo = self.manifest['files'].get(fname)
+        if memo is not None and memo['stat'] == stat:
+            return memo['digest']
+
+        sha = hashlib.sha1()
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+
+        self.manifest['files'][fname] = {'stat': stat, 'digest': sha.hexdigest()}
+        return sha.hexdigest()
+
+    def digest(self, path):
+        """
+        hash the content of a file or a directory (e.g. shapefiles)
+
+        :param path: the name of the file or the directory
+        :type path: :py:class:`str`
+
+        :return: hex digest, None if the path does not exist
+        """
+        if not exists(path):
+            return None
+
+        if not isdir(path):
+            return self._file_digest(path)
+
+        sha = hashlib.sha1()
+        for root, dirs, files in sorted(os.walk(path)):
+            for fname in sorted(files):
+                sha.update(relpath(join(root, fname), path).encode('utf-8'))
+                sha.update(self._file_digest(join(root, fname)).encode('utf-8'))
+        return sha.hexdigest()
+
+    @classmethod
+    def project_module(cls, obj):
+        """
+        :param obj: a module, a class, a function or an instance
+        :type obj: :py:class:`object`
+
+        :return: the module of the project the object is defined in, None if it is not part of the project
+        """
+        if not inspect.ismodule(obj):
+            name = getattr(obj, '__module__', None)
+            if name is None and not inspect.isroutine(obj):
+                name = getattr(type(obj), '__module__', None)
+            obj = sys.modules.get(name) if name is not None else None
+
+        fname = getattr(obj, '__file__', None)
+        if fname is None or obj.__name__ in cls.SETTINGS_MODULES:
+            return None
+        if not abspath(fname).startswith(cls.PROJECT_DIR + os.sep):
+            return None
+        return obj
+
+    @classmethod
+    def code_modules(cls, func):
+        """
+        get the modules of the project a function depends on
+
+        :param func: the function of a stage
+        :type func: :py:class:`callable`
+
+        :return: dict, module name -> module
+        """
+        roots = [func]
+        # a bound method delegates to the objects of its instance
+        instance = getattr(func, '__self__', None)
+        if instance is not None and not inspect.ismodule(instance):
+            roots += [type(instance)] + [type(value) for value in getattr(instance, '__dict__', {}).values()]
+
+        modules = {}
+        pending = [module for module in map(cls.project_module, roots) if module is not None]
+        while pending:
+            module = pending.pop()
+            if module.__name__ in modules:
+                continue
+            modules[module.__name__] = module
+            for value in list(vars(module).values()):
+                dependency = cls.project_module(value)
+                if dependency is not None and dependency.__name__ not in modules:
+                    pending.append(dependency)
+        return modules
+
+    @classmethod
+    def signature(cls, stage):
+        """
+        get the code version & the parameters of a stage
+
+        :param stage: the stage
+        :type stage: :py:class:`resources.stage_cache.Stage`
+
+        :return: dict
+        """
+        sha = hashlib.sha1()
+        sha.update(getattr(stage.func, '__qualname__', getattr(stage.func, '__name__', '')).encode('utf-8'))
+        for name, module in sorted(cls.code_modules(stage.func).items()):
+            try:
+                code = inspect.getsource(module)
+            except (IOError, TypeError):
+                code = name
+            sha.update(name.encode('utf-8'))
+            sha.update(code.encode('utf-8'))
+
+        return {'code': sha.hexdigest(),
+                'params': repr((stage.args, sorted(stage.kwargs.items()), sorted(stage.params.items())))}
+
+    def is_stale(self, stage):
+        """
+        check whether a stage has to be rebuilt
+
+        :param stage: the stage
+        :type stage: :py:class:`resources.stage_cache.Stage`
+
+        :return: the reason to rebuild the stage, None if it is up-to-date
+        """
+        if self.force:
+            return "forced"
+        if not stage.cached:
+            return "not cached"
+
+        record = self.manifest['stages'].get(stage.name)
+        if record is None:
+            return "never run"
+
+        signature = self.signature(stage)
+        if record['code'] != signature['code']:
+            return "code changed"
+        if record['params'] != signature['params']:
+            return "parameters changed"
+
+        for fname in stage.inputs:
+            if fname in self.dirty:
+                return "upstream rebuilt: {}".format(fname)
+            if record['inputs'].get(fname) != self.digest(fname):
+                return "input changed: {}".format(fname)
+
+        for fname in stage.outputs:
+            if record['outputs'].get(fname) != self.digest(fname):
+                return "output missing or modified: {}".format(fname)
+
+        return None
+
+    def record(self, stage):
+        """
+        record a stage that has been run
+
+        :param stage: the stage
+        :type stage: :py:class:`resources.stage_cache.Stage`
+        """
+        record = self.signature(stage)
+        record['inputs'] = {fname: self.digest(fname) for fname in stage.inputs}
+        record['outputs'] = {fname: self.digest(fname) for fname in stage.outputs}
+        self.manifest['stages'][stage.name] = record
+        self.save()
+
+    def run(self, stage):
+        """
+        run a stage unless it is up-to-date
+
+        :param stage: the stage
+        :type stage: :py:class:`resources.stage_cache.Stage`
+
+        :return: True if the stage has been (or would be) rebuilt
+        """
+        reason = self.is_stale(stage)
+        if reason is None:
+            logging.info("[%s] up-to-date, skipped", stage.name)
+            return False
+
+        if self.dry_run:
+            # nothing is rebuilt, so the stages downstream are stale because of this one
+            self.dirty.update(stage.outputs)
+            logging.info("[%s] would rebuild (%s)", stage.name, reason)
+            return True
+
+        logging.info("[%s] rebuilding (%s)", stage.name, reason)
+        stage.run()
+        self.record(stage)
+        return True
+
+    def run_all(self, stages):
+        """
+        run stages in order, skipping the up-to-date ones
+
+        :param stages: ordered stages
+        :type stages: :py:class:`list`
+        """
+        for stage in stages:
+            self.run(stage)
+
+    def save(self):
+        """
+        save the manifest
+        """
+        tmp_fname = "{}.tmp".format(self.manifest_fname)
+        with open(tmp_fname, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.rename(tmp_fname, self.manifest_fname)
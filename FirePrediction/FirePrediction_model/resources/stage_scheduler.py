@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import logging
+
+
+def _run_stage(stage):
+    """
+    run a stage in a worker process
+
+    :param stage: the stage
+    :type stage: :py:class:`resources.stage_cache.Stage`
+    """
+    return stage.run()
+
+
+class StageScheduler():
+    """
+    StageScheduler to run a graph of stages, independent stages are run in parallel on a process pool
+
+    A stage depends on the stages that write one of its inputs. Stages are checked against the stage cache before
+    being submitted, so up-to-date stages are skipped and do not block the stages that depend on them.
+    """
+
+    def __init__(self, stages, max_workers=None, stage_cache=None):
+        """
+        :param stages: the stages of the graph
+        :type stages: :py:class:`list`
+
+        :param max_workers: the number of worker processes, the number of CPUs by default
+        :type max_workers: :py:class:`int`
+
+        :param stage_cache: cache used to skip up-to-date stages, every stage is run without it
+        :type stage_cache: :py:class:`resources.stage_cache.StageCache`
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+
+        self.order = [stage.name for stage in stages]
+        self.max_workers = max_workers
+        self.stage_cache = stage_cache
+
+    def dependencies(self):
+        """
+        build the dependency graph of the stages
+
+        :return: dict, stage name -> names of the stages it depends on
+        """
+        producers = {}
+        for name in self.order:
+            for fname in self.stages[name].outputs:
+                if fname in producers:
+                    raise ValueError("{} is written by both {} and {}".format(fname, producers[fname], name))
+                producers[fname] = name
+
+        return {name: set(producers[fname] for fname in self.stages[name].inputs if fname in producers)
+                for name in self.order}
+
+    def topological_order(self):
+        """
+        sort the stages so that every stage comes after the stages it depends on
+
+        :return: list of stage names
+        """
+        dependencies = self.dependencies()
+        done, order = set(), []
+
+        while len(order) < len(self.order):
+            ready = [name for name in self.order if name not in done and dependencies[name] <= done]
+            if not ready:
+                raise ValueError("Cyclic dependencies between stages: {}".format(
+                    ", ".join(name for name in self.order if name not in done)))
+            order += ready
+            done.update(ready)
+
+        return order
+
+    def run(self):
+        """
+        run the stages, a stage is submitted as soon as all the stages it depends on are done
+        """
+        order = self.topological_order()
+
+        # nothing is run on a dry run, list the stages in order
+        if self.stage_cache is not None and self.stage_cache.dry_run:
+            self.stage_cache.run_all([self.stages[name] for name in order])
+            return
+
+        dependencies = self.dependencies()
+        pending, done, running = list(order), set(), {}
+
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                for name in [name for name in pending if dependencies[name] <= done]:
+                    pending.remove(name)
+                    stage = self.stages[name]
+
+                    reason = self.stage_cache.is_stale(stage) if self.stage_cache is not None else "no cache"
+                    if reason is None:
+                        logging.info("[%s] up-to-date, skipped", name)
+                        done.add(name)
+                        continue
+
+                    logging.info("[%s] submitted (%s)", name, reason)
+                    running[executor.submit(_run_stage, stage)] = name
+
+                # skipped stages may have released other stages
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # re-raise the error of the stage, the stages that depend on it can't be run
+                    future.result()
+                    logging.info("[%s] done", name)
+
+                    if self.stage_cache is not None:
+                        self.stage_cache.record(self.stages[name])
+                    done.add(name)
+        finally:
+            executor.shutdown(wait=True)
@@ -1,11 +1,136 @@
 from datetime import datetime, timedelta
+from collections import OrderedDict
 import logging
+import numpy as np
+import pandas as pd
 
 
 class TimeToolbox():
+    # LRU cache of the parsed dates shared by all the instances: (date string, format) -> datetime, None if invalid
+    PARSE_CACHE_SIZE = 2 ** 16
+    _parse_cache = OrderedDict()
+    _parse_cache_stats = {'hits': 0, 'misses': 0}
+
     def __init__(self, date_format=None):
         self.date_format = date_format
 
+    def _cache_get(self, key):
+        """
+        get a parsed date from the parse cache & mark it as recently used
+
+        :param key: (date string, date format)
+        :type  key: :py:class:`tuple`
+
+        :return: (found, DateTime)
+        """
+        if key not in self._parse_cache:
+            self._parse_cache_stats['misses'] += 1
+            return False, None
+
+        self._parse_cache_stats['hits'] += 1
+        dt = self._parse_cache.pop(key)
+        self._parse_cache[key] = dt
+        return True, dt
+
+    def _cache_put(self, key, dt):
+        """
+        add a parsed date to the parse cache, the least recently used dates are evicted
+
+        :param key: (date string, date format)
+        :type  key: :py:class:`tuple`
+
+        :param dt: parsed date, None if invalid
+        :type  dt: `datetime`
+        """
+        self._parse_cache[key] = dt
+        while len(self._parse_cache) > self.PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False)
+
+    @classmethod
+    def cache_info(cls):
+        """
+        get the statistics of the parse cache, for profiling
+
+        :return: dict with hits, misses, size & maxsize
+        """
+        return {'hits': cls._parse_cache_stats['hits'], 'misses': cls._parse_cache_stats['misses'],
+                'size': len(cls._parse_cache), 'maxsize': cls.PARSE_CACHE_SIZE}
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        empty the parse cache & reset its statistics
+        """
+        cls._parse_cache.clear()
+        cls._parse_cache_stats['hits'] = 0
+        cls._parse_cache_stats['misses'] = 0
+
+    def parse_dt(self, dt_str, dt_format):
+        """
+        convert a string to datetime through the parse cache
+
+        :param dt_str: date time in `str` format
+        :type  dt_str: :py:class:`str`
+
+        :param dt_format: date format
+        :type  dt_format: :py:class:`str`
+
+        :return: DateTime, None if the date is not valid
+        """
+        key = (dt_str, dt_format)
+        found, dt = self._cache_get(key)
+        if not found:
+            try:
+                dt = self.convert_to_datetime(dt_str, dt_format)
+            except ValueError:
+                dt = None
+            self._cache_put(key, dt)
+        return dt
+
+    def _parse_distinct(self, uniques, dt_format):
+        """
+        parse distinct dates through the parse cache, the dates missing from the cache are parsed at once
+
+        The result is the one of `parse_dt` (strptime): the dates pandas does not parse (e.g. out of the bounds of
+        its nanosecond timestamps, like 01/01/1500) are parsed again with strptime, only the dates strptime rejects
+        are invalid.
+
+        :param uniques: distinct dates in `str` format
+        :type  uniques: :py:class:`list`
+
+        :param dt_format: date format
+        :type  dt_format: :py:class:`str`
+
+        :return: `datetime64[us]` array, invalid dates are NaT
+        """
+        parsed = np.full(len(uniques), np.datetime64('NaT'), dtype='datetime64[us]')
+
+        misses = []
+        for i, dt_str in enumerate(uniques):
+            found, dt = self._cache_get((dt_str, dt_format))
+            if not found:
+                misses.append(i)
+            elif dt is not None:
+                parsed[i] = np.datetime64(dt, 'us')
+
+        if misses:
+            values = pd.to_datetime(pd.Series([uniques[i] for i in misses], dtype=object), format=dt_format,
+                                    errors='coerce')
+            for i, dt in zip(misses, values):
+                if pd.isnull(dt):
+                    try:
+                        dt = self.convert_to_datetime(uniques[i], dt_format)
+                    except (ValueError, TypeError):
+                        dt = None
+                else:
+                    dt = dt.to_pydatetime()
+
+                self._cache_put((uniques[i], dt_format), dt)
+                if dt is not None:
+                    parsed[i] = np.datetime64(dt, 'us')
+
+        return parsed
+
     def normalize_dt(self, from_dt, from_dt_format, to_dt_format):
         """
         convert a date from a dateformat to another
@@ -23,12 +148,57 @@ class TimeToolbox():
         """
         try:
             if isinstance(from_dt, str):
-                from_dt = self.convert_to_datetime(from_dt, from_dt_format)
+                from_dt = self.parse_dt(from_dt, from_dt_format)
             return self.convert_to_str(from_dt, to_dt_format)
         except Exception as e:
             logging.info('Error! Datetime is not valid')
             return None
 
+    def to_datetime_column(self, dt_column, dt_format):
+        """
+        convert a column of dates to datetime, every distinct date is parsed once through the parse cache
+
+        :param dt_column: dates in `str` format
+        :type  dt_column: :py:class:`pandas.Series`
+
+        :param dt_format: date format
+        :type  dt_format: :py:class:`str`
+
+        :return: `datetime64` Series, invalid dates are NaT
+        """
+        codes, uniques = pd.factorize(dt_column)
+        parsed = self._parse_distinct(list(uniques), dt_format)
+
+        # broadcast the parsed distinct dates back to the rows, missing dates (code -1) are NaT
+        values = np.append(parsed, np.datetime64('NaT', 'us'))
+        return pd.Series(values[codes], index=dt_column.index, name=dt_column.name)
+
+    def normalize_dt_column(self, dt_column, from_dt_format, to_dt_format):
+        """
+        convert a column of dates from a dateformat to another, every distinct date is parsed through the parse
+        cache & formatted once
+
+        :param dt_column: dates in `str` format
+        :type  dt_column: :py:class:`pandas.Series`
+
+        :param from_dt_format: date format to be converted from
+        :type  from_dt_format: :py:class:`str`
+
+        :param to_dt_format: date format to be converted to
+        :type  to_dt_format: :py:class:`str`
+
+        :return: Series of dates in `str` format, invalid dates are null
+        """
+        codes, uniques = pd.factorize(dt_column)
+        parsed = pd.Series(self._parse_distinct(list(uniques), from_dt_format))
+
+        formatted = np.full(len(uniques) + 1, None, dtype=object)
+        valid = parsed.notnull().values
+        formatted[:-1][valid] = parsed[valid].dt.strftime(to_dt_format).values
+
+        # missing dates (code -1) point to the trailing None
+        return pd.Series(formatted[codes], index=dt_column.index, name=dt_column.name)
+
     def get_weekday(self, dt, dt_format, litteral=0):
         """
         get weekday form datetime dt
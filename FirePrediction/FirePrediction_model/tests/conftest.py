@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from resources.constants import CENSUS_FIELDS, NYC_TRACTS_FNAME, NYC_WEATHER_FILTERED_FNAME, NYC_MAPPLUTO_AGG_FNAME, \
+    NYC_DOB_COMPLAINTS_AGG_FNAME, NYC_DOB_ECB_VIOLATIONS_AGG_FNAME, NYC_DOB_PERMITS_AGG_FNAME, \
+    NYC_FIRE_INCIDENTS_FNAME_OUT, INCIDENT_TIME_FORMAT, STANDARD_TIME_FORMAT
+
+MAPPLUTO_COLUMNS = [u'avg_unitsres', u'ratio_retailarea', u'ratio_resarea', u'ratio_comarea', u'avg_yearbuilt',
+                    u'ratio_officerea', u'avg_numfloors', u'total_units', u'avg_unitarea', u'total_bldgarea']
+WEATHER_COLUMNS = [u'mintempm', u'maxtempm', u'humidity', u'snow', u'snowdepthm', u'meanpressurem', u'meanwindspdm',
+                   u'precipm', u'rain']
+
+
+@pytest.fixture(scope='session')
+def pipeline_inputs(tmpdir_factory):
+    """
+    small synthetic inputs of the feature engineering: incidents, streets, census, weather & DOB aggregates
+
+    :return: dict, name of the input -> name of the file
+    """
+    root = tmpdir_factory.mktemp('inputs')
+    rng = np.random.RandomState(0)
+    fnames = {}
+
+    counties = ['005', '047', '061', '081', '085']
+    tracts = pd.DataFrame({u'state': '36', u'county': [counties[i % 5] for i in range(12)],
+                           u'tract': ['{:06d}'.format(100 * i + 4) for i in range(12)]})
+    tract_keys = (tracts[u'state'] + tracts[u'county'] + tracts[u'tract']).tolist()
+
+    # census, a tract has no data
+    df_census = pd.DataFrame(rng.randint(0, 1000, (len(tracts) - 1, len(CENSUS_FIELDS))), columns=sorted(CENSUS_FIELDS))
+    df_census.insert(0, u'NAME', 'Census Tract')
+    df_census = pd.concat([df_census, tracts.iloc[:-1]], axis=1)
+    fnames['census'] = str(root.join(NYC_TRACTS_FNAME))
+    df_census.to_csv(fnames['census'], sep="\t", index=False)
+
+    # streets, every street is between two blocks
+    streets = ['{} AVE, NEW YORK, NY 100{:02d}'.format(i, i) for i in range(30)]
+    df_streets = pd.DataFrame({u'street': streets,
+                               u'left_block': [tract_keys[i % 12] + '1234' for i in range(30)],
+                               u'right_bloc': [tract_keys[(i * 7) % 12] + '1234' for i in range(30)]})
+    fnames['streets'] = str(root.join('streets.tsv'))
+    df_streets.to_csv(fnames['streets'], sep="\t", index=False)
+
+    # incidents over 2 months, some addresses are not streets
+    days = pd.date_range('2013-01-01', '2013-02-28', freq='D')
+    addresses = streets + ['{} UNKNOWN ST, NEW YORK, NY 10001'.format(i) for i in range(3)]
+    timestamps = days[rng.randint(0, len(days), 400)] + pd.to_timedelta(rng.randint(0, 86400, 400), unit='s')
+    df_incidents = pd.DataFrame({u'incident_date_time': timestamps.strftime(INCIDENT_TIME_FORMAT),
+                                 u'address': [addresses[_] for _ in rng.randint(0, len(addresses), 400)]})
+    fnames['incidents'] = str(root.join(NYC_FIRE_INCIDENTS_FNAME_OUT))
+    df_incidents.to_csv(fnames['incidents'], sep="\t", index=False)
+
+    # weather, a day is missing
+    df_weather = pd.DataFrame(rng.randint(0, 30, (len(days) - 1, len(WEATHER_COLUMNS))), columns=WEATHER_COLUMNS)
+    df_weather.insert(0, u'observation_date_time', days[:-1].strftime(STANDARD_TIME_FORMAT))
+    fnames['weather'] = str(root.join(NYC_WEATHER_FILTERED_FNAME))
+    df_weather.to_csv(fnames['weather'], sep="\t", index=False)
+
+    df_mappluto = pd.DataFrame(rng.rand(8, len(MAPPLUTO_COLUMNS)), columns=MAPPLUTO_COLUMNS)
+    df_mappluto.insert(0, u'census_tract', tract_keys[:8])
+    fnames['mappluto'] = str(root.join(NYC_MAPPLUTO_AGG_FNAME))
+    df_mappluto.to_csv(fnames['mappluto'], sep="\t", index=False)
+
+    # DOB aggregates per tract & day, some are out of the incidents dates
+    dates = pd.date_range('2012-12-25', '2013-03-05', freq='D').strftime(STANDARD_TIME_FORMAT)
+    keys = pd.MultiIndex.from_product([tract_keys, dates], names=[u'census_tract', u'date']).to_frame(index=False)
+    keys = keys.sample(200, random_state=rng).reset_index(drop=True)
+    for name, fname, date, counts in [
+            ('complaints', NYC_DOB_COMPLAINTS_AGG_FNAME, u'Date Entered', [u'nbr_dispositions', u'nbr_complaints']),
+            ('violations', NYC_DOB_ECB_VIOLATIONS_AGG_FNAME, u'ISSUE_DATE',
+             [u'nbr_ecb_violations', u'nbr_dob_violations']),
+            ('permits', NYC_DOB_PERMITS_AGG_FNAME, u'Issuance Date', [u'nbr_dob_permits'])]:
+        df_agg = keys.rename(columns={u'date': date})
+        for column in counts:
+            df_agg[column] = rng.randint(1, 10, len(df_agg))
+        fnames[name] = str(root.join(fname))
+        df_agg.to_csv(fnames[name], sep="\t", index=False)
+
+    return fnames
@@ -0,0 +1,80 @@
+import json
+import pandas as pd
+import pytest
+from data_acquisition.services.census_client import CensusAPIClient
+from data_acquisition.services.response_cache import ResponseCache
+from resources.data_store import DataStore
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+COUNTIES = ['005', '061']
+TRACTS = ['000100', '000200', '019100']
+VARIABLES = ['B{:05d}_001E'.format(_) for _ in range(120)]
+
+
+class FakeResponse():
+    status_code = 200
+
+    def __init__(self, rows):
+        self.body = json.dumps(rows).encode('utf-8')
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), 10):
+            yield self.body[i:i + 10]
+
+    def close(self):
+        pass
+
+
+class FakeCensusSession():
+    """
+    answers the queries of the Census API, a variable of a tract is '<variable>/<county><tract>'
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def get(self, url, endpoint=None, stream=False):
+        query = {name: values[0] for name, values in parse_qs(urlparse(url).query).items()}
+        self.queries.append(query)
+        variables = query['get'].split(",")
+
+        if query['for'] == 'county:*':
+            return FakeResponse([variables + ['state', 'county']] +
+                                [['County {}'.format(county), '36', county] for county in COUNTIES])
+
+        county = query['in'].split("county:")[1]
+        # the rows of every query come in another order
+        tracts = TRACTS if len(self.queries) % 2 else TRACTS[::-1]
+        return FakeResponse([variables + ['state', 'county', 'tract']] +
+                            [['{}/{}{}'.format(variable, county, tract) for variable in variables] +
+                             ['36', county, tract] for tract in tracts])
+
+
+@pytest.fixture
+def census_client(tmpdir):
+    return CensusAPIClient(year='2016', data_id='acs/acs5', var_list=VARIABLES, table_id='acs/acs5', spatial_unit='all',
+                           key='SECRET', session=FakeCensusSession(), cache=ResponseCache(str(tmpdir), ttls={}))
+
+
+def test_shard_joins_the_variable_chunks_on_the_geography(census_client):
+    df_shard = census_client.get_shard({'granularity': 'tract', 'state': '36', 'tract': '*'}, 'state:36+county:061')
+
+    # NAME & 120 variables: 3 queries of at most 50 variables
+    assert [len(query['get'].split(",")) for query in census_client.session.queries] == [50, 50, 21]
+    assert list(df_shard.columns) == ['NAME'] + VARIABLES + ['state', 'county', 'tract']
+    for _, row in df_shard.iterrows():
+        assert all(row[variable] == '{}/061{}'.format(variable, row['tract']) for variable in ['NAME'] + VARIABLES)
+
+
+def test_sharded_table_has_every_county(census_client, tmpdir):
+    fname = str(tmpdir.join('tracts.csv'))
+    census_client.get_census_data_sharded({'granularity': 'tract', 'state': '36', 'tract': '*'}, fname,
+                                          store=DataStore('csv'), max_workers=2)
+
+    df = pd.read_csv(fname, sep="\t", dtype=str)
+    assert sorted(df['county'] + df['tract']) == sorted(county + tract for county in COUNTIES for tract in TRACTS)
+    assert all(df[VARIABLES[-1]] == VARIABLES[-1] + '/' + df['county'] + df['tract'])
@@ -0,0 +1,48 @@
+from os.path import abspath, dirname, join
+import pandas as pd
+import pytest
+from data_processing.data_transformer import DataTransformer
+from resources.data_store import DataStore
+
+FLATTEN_DIR = join(dirname(abspath(__file__)), 'data', 'flatten_incidents_tracts')
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_flatten_matches_the_baseline_output(tmpdir, vectorized):
+    # nyc_fire_incidents_sp.csv was written by the dict/iterrows loop of the first version of the pipeline
+    output_fname = str(tmpdir.join('nyc_fire_incidents_sp.csv'))
+    DataTransformer(store=DataStore('csv')).flatten_incidents_tracts(
+        join(FLATTEN_DIR, 'nyc_fire_incidents_tracts.csv'), join(FLATTEN_DIR, 'nyc_tracts.csv'), output_fname,
+        vectorized=vectorized)
+
+    with open(output_fname, 'rb') as output, open(join(FLATTEN_DIR, 'nyc_fire_incidents_sp.csv'), 'rb') as expected:
+        assert output.read() == expected.read()
+
+
+def test_appended_history_features_match_a_single_run(pipeline_inputs, tmpdir):
+    data_transformer = DataTransformer(store=DataStore('csv'))
+    incidents_tracts_fname = str(tmpdir.join('nyc_fire_incidents_tracts.csv'))
+    grid_fname = str(tmpdir.join('nyc_fire_incidents_sp.csv'))
+    data_transformer.join_with_tracts(pipeline_inputs['incidents'], pipeline_inputs['streets'],
+                                      incidents_tracts_fname)
+    data_transformer.flatten_incidents_tracts(incidents_tracts_fname, pipeline_inputs['census'], grid_fname)
+
+    # the grid in a single run
+    expected_fname = str(tmpdir.join('expected.csv'))
+    data_transformer.encode_history_features(grid_fname, expected_fname)
+    expected = data_transformer.store.read(expected_fname)
+
+    # the grid up to 15-02-2013, then the new days on top of its history
+    df_grid = data_transformer.store.read(grid_fname)
+    days = pd.to_datetime(df_grid[u'incident_date_time'].astype(str), format='%d-%m-%Y')
+    first_days_fname, new_days_fname = str(tmpdir.join('first_days.csv')), str(tmpdir.join('new_days.csv'))
+    history_fname = str(tmpdir.join('nyc_fire_incidents_tracts_history_state.csv'))
+    data_transformer.store.write(df_grid[(days <= '2013-02-15').values], first_days_fname)
+    data_transformer.store.write(df_grid[(days > '2013-02-15').values], new_days_fname)
+
+    data_transformer.encode_history_features(first_days_fname, history_fname=history_fname)
+    data_transformer.append_history_features(new_days_fname, history_fname)
+    appended = data_transformer.store.read(new_days_fname)
+
+    pd.testing.assert_frame_equal(appended, expected[(days > '2013-02-15').values].reset_index(drop=True))
+    assert appended[u'nbr_incidents_last_30d'].astype(float).sum() > 0
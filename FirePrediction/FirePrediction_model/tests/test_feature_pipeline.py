@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+import pytest
+from data_processing.data_transformer import DataTransformer
+from data_processing.feature_pipeline import FeaturePipeline
+from resources.data_store import DataStore
+
+CONTEXT_STEPS = [('join_with_mappluto_data', 'mappluto'), ('join_with_complaints_data', 'complaints'),
+                 ('join_with_violations_data', 'violations'), ('join_with_permits_data', 'permits')]
+
+
+def store_inputs(pipeline_inputs, store, tmpdir):
+    """
+    write the inputs produced by earlier stages to the store, the streets, census & weather stay text files
+    """
+    fnames = dict(pipeline_inputs)
+    for name in ['incidents'] + [name for _, name in CONTEXT_STEPS]:
+        fnames[name] = str(tmpdir.join(os.path.basename(pipeline_inputs[name])))
+        df = pd.read_csv(pipeline_inputs[name], sep='\t', dtype={u'census_tract': str})
+        store.write(df, fnames[name])
+    return fnames
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_fused_pass_matches_the_staged_pipeline(pipeline_inputs, tmpdir, fmt):
+    if fmt != 'csv':
+        pytest.importorskip('pyarrow')
+
+    store = DataStore(fmt)
+    data_transformer = DataTransformer(store=store)
+    fnames = store_inputs(pipeline_inputs, store, tmpdir)
+
+    # staged
+    incidents_tracts_fname = str(tmpdir.join('nyc_fire_incidents_tracts.csv'))
+    incidents_sp_fname = str(tmpdir.join('nyc_fire_incidents_sp.csv'))
+    context_fname = str(tmpdir.join('nyc_fire_incidents_tracts_context.csv'))
+    staged_fname = str(tmpdir.join('staged_final.csv'))
+    data_transformer.join_with_tracts(fnames['incidents'], fnames['streets'], incidents_tracts_fname)
+    data_transformer.flatten_incidents_tracts(incidents_tracts_fname, fnames['census'], incidents_sp_fname)
+    data_transformer.join_with_census_data(incidents_sp_fname, fnames['census'], context_fname)
+    data_transformer.join_with_weather_data(context_fname, fnames['weather'], context_fname)
+    for step, name in CONTEXT_STEPS:
+        getattr(data_transformer, step)(context_fname, fnames[name], context_fname)
+    data_transformer.encode_history_features(context_fname)
+    data_transformer.encode_time_features(context_fname)
+    data_transformer.rename_columns(context_fname)
+    data_transformer.filter_relevant_features(context_fname, staged_fname)
+
+    # fused
+    fused_fname = str(tmpdir.join('fused_final.csv'))
+    steps = [('join_with_tracts', fnames['streets']), ('flatten_incidents_tracts', fnames['census']),
+             ('join_with_census_data', fnames['census']), ('join_with_weather_data', fnames['weather'])] + \
+            [(step, store.path(fnames[name])) for step, name in CONTEXT_STEPS] + \
+            [('encode_history_features', None), ('encode_time_features', None), ('rename_columns', None),
+             ('filter_relevant_features', None)]
+    FeaturePipeline(data_transformer, steps).run(fnames['incidents'], fused_fname)
+
+    with open(staged_fname) as staged, open(fused_fname) as fused:
+        staged, fused = staged.read(), fused.read()
+    assert staged.count('\n') > 1
+    assert staged == fused
@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from data_processing.history_features import HistoryFeatures
+from resources.constants import STANDARD_TIME_FORMAT
+
+COLUMNS = [u'nbr_incidents', u'nbr_complaints']
+WINDOWS = [3, 7]
+LAGS = [1, 2, 5]
+
+
+@pytest.fixture
+def df_grid():
+    """
+    tract x day grid with missing days & an invalid date, shuffled
+    """
+    rng = np.random.RandomState(0)
+    days = [date(2013, 1, 1) + timedelta(days=_) for _ in range(30)]
+    rows = [(tract, day) for tract in ['36005000104', '36047000204', '36061000304'] for day in days
+            if rng.rand() > 0.2]
+
+    df = pd.DataFrame({u'census_tract': [tract for tract, _ in rows],
+                       u'incident_date_time': [day.strftime(STANDARD_TIME_FORMAT) for _, day in rows],
+                       u'nbr_incidents': rng.randint(0, 4, len(rows)),
+                       u'nbr_complaints': rng.randint(0, 3, len(rows)).astype(float)})
+    df.loc[5, u'incident_date_time'] = '32-01-2013'
+    return df.sample(frac=1, random_state=rng)
+
+
+def brute_force(df):
+    """
+    features of every row from the counts of the previous days of its tract
+    """
+    days = pd.to_datetime(df[u'incident_date_time'], format=STANDARD_TIME_FORMAT, errors='coerce')
+    features = []
+    for i, (tract, day) in enumerate(zip(df[u'census_tract'], days)):
+        if pd.isnull(day):
+            features.append([0.] * (len(COLUMNS) * (len(WINDOWS) + len(LAGS))))
+            continue
+        tract_rows = df[(df[u'census_tract'] == tract).values]
+        ago = (day - days[(df[u'census_tract'] == tract).values]).dt.days.values
+        rolling = [tract_rows[column].values[(ago >= 1) & (ago <= window)].sum()
+                   for column in COLUMNS for window in WINDOWS]
+        lagged = [tract_rows[column].values[ago == lag].sum() for column in COLUMNS for lag in LAGS]
+        features.append(rolling + lagged)
+    return np.array(features, dtype=np.float32)
+
+
+def test_features_match_brute_force(df_grid):
+    history_features = HistoryFeatures(COLUMNS, WINDOWS, LAGS)
+    features = history_features.compute(df_grid)
+
+    assert features.index.equals(df_grid.index)
+    assert features.values.any()
+    np.testing.assert_array_equal(features.values, brute_force(df_grid))
+
+
+def test_features_on_top_of_the_history_match_a_single_run(df_grid):
+    history_features = HistoryFeatures(COLUMNS, WINDOWS, LAGS)
+    days = pd.to_datetime(df_grid[u'incident_date_time'], format=STANDARD_TIME_FORMAT, errors='coerce')
+    first_run, second_run = df_grid[(days < '2013-01-20').values], df_grid[(days >= '2013-01-20').values]
+
+    df_history = history_features.history(first_run)
+    features = history_features.compute(second_run, df_history)
+
+    np.testing.assert_array_equal(features.values, brute_force(df_grid)[(days >= '2013-01-20').values])
@@ -0,0 +1,38 @@
+import json
+import pytest
+from data_acquisition.services.http_session import HttpSession
+
+ROWS = [[u'NAME', u'B01001_001E', u'state', u'county', u'tract'],
+        [u'Census Tract 1, Bronx County, New York', u'4127', u'36', u'005', u'000100'],
+        [u'Census Tract 2, Kings County, Nueva York é', None, u'36', u'047', u'000200']]
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, 4096])
+def test_rows_split_across_chunks(size):
+    body = json.dumps(ROWS, ensure_ascii=False).replace("],", "],\n").encode('utf-8')
+
+    assert list(HttpSession.iter_json_rows(chunked(body, size))) == ROWS
+
+
+@pytest.mark.parametrize('body', [b'[["NAME", "state"], ["Census Tr', b'[["NAME", "state"], ', b'[["NAME", "state"]'])
+def test_truncated_bodies_raise(body):
+    with pytest.raises(ValueError):
+        list(HttpSession.iter_json_rows(chunked(body, 5)))
+
+
+def test_empty_body_has_no_rows():
+    assert list(HttpSession.iter_json_rows([b''])) == []
+
+
+def test_latency_is_recorded_per_endpoint():
+    session = HttpSession()
+    session.record('census_data', 0.2)
+    session.record('census_data', 0.4, error=True)
+
+    metrics = session.latency_metrics()['census_data']
+    assert (metrics['calls'], metrics['errors'], metrics['max']) == (2, 1, 0.4)
+    assert metrics['mean'] == pytest.approx(0.3)
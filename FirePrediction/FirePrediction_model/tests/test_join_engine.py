@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_processing.join_engine import JoinEngine
+
+
+@pytest.fixture
+def tables():
+    rng = np.random.RandomState(0)
+    tracts = ['36005{:06d}'.format(_) for _ in range(6)]
+    dates = ['{:02d}-01-2013'.format(_) for _ in range(1, 8)]
+
+    df = pd.DataFrame({u'census_tract': [tracts[_] for _ in rng.randint(0, 6, 100)],
+                       u'incident_date_time': [dates[_] for _ in rng.randint(0, 7, 100)],
+                       u'nbr_incidents': rng.randint(0, 3, 100)}, index=rng.permutation(100))
+    df.loc[df.index[:3], u'incident_date_time'] = None
+
+    # lookup keys missing from the table & table keys missing from the lookup
+    keys = pd.MultiIndex.from_product([tracts[1:] + ['36047000001'], dates[2:] + ['31-12-2012']],
+                                      names=[u'census_tract', u'incident_date_time'])
+    df_lookup = pd.DataFrame({u'nbr_complaints': rng.randint(1, 9, len(keys)), u'rate': rng.rand(len(keys))},
+                             index=keys).sample(frac=0.7, random_state=rng)
+    return df, df_lookup
+
+
+@pytest.mark.parametrize('how', ['left', 'inner'])
+def test_join_on_two_keys_matches_pandas(tables, how):
+    df, df_lookup = tables
+    on = [u'census_tract', u'incident_date_time']
+
+    expected = df.join(df_lookup, on=on, how=how)
+    joined = JoinEngine.join(df, df_lookup, on=on, how=how)
+
+    assert len(joined) and joined[u'nbr_complaints'].notnull().any()
+    pd.testing.assert_frame_equal(joined.astype({key: df[key].dtype for key in on}), expected)
+
+
+@pytest.mark.parametrize('how', ['left', 'inner'])
+def test_join_on_one_key_matches_pandas(tables, how):
+    df, df_lookup = tables
+    df_lookup = df_lookup.groupby(level=u'census_tract').sum()
+
+    expected = pd.merge(df, df_lookup, left_on=u'census_tract', right_index=True, how=how)
+    joined = JoinEngine.join(df, df_lookup, on=[u'census_tract'], how=how)
+
+    pd.testing.assert_frame_equal(joined.astype({u'census_tract': df[u'census_tract'].dtype}), expected)
+
+
+def test_join_does_not_modify_the_table(tables):
+    df, df_lookup = tables
+    dtypes = df.dtypes.copy()
+
+    joined = JoinEngine.join(df, df_lookup, on=[u'census_tract', u'incident_date_time'])
+
+    assert df.dtypes.equals(dtypes)
+    assert isinstance(joined[u'census_tract'].dtype, pd.CategoricalDtype)
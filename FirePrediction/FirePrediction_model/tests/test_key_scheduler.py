@@ -0,0 +1,78 @@
+import pytest
+from data_acquisition.services import key_scheduler
+from data_acquisition.services.key_scheduler import TokenBucket, KeyScheduler, KeyQuotaExhausted
+
+
+class FakeClock():
+    """
+    clock of the scheduler, sleeping moves the time forward
+    """
+
+    def __init__(self):
+        self.now = 1000.
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(key_scheduler, 'time', clock)
+    return clock
+
+
+def test_token_bucket_refills_continuously(clock):
+    bucket = TokenBucket(2, 60.)
+    bucket.take(clock.now)
+    bucket.take(clock.now)
+
+    assert bucket.wait_time(clock.now) == pytest.approx(30.)
+    assert bucket.wait_time(clock.now + 30.) == 0.
+    # the tokens are capped by the capacity
+    assert bucket.wait_time(clock.now + 3600.) == 0. and bucket.tokens == 2
+
+
+def test_token_bucket_limits(clock):
+    assert TokenBucket(None, 60.).wait_time(clock.now) == 0.
+    assert TokenBucket(0, 60.).wait_time(clock.now) == float('inf')
+
+
+def test_least_loaded_key_is_acquired(clock):
+    scheduler = KeyScheduler({'a': {}, 'b': {}, 'c': {'calls_per_day': 1}}, calls_per_minute=10, calls_per_day=100)
+
+    # the keys with the fewest calls in flight come first, c has no call left today once called
+    assert [scheduler.acquire() for _ in range(3)] == ['a', 'b', 'c']
+    scheduler.release('b')
+    assert scheduler.acquire() == 'b'
+    assert scheduler.remaining()['c']['day'] == 0
+
+
+def test_throttled_key_is_put_on_cooldown(clock):
+    scheduler = KeyScheduler({'a': {}, 'b': {}}, calls_per_minute=10, calls_per_day=None, cooldown=120.)
+    scheduler.release(scheduler.acquire(), throttled=True)
+
+    assert [scheduler.acquire() for _ in range(3)] == ['b', 'b', 'b']
+    assert scheduler.remaining()['a']['cooldown'] == 120. and scheduler.remaining()['a']['minute'] == 0
+
+
+def test_workers_wait_for_the_quota(clock):
+    scheduler = KeyScheduler({'a': {}}, calls_per_minute=1, calls_per_day=None, max_wait=300.)
+    scheduler.release(scheduler.acquire())
+    start = clock.now
+
+    assert scheduler.acquire() == 'a'
+    assert clock.now - start == pytest.approx(60.)
+
+
+def test_exhausted_quota_raises(clock):
+    scheduler = KeyScheduler({'a': {}, 'b': {'calls_per_day': 0}}, calls_per_minute=None, calls_per_day=1,
+                             max_wait=60.)
+    scheduler.release(scheduler.acquire())
+
+    with pytest.raises(KeyQuotaExhausted):
+        scheduler.acquire()
+    assert clock.now == 1000.
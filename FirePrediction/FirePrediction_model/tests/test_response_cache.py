@@ -0,0 +1,69 @@
+import os
+import time
+import pytest
+from data_acquisition.services.response_cache import ResponseCache
+
+URL = "https://api.census.gov/data/2016/acs/acs5?get=NAME,B01001_001E&for=tract:*&in=state:36"
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ResponseCache(str(tmpdir.join('responses')), ttls={'census_data': None, 'forecast': 600, 'geo': 0})
+
+
+@pytest.mark.parametrize('url', [URL + "&key=SECRET", URL.replace("?", "?key=SECRET&"),
+                                 URL.replace("&for", "&key=SECRET&for")])
+def test_keys_are_stripped(url):
+    assert ResponseCache.strip_keys(url) == URL
+
+
+def test_keys_in_the_path_are_stripped():
+    url = "http://api.wunderground.com/api/SECRET/history_20130101/q/NY/New_York.json"
+    assert "SECRET" not in ResponseCache.strip_keys(url, keys=["SECRET"])
+
+
+def test_same_query_with_another_key_is_a_hit(cache):
+    cache.put('census_data', URL + "&key=A", b'[["NAME"]]')
+
+    assert cache.get('census_data', URL + "&key=B") == b'[["NAME"]]'
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_responses_expire_after_their_ttl(cache):
+    cache.put('forecast', URL, b'[]')
+    assert cache.get('forecast', URL) == b'[]'
+
+    old = time.time() - 601
+    os.utime(cache.fname('forecast', URL), (old, old))
+    assert cache.get('forecast', URL) is None
+
+
+def test_endpoints_not_cached(cache):
+    cache.put('geo', URL, b'[]')
+    cache.put('unknown', URL, b'[]')
+
+    assert cache.get('geo', URL) is None and cache.get('unknown', URL) is None
+    assert not os.path.exists(cache.cache_dir)
+
+
+def test_interrupted_store_leaves_no_file(cache):
+    def chunks():
+        yield b'[["NAME"],'
+        raise IOError("connection reset")
+
+    with pytest.raises(IOError):
+        list(cache.store('census_data', URL, chunks()))
+
+    # a reader that stops before the end
+    stored = cache.store('census_data', URL, iter([b'[["NAME"],', b'["x"]]']))
+    next(stored)
+    stored.close()
+
+    assert cache.get('census_data', URL) is None
+    assert [fname for _, _, fnames in os.walk(cache.cache_dir) for fname in fnames] == []
+
+
+def test_stored_body_is_read_back_in_chunks(cache):
+    assert b''.join(cache.store('census_data', URL, iter([b'[["NAME"],', b'["x"]]']))) == b'[["NAME"],["x"]]'
+
+    assert b''.join(cache.iter_chunks(cache.lookup('census_data', URL), chunk_size=3)) == b'[["NAME"],["x"]]'
@@ -0,0 +1,33 @@
+import logging
+import numpy as np
+import pandas as pd
+from resources.schemas import TableSchema, CONTEXT_SCHEMA, read_csv
+
+
+def test_undeclared_columns_keep_their_type():
+    df = pd.DataFrame({'census_tract': ['1', '2'], 'comment': ['a', 'b'], 'flag': [True, False], 'value': [1.5, 2.]})
+    df = TableSchema({'census_tract': 'category'}, default='float32').apply(df)
+
+    assert isinstance(df['census_tract'].dtype, pd.CategoricalDtype)
+    assert df['comment'].tolist() == ['a', 'b']
+    assert df['flag'].dtype == bool
+    assert df['value'].dtype == np.float32
+
+
+def test_context_tables_keep_the_weather_dates(tmpdir):
+    fname = str(tmpdir.join('nyc_fire_incidents_tracts_census_weather.csv'))
+    pd.DataFrame({'incident_date_time': ['01-01-2013'], 'census_tract': ['36061019100'], 'nbr_incidents': [2],
+                  'observation_date_time': ['01-01-2013'], 'mintempm': [3]}).to_csv(fname, sep='\t', index=False)
+
+    df = read_csv(fname, sep='\t')
+    assert df['observation_date_time'].tolist() == ['01-01-2013']
+    assert df['nbr_incidents'].dtype == np.int32
+    assert df['mintempm'].dtype == np.float32
+
+
+def test_values_that_do_not_parse_are_reported(caplog):
+    with caplog.at_level(logging.WARNING):
+        values = CONTEXT_SCHEMA.apply(pd.DataFrame({'nbr_incidents': ['1', 'x']}))['nbr_incidents']
+
+    assert values.isnull().tolist() == [False, True]
+    assert 'not numbers' in caplog.text
@@ -0,0 +1,34 @@
+import pytest
+from resources.stage_cache import Stage, StageCache
+
+
+def write(fname, calls):
+    calls.append(fname)
+    with open(fname, "w") as f:
+        f.write("data")
+
+
+def test_up_to_date_stages_are_skipped_unless_not_cached(tmpdir):
+    stage_cache = StageCache(str(tmpdir.join('stages.json')))
+    output_fname = str(tmpdir.join('out.csv'))
+    calls = []
+
+    for _ in range(2):
+        stage_cache.run(Stage('cached', write, inputs=[], outputs=[output_fname], args=(output_fname, calls)))
+    assert len(calls) == 1
+
+    for _ in range(2):
+        stage_cache.run(Stage('not_cached', write, inputs=[], outputs=[output_fname], args=(output_fname, calls),
+                              cached=False))
+    assert len(calls) == 3
+
+
+def test_failed_stages_are_not_recorded(tmpdir):
+    stage_cache = StageCache(str(tmpdir.join('stages.json')))
+
+    def fail():
+        raise ValueError("incomplete")
+
+    with pytest.raises(ValueError):
+        stage_cache.run(Stage('failed', fail, inputs=[], outputs=[]))
+    assert stage_cache.is_stale(Stage('failed', fail, inputs=[], outputs=[])) == "never run"
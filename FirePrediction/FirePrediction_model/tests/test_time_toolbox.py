@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+from resources.time_toolbox import TimeToolbox
+
+DATES = ['01/02/2013', '1/2/2013', '12/31/2014', '02/30/2013', '13/01/2013', '2013-01-02', '01/02/2013 ', '',
+         '01/01/1500', '12/31/2262', '01/01/2263', '01/01/9999']
+
+
+@pytest.fixture
+def time_toolbox():
+    TimeToolbox.clear_cache()
+    return TimeToolbox()
+
+
+def test_normalize_dt_column_matches_strptime(time_toolbox):
+    dates = pd.Series(DATES * 2 + [None], dtype=object)
+    expected = [time_toolbox.normalize_dt(_, '%m/%d/%Y', '%d-%m-%Y') for _ in DATES * 2] + [None]
+
+    # cache misses, then cache hits
+    for _ in range(2):
+        normalized = time_toolbox.normalize_dt_column(dates, '%m/%d/%Y', '%d-%m-%Y')
+        assert [None if pd.isnull(_) else _ for _ in normalized] == expected
+
+
+def test_out_of_bounds_dates_are_parsed(time_toolbox):
+    parsed = time_toolbox.to_datetime_column(pd.Series(['01/01/1500', '01/01/2263', '02/30/2013']), '%m/%d/%Y')
+
+    assert parsed.dt.year.tolist()[:2] == [1500, 2263]
+    assert pd.isnull(parsed.iloc[2])
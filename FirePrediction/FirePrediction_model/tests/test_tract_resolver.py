@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_processing.tract_resolver import TractResolver
+
+
+STREETS = np.array(['W 110TH ST, NEW YORK, NY 10025', 'E 110TH ST, NEW YORK, NY 10029',
+                    'BEACH 110TH ST, QUEENS, NY 11694', 'BROADWAY, NEW YORK, NY 10025'], dtype=object)
+TRACTS = np.array(['36061019100', '36061017800', '36081094201', '36061019300'], dtype=object)
+
+
+@pytest.fixture
+def resolver():
+    return TractResolver(STREETS, TRACTS, fuzzy_cutoff=0.9)
+
+
+@pytest.mark.parametrize('address', ['W 111TH ST, NEW YORK, NY 10025', 'E 116TH ST, NEW YORK, NY 10029',
+                                     'BEACH 116TH ST, QUEENS, NY 11694'])
+def test_adjacent_numbered_streets_are_not_matched(resolver, address):
+    assert resolver.resolve_addresses(pd.Series([address])).tolist() == [None]
+
+
+@pytest.mark.parametrize('address, tract', [('W 110TH STT, NEW YORK, NY 10025', '36061019100'),
+                                            ('BEACH 110TH  ST , QUEENS, NY 11694', '36081094201'),
+                                            ('BROADWY, NEW YORK, NY 10025', '36061019300')])
+def test_typos_are_matched(resolver, address, tract):
+    assert resolver.resolve_addresses(pd.Series([address])).tolist() == [tract]
+
+
+def test_fuzzy_matching_disabled():
+    resolver = TractResolver(STREETS, TRACTS, fuzzy_cutoff=None)
+    assert resolver.resolve_addresses(pd.Series(['W 110TH STT, NEW YORK, NY 10025'])).tolist() == [None]
@@ -0,0 +1,149 @@
+from collections import defaultdict
+import json
+import os
+import threading
+import time
+import pytest
+from data_acquisition.services import response_cache
+from data_acquisition.services.response_cache import ResponseCache
+from data_acquisition.services.weather_history_fetcher import WeatherHistoryFetcher
+from data_acquisition.services.weather_info_collector import WeatherInfoCollector
+from data_acquisition.services.wunderground_client import WundergroundAPI
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+DATES = ['201301{:02d}'.format(_) for _ in range(1, 9)]
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    local stub of the history API: /api/<key>/history_<date>/q/<region>/<city>.json
+    """
+    daemon_threads = True
+    # delay of every response (seconds)
+    latency = 0.2
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        # date -> times of the calls, date -> number of calls that fail before a success
+        self.calls = defaultdict(list)
+        self.failures = {}
+        self.not_found = set()
+        self.in_flight, self.max_in_flight = 0, 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}/api".format(self.server_port)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        dt = self.path.split("/history_")[1].split("/")[0]
+        with server.lock:
+            server.calls[dt].append(time.time())
+            attempt = len(server.calls[dt])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+        time.sleep(server.latency)
+        if attempt <= server.failures.get(dt, 0):
+            status, data = 503, {}
+        elif dt in server.not_found:
+            status, data = 200, {'response': {'error': {'type': 'querynotfound'}}}
+        else:
+            status, data = 200, {'history': {'dailysummary': [
+                {'date': {'mday': dt[6:], 'mon': dt[4:6], 'year': dt[:4]}, 'mintempm': dt[6:]}]}}
+
+        with server.lock:
+            server.in_flight -= 1
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def keys_fname(tmpdir, monkeypatch):
+    # the responses are not cached, every query reaches the stub
+    monkeypatch.setattr(response_cache, '_default_cache', ResponseCache(str(tmpdir.join('responses')), ttls={}))
+    fname = str(tmpdir.join('keys.json'))
+    with open(fname, "w") as f:
+        json.dump({'a': {'wunderground_api_key': 'KEY_A'}, 'b': {'wunderground_api_key': 'KEY_B'}}, f)
+    return fname
+
+
+def test_dates_are_fetched_concurrently(stub_server, keys_fname):
+    wunderground_api = WundergroundAPI(keys_fname, base_url=stub_server.base_url, calls_per_minute=None)
+    fetcher = WeatherHistoryFetcher(wunderground_api, max_workers=4)
+
+    start = time.time()
+    fetched = dict(fetcher.fetch(DATES, region='NY', city='New_York'))
+
+    assert sorted(fetched) == DATES and fetched['20130105']['mintempm'] == '05'
+    assert stub_server.max_in_flight == 4
+    # 8 calls of 0.2s on 4 workers
+    assert time.time() - start < 8 * stub_server.latency
+
+
+def test_transient_errors_are_retried_with_backoff(stub_server, keys_fname):
+    stub_server.latency = 0.
+    stub_server.failures = {'20130103': 2}
+    stub_server.not_found = {'20130106'}
+    wunderground_api = WundergroundAPI(keys_fname, base_url=stub_server.base_url, calls_per_minute=None)
+    wunderground_api.scheduler.cooldown = 0.
+    fetcher = WeatherHistoryFetcher(wunderground_api, max_workers=4, max_attempts=3, backoff=0.2)
+
+    fetched = dict(fetcher.fetch(DATES, region='NY', city='New_York'))
+
+    assert sorted(fetched) == [dt for dt in DATES if dt != '20130106']
+    calls = stub_server.calls['20130103']
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.2 and calls[2] - calls[1] >= 0.4
+    # an unknown query is not retried
+    assert fetcher.failed_dates == ['20130106'] and len(stub_server.calls['20130106']) == 1
+
+
+def test_collection_resumes_after_a_truncated_file(stub_server, keys_fname, tmpdir):
+    stub_server.latency = 0.
+    output_fname = str(tmpdir.join('weather.ndjson.gz'))
+    with WeatherInfoCollector.open_weather_file(output_fname, "w") as f:
+        for dt in DATES[:3]:
+            f.write(json.dumps({'dt': dt, 'dailysummary': {}}) + "\n")
+    # the write of the next date is interrupted in the middle of its gzip member
+    size = os.path.getsize(output_fname)
+    with WeatherInfoCollector.open_weather_file(output_fname, "a") as f:
+        f.write(json.dumps({'dt': DATES[3], 'dailysummary': {'mintempm': '4'}}) + "\n")
+    with open(output_fname, 'rb+') as f:
+        f.truncate((size + os.path.getsize(output_fname)) // 2)
+
+    weather_collector = WeatherInfoCollector('2013-01-01', '2013-01-09')
+    weather_collector.get_weather_info_period(keys_fname, output_fname, region='NY', city='New_York',
+                                              base_url=stub_server.base_url)
+
+    assert sorted(stub_server.calls) == DATES[3:]
+    collected = [json.loads(line)['dt'] for line in WeatherInfoCollector.read_lines(output_fname)]
+    assert sorted(collected) == DATES
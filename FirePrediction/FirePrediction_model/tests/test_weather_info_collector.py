@@ -0,0 +1,45 @@
+import json
+from data_acquisition.services.weather_info_collector import WeatherInfoCollector
+
+
+def daily_summary(**fields):
+    """
+    daily summary of the Wunderground history API, local midnight in New York is 05:00 UTC
+    """
+    summary = {u'date': {u'pretty': u'12:00 AM EST on January 01, 2013', u'year': u'2013', u'mon': u'01',
+                         u'mday': u'01', u'hour': u'00', u'min': u'00', u'tzname': u'America/New_York'},
+               u'utcdate': {u'pretty': u'11:00 PM GMT on December 31, 2012', u'year': u'2012', u'mon': u'12',
+                            u'mday': u'31', u'hour': u'23', u'min': u'00', u'tzname': u'UTC'},
+               u'fog': u'0', u'rain': u'1', u'snow': u'0', u'snowfallm': u'0.00', u'snowdepthm': u'T',
+               u'meantempm': u'4', u'mintempm': u'-1', u'maxtempm': u'8', u'humidity': u'', u'meanpressurem': u'1012',
+               u'meanwindspdm': u'14', u'precipm': u'0.51'}
+    summary.update(fields)
+    return summary
+
+
+def test_the_day_is_the_local_date():
+    line = json.dumps({'dt': '20130101', 'dailysummary': daily_summary()}) + "\n"
+
+    dt, summary = WeatherInfoCollector.parse_daily_summary(line)
+    assert dt == '20130101'
+    assert summary[u'date'][u'mday'] == u'01' and summary[u'date'][u'year'] == u'2013'
+    assert summary[u'mintempm'] == u'-1' and summary[u'precipm'] == u'0.51'
+
+
+def test_ambiguous_lines_are_fully_parsed():
+    summaries = [daily_summary(observations={u'rain': u'0'}), daily_summary(date={u'year': u'2013'}),
+                 daily_summary(mintempm=u'-°1')]
+
+    for summary in summaries:
+        line = json.dumps({'dt': '20130101', 'dailysummary': summary}) + "\n"
+        assert WeatherInfoCollector.parse_daily_summary(line) == ('20130101', summary)
+
+
+def test_filtered_weather_matches_the_summaries(tmpdir):
+    fname, output_fname = str(tmpdir.join('weather.ndjson')), str(tmpdir.join('weather.csv'))
+    with open(fname, "w") as f:
+        f.write(json.dumps({'dt': '20130101', 'dailysummary': daily_summary()}) + "\n")
+
+    WeatherInfoCollector('2013-01-01', '2013-01-02').filter_weather_data(fname, output_fname)
+    with open(output_fname) as f:
+        assert f.read().splitlines()[1].split("\t")[:3] == ['01-01-2013', '-1.0', '8.0']